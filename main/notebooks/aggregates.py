@@ -0,0 +1,72 @@
+#Pre-aggregated tables computed once at load time and sliced by the callbacks
+#(pandas is imported by the builders so app.py can import the metric helpers without it)
+
+
+#----- Individual Stats tab: (player, quarter, surface) cube
+#Same aggregation as the chart always used: per tournament date first, then per quarter
+STAT_AGGREGATIONS = {
+    'num_aces':'sum',
+    'num_dfs':'sum',
+    'serve1_in_perc':'mean',
+    'serve1_win_perc':'mean',
+    'serve2_win_perc':'mean',
+    'game_win_perc': 'mean',
+    'num_brkpts_faced':'sum',
+    'num_brkpts_saved':'sum'
+}
+
+
+def build_quarterly_stats(df):
+    '''All eight statistics per (player_name, quarter_date, surface), sorted by player then quarter.'''
+    import pandas as pd
+
+    stats = df[['player_name','tourney_date','surface', *STAT_AGGREGATIONS]].copy()
+    stats['game_win_perc'] = stats['game_win_perc']*100
+
+    by_date = stats.groupby(['player_name','tourney_date','surface'], observed=True).agg(STAT_AGGREGATIONS).reset_index()
+    by_date['quarter_date'] = pd.to_datetime(
+        by_date['tourney_date'], format='%Y%m%d'
+    ).dt.to_period('Q').dt.to_timestamp()
+
+    return by_date.groupby(
+        ['player_name','quarter_date','surface'], observed=True
+    ).agg(STAT_AGGREGATIONS).reset_index()
+
+
+#----- Predict Winners tab: confusion counts per (player, surface)
+#Any selection of surfaces is answered by summing at most one row per surface
+CONFUSION_COLUMNS = ['true_pos','false_pos','true_neg','false_neg']
+
+
+def build_model_metrics(df):
+    '''TP/FP/TN/FN counts of pred_wins against outcome per (player_name, surface), sorted by player.'''
+    import pandas as pd
+
+    actual = df['outcome'].to_numpy() == 1
+    predicted = df['pred_wins'].to_numpy() == 1
+
+    counts = pd.DataFrame({
+        'player_name': df['player_name'],
+        'surface': df['surface'],
+        'true_pos': actual & predicted,
+        'false_pos': ~actual & predicted,
+        'true_neg': ~actual & ~predicted,
+        'false_neg': actual & ~predicted,
+    })
+    return counts.groupby(
+        ['player_name','surface'], observed=True
+    )[CONFUSION_COLUMNS].sum().astype('int32').reset_index()
+
+
+def _percent(numerator, denominator):
+    return round(numerator / denominator * 100, 1) if denominator else None
+
+
+def classification_metrics(true_pos, false_pos, true_neg, false_neg):
+    '''Accuracy, precision, recall and F1 in percent (None where the denominator is 0).'''
+    return {
+        'accuracy': _percent(true_pos + true_neg, true_pos + false_pos + true_neg + false_neg),
+        'precision': _percent(true_pos, true_pos + false_pos),
+        'recall': _percent(true_pos, true_pos + false_neg),
+        'f1_score': _percent(2 * true_pos, 2 * true_pos + false_pos + false_neg),
+    }
@@ -1,81 +1,145 @@
-#Import packages
-import pandas as pd
+#Import packages - pandas, pyarrow and xgboost are left to the code that needs them
+#(the data resources below, /api/score), so the Welcome tab is served without them
 import numpy as np
-import plotly.express as px
 import dash
 from dash import dcc, html, dash_table
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
 import os
-import pyarrow
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-import seaborn as sns
+import sys
+import time
+from resources import resource, warm_up
+from scoring import register_scoring_route
+from metrics import instrument_callbacks, register_metrics_route, set_gauge, count_rows
+from aggregates import classification_metrics, CONFUSION_COLUMNS
+from callback_cache import cached_callback, set_dataset_version, set_dataset_version_source
+from figures import COLORWAY, date_strings, line_trace, line_figure, heatmap_figure, contribution_heatmap, bar_figure
+from model_artifact import EXPLAINED_FEATURES, CONTRIBUTION_COLUMNS
+from indexes import build_player_index, player_rows, year_rows, pair_matches, player_opponents
 
-#Read in processed data from github
-url = 'https://raw.githubusercontent.com/statzenthusiast921/ATP_Analysis/main/main/data/model_df_v2.parquet.gzip'
-atp_df = pd.read_parquet(url)
+#----- Data, built by the first callback that needs it or by the warm-up thread (see resources.py)
+#Processed data is downloaded from github once into the local arrow cache.  Tables derived
+#from it are built once into the serving snapshot (see snapshot.py) and memory-mapped, so
+#gunicorn workers share them
+@resource('snapshot')
+def snapshot():
+    from snapshot import open_snapshot
 
+    snapshot = open_snapshot()
+    #Cached callback results are only valid for the dataset they were computed from
+    set_dataset_version(snapshot.dataset_sha256)
+    return snapshot
 
-#Filter out players with less than 200 matches
-match_totals = atp_df.groupby('player_name').agg(total_match_count=('player_name', 'size')).reset_index()
+#A callback that runs before the snapshot is loaded loads it first, to key its result
+set_dataset_version_source(lambda: snapshot.get().dataset_sha256)
 
-atp_df = pd.merge(
-    atp_df, 
-    match_totals, 
-    how = 'inner', 
-    on = 'player_name'
-)
 
-atp_df = atp_df[atp_df['total_match_count']>=300]
+@resource('matches', requires=['snapshot'])
+def matches(snapshot):
+    '''Players with at least 300 matches and the XGBoost predictions, sorted by player so each
+    callback can grab a player's matches as a contiguous slice.'''
+    from snapshot import load_matches
+
+    start = time.perf_counter()
+    atp_df, manifest = load_matches(snapshot)
+    set_gauge('atp_dataset_load_seconds', time.perf_counter() - start, 'Time this process took to load the matches table (mapped from the snapshot, or built if missing)')
+    set_gauge('atp_dataset_rows', manifest['dataset_rows'], 'Rows in the loaded dataset')
+    set_gauge('atp_dashboard_rows', len(atp_df), 'Rows of players shown in the dashboard')
+    return atp_df, build_player_index(atp_df)
 
-#Define options for dropdown menus
-player_choices = sorted(atp_df['player_name'].unique())
-surface_choices = sorted(atp_df['surface'].unique())
-statistic_choices = sorted([
-    'Aces','Double Faults','Break Points Saved',
-    'Break Points Faced','% Games Won',
-    '1st Serve In %', '1st Serve Win %','2nd Serve Win %'
-])
 
+@resource('choices', requires=['matches'])
+def choices(matches):
+    '''Options for the dropdown menus and the year slider.'''
+    atp_df, _ = matches
+    years = (int(atp_df['year'].min()), int(atp_df['year'].max()))
+    return sorted(atp_df['player_name'].unique()), sorted(atp_df['surface'].unique()), years
 
-#Player --> Opponent Dictionary
-player_opponent_df = atp_df[['tourney_id','player_name','match_num']]
-player_opponent_df = player_opponent_df.sort_values(['tourney_id', 'match_num'], ascending=[True, True])
 
-po_pairs = pd.merge(player_opponent_df, player_opponent_df, how = 'inner', on = ['tourney_id','match_num'])
-po_pairs = po_pairs[po_pairs['player_name_x'] != po_pairs['player_name_y']]  # Remove rows where a player is paired with themselves
-player_opponents_dict = po_pairs.groupby('player_name_x')['player_name_y'].agg(list).to_dict()
+@resource('individual_stats', requires=['snapshot'])
+def individual_stats(snapshot):
+    '''(player, quarter, surface) statistics cube.'''
+    from snapshot import load_quarterly_stats
 
-#Player --> Surface Dictionary
-player_surface_df = atp_df[['player_name','surface']].drop_duplicates()
-player_surface_dict = player_surface_df.groupby('player_name')['surface'].agg(list).to_dict()
+    quarterly_stats = load_quarterly_stats(snapshot)
+    return quarterly_stats, build_player_index(quarterly_stats)
 
 
-#----- Model Code
-from xgboost import XGBClassifier
+@resource('head_to_head', requires=['snapshot'])
+def head_to_head(snapshot):
+    '''Rows of every (player, opponent) pair's matches, joined once instead of per callback,
+    and each player's distinct opponents, most frequent first.'''
+    from snapshot import load_head_to_head
 
-#Choose features and response
-y = atp_df['outcome']
-X = atp_df[['num_aces','num_dfs','serve1_in_perc','player_age','surface','num_brkpts_saved','num_brkpts_faced']]
+    return load_head_to_head(snapshot)
 
-#One Hot Encode surface
-one_hot = pd.get_dummies(X['surface'])
-X = X.drop('surface',axis=1)
-X = X.join(one_hot)
 
+@resource('predict_winners', requires=['snapshot'])
+def predict_winners(snapshot):
+    '''Confusion counts per (player, surface).'''
+    from snapshot import load_model_metrics
 
-scale = StandardScaler()
-scaledX = scale.fit_transform(X)
+    model_metrics = load_model_metrics(snapshot)
+    return model_metrics, build_player_index(model_metrics)
 
-X_train, X_test, y_train, y_test = train_test_split(scaledX, y, test_size=0.30, random_state=42)
 
+@resource('explainer', requires=['snapshot', 'matches'])
+def explainer(snapshot, matches):
+    '''(boosters, meta) to compute SHAP values with, or None if the matches table already has them.'''
+    atp_df, _ = matches
+    if CONTRIBUTION_COLUMNS[0] in atp_df.columns:
+        return None
+    from model_artifact import load_model
+    return load_model(snapshot.model_version, snapshot.model_dir)
+
+
+@resource('ratings', requires=['snapshot'])
+def ratings(snapshot):
+    '''Elo rating history of every player (see ratings.py), one date ordered block per player.'''
+    from snapshot import load_ratings
+
+    rating_history = load_ratings(snapshot)
+    return rating_history, build_player_index(rating_history)
+
+
+#Define options for dropdown menus
+match_table_columns = {
+    'tourney_name': "Tourney Name",
+    'surface': "Surface",
+    'tourney_date': "Tourney Date",
+    'player_age': "Player Age",
+    'rank': "Rank",
+    'round': "Round",
+    'num_aces': "# Aces",
+    'num_dfs': "# Double Faults",
+    'serve1_in_perc': "1st Serve In %",
+    'serve1_win_perc': "1st Serve Win %",
+    'serve2_win_perc': "2nd Serve Win %",
+    'num_brkpts_saved': "# Breakpoints Saved",
+    'num_brkpts_faced': "# Breakpoints Faced",
+    'outcome': "Outcome",
+    'total_games_won': "# Games Won",
+    'total_games_lost': "# Games Lost",
+    'game_win_perc': "% Games Won"
+}
+statistic_choices = sorted([
+    'Aces','Double Faults','Break Points Saved',
+    'Break Points Faced','% Games Won',
+    '1st Serve In %', '1st Serve Win %','2nd Serve Win %'
+])
 
-xgb_class = XGBClassifier()
-xgb_class.fit(X_train, y_train, verbose = False, early_stopping_rounds=15,eval_set=[(X_test,y_test)])
-y_pred = xgb_class.predict(scaledX)
+#Statistic --> (quarterly stats column, axis label)
+stat_columns = {
+    '% Games Won': ('game_win_perc', '% Games Won'),
+    '1st Serve In %': ('serve1_in_perc', '1st Serve in %'),
+    '1st Serve Win %': ('serve1_win_perc', '1st Serve Win %'),
+    '2nd Serve Win %': ('serve2_win_perc', '2nd Serve Win %'),
+    'Aces': ('num_aces', '# Aces'),
+    'Break Points Faced': ('num_brkpts_faced', '# Break Points Faced'),
+    'Break Points Saved': ('num_brkpts_saved', '# Break Points Saved'),
+    'Double Faults': ('num_dfs', '# Double Faults')
+}
 
-atp_df['pred_wins'] = y_pred
 
 
 tabs_styles = {
@@ -100,10 +164,14 @@ tab_selected_style = {
 
 
 
-app = dash.Dash(__name__,assets_folder=os.path.join(os.curdir,"assets"))
+app = dash.Dash(__name__,assets_folder=os.path.join(os.curdir,"assets"),suppress_callback_exceptions=True)
 server = app.server
+
+#POST /api/score - bulk scoring of feature rows with the same model (see scoring.py)
+register_scoring_route(server)
+
 app.layout = html.Div([
-    dcc.Tabs([
+    dcc.Tabs(id='tabs', value='tab-1', children=[
         dcc.Tab(label='Welcome',value='tab-1',style=tab_style, selected_style=tab_selected_style,
         children = [
             html.Div([
@@ -141,296 +209,19 @@ app.layout = html.Div([
                 )
         ]),
         dcc.Tab(label='Match History',value='tab-2',style=tab_style, selected_style=tab_selected_style,
-            children = [
-                dbc.Row([
-                    dbc.Col([
-                        html.Div([
-                            dbc.Button("Click Here for Instructions", id="open1",color='secondary',style={"fontSize":18}),
-                            dbc.Modal([
-                                    dbc.ModalHeader("Instructions"),
-                                    dbc.ModalBody(
-                                        children=[
-                                            html.P('Below is a player-specific table with details about each ATP match from 1991 to 2022.'),
-                                            html.P('You can update the table by selecting a player, surface, and timeframe.'),
-                                        ]
-                                    ),
-                                    dbc.ModalFooter(
-                                        dbc.Button("Close", id="close1", className="ml-auto")
-                                    ),
-                            ],id="modal1",size="md",scrollable=True),
-                        ],className="d-grid gap-2")
-                    ],width=12)
-                ]),
-                dbc.Row([
-                    dbc.Col([
-                        dbc.Label('Choose a player:')
-                    ], width = 4),
-                    dbc.Col([
-                        dbc.Label('Choose a court surface:')
-                    ], width = 4),
-                    dbc.Col([
-                        dbc.Label('Choose a year range:')
-                    ], width = 4)
-                ]),
-                dbc.Row([
-                    dbc.Col([
-                        #----- Player filter
-                        dcc.Dropdown(
-                            id='dropdown0',
-                            style={'color':'black'},
-                            options=[{'label': i, 'value': i} for i in player_choices],
-                            value=player_choices[0]
-                        )
-                    ],width=4),
-                    dbc.Col([
-                        #----- Surface filter
-                        dcc.Dropdown(
-                            id='dropdown1',
-                            style={'color':'black'},
-                            options=[{'label': i, 'value': i} for i in surface_choices],
-                            value = surface_choices[1]
-                        )
-                    ],width=4),
-                        #----- Year filter
-                    dbc.Col([
-                        dcc.RangeSlider(
-                            id='range_slider',
-                            min=atp_df['year'].min(),
-                            max=atp_df['year'].max(),
-                            step=1,
-                            value=[
-                                atp_df['year'].min(), 
-                                atp_df['year'].max()
-                            ],
-                            allowCross=False,
-                            pushable=1,
-                            tooltip={"placement": "bottom", "always_visible": True},
-                            marks={
-                                1991: '1991',
-                                2000: '2000',
-                                2010: '2010',
-                                2020: '2020'
-                            }
-                        )
-                    ],width=4)
-                ]),
-                dbc.Row([
-                    dbc.Col([
-                        html.Div(id='matches_table')
-                    ], width = 12)
-                ])
-                    
-            ]
-       
+            children=html.Div(id='tab-2-content')
         ),
         dcc.Tab(label='Individual Stats',value='tab-3',style=tab_style, selected_style=tab_selected_style,
-        children=[
-            dbc.Row([
-                dbc.Col([
-                    html.Div([
-                        dbc.Button("Click Here for Instructions", id="open2",color='secondary',style={"fontSize":18}),
-                        dbc.Modal([
-                            dbc.ModalHeader("Instructions"),
-                            dbc.ModalBody(
-                                children=[
-                                    html.P('Below is a chart showcasing how the selected player has performed over time utilizing several statistics.'),
-                                    html.P('You can update the chart by selecting a player and one of the 8 available statistics.  Data is aggregated at the quarterly level.'),
-                                ]
-                            ),
-                            dbc.ModalFooter(
-                                dbc.Button("Close", id="close2", className="ml-auto")
-                            ),
-                        ],id="modal2",size="md",scrollable=True),
-                    ],className="d-grid gap-2")
-                ],width=12)
-            ]),
-            dbc.Row([
-                dbc.Col([
-                    dbc.Label('Choose a player:')
-                ], width = 6),
-                dbc.Col([
-                    dbc.Label('Choose a statistic:')
-                 ], width = 6),
-            ]),
-            dbc.Row([
-                dbc.Col([
-                #----- Player filter
-                    dcc.Dropdown(
-                        id='dropdown2',
-                        style={'color':'black'},
-                        options=[{'label': i, 'value': i} for i in player_choices],
-                        value='Rafael Nadal'
-                    )
-                ],width=6),  
-                dbc.Col([
-                 #----- Statistic filter
-                    dcc.Dropdown(
-                        id='dropdown3',
-                        style={'color':'black'},
-                        #multi = True,
-                        options=[{'label': i, 'value': i} for i in statistic_choices],
-                        value = statistic_choices[0]
-                    )
-                ],width=6),
-            ]),
-            dbc.Row([
-                dbc.Col([
-                    dcc.Graph(id='stat_timeline_chart')
-                ],width = 12)
-            ])
-        
-        ]),
+            children=html.Div(id='tab-3-content')
+        ),
         dcc.Tab(label='Head-to-Head Matchups',value='tab-4',style=tab_style, selected_style=tab_selected_style,
-            children = [
-                dbc.Row([
-                    dbc.Col([
-                        html.Div([
-                            dbc.Button("Click Here for Instructions", id="open3",color='secondary',style={"fontSize":18}),
-                            dbc.Modal([
-                                dbc.ModalHeader("Instructions"),
-                                dbc.ModalBody(
-                                    children=[
-                                        html.P('Below is a chart showcasing the cumulative wins earned for the selected player against the selected opponent.  Average match statistics are also presented.'),
-                                        html.P('You can update the chart and statistics by selecting a player and then select any of his opponents.'),
-                                    ]
-                                ),
-                                dbc.ModalFooter(
-                                    dbc.Button("Close", id="close3", className="ml-auto")
-                                ),
-                            ],id="modal3",size="md",scrollable=True),
-                        ],className="d-grid gap-2")
-                    ],width=12)
-                ]),
-                dbc.Row([
-                    dbc.Col([
-                        dbc.Label('Choose player:')
-                    ], width = 6),
-                    dbc.Col([
-                        dbc.Label('Choose opponent:')
-                    ], width = 6),
-                ]),
-                dbc.Row([
-                    dbc.Col([
-                    #----- Player filter
-                        dcc.Dropdown(
-                            id='dropdown4',
-                            style={'color':'black'},
-                            options=[{'label': i, 'value': i} for i in player_choices],
-                            value = 'Roger Federer'
-                        )
-                    ],width=6),
-                    dbc.Col([
-                    #----- Opponent filter
-                        dcc.Dropdown(
-                            id='dropdown5',
-                            style={'color':'black'},
-                            options=[{'label': i, 'value': i} for i in player_choices],
-                            value = player_choices[1]
-                        )
-                    ],width=6),
-                ]),
-                #----- Head to Head Stat Cards
-                dbc.Row([
-                    dbc.Col([
-                        dbc.Card(id = 'card0')
-                    ])
-                ]),
-                dbc.Row([
-                    dbc.Col([
-                        dbc.Card(id="card1")
-                    ],width=3),
-                    dbc.Col([
-                        dbc.Card(id="card2")
-                    ],width=3),
-                    dbc.Col([
-                        dbc.Card(id="card3")
-                    ],width=3),
-                    dbc.Col([
-                        dbc.Card(id="card4")
-                    ],width=3)
-                ],className="g-0"),
-                dbc.Row([
-                    dcc.Graph(id = 'cumulative_wins')
-                ])
-             
-
-            ]
+            children=html.Div(id='tab-4-content')
         ),
         dcc.Tab(label='Predict Winners',value='tab-5',style=tab_style, selected_style=tab_selected_style,
-            children=[
-                dbc.Row([
-                    dbc.Col([
-                        html.Div([
-                            dbc.Button("Click Here for Instructions", id="open4",color='secondary',style={"fontSize":18}),
-                            dbc.Modal([
-                                dbc.ModalHeader("Instructions"),
-                                dbc.ModalBody(
-                                    children=[
-                                        html.P('Below is a chart and table showcasing the results of fitting an XGBoost model to match-level statistics in order to predict the outcome of any ATP match.  In order to update the page, select a player and select a combination of surfaces.'),
-                                        html.P('The model used the number of aces, double faults, 1st serve in %, age of the player, surface, and the number of break points saved and faced to predict the outcome of the match.'),
-                                        html.P('The chart compares the actual outcome for the selected player (blue) and the predicted outcome (green).  The performance of the model can be analyzed using the 4 statistics above the chart and the confusion matrix to the right of the chart.'),
-                                        html.P('Accuracy measures the # of correct predictions (wins and losses) out of all predictions.  Precision measures how many predicted wins were correct out of all predicted wins (wins that were correct and incorrect).  Recall measures the number of correct predictions of wins out of all the predictions that should be wins (correct wins and wins that were predicted as losses). The F1 score measures the balance between precision and recall.')
-                                    ]
-                                ),
-                                dbc.ModalFooter(
-                                    dbc.Button("Close", id="close4", className="ml-auto")
-                                ),
-                            ],id="modal4",size="md",scrollable=True),
-                        ],className="d-grid gap-2")
-                    ],width=12)
-                ]),
-                dbc.Row([
-                    dbc.Col([
-                        dbc.Label('Choose a player:')
-                    ], width = 6),
-                    dbc.Col([
-                        dbc.Label('Choose a surface:')
-                    ], width = 6),
-                ]),
-                dbc.Row([
-                    dbc.Col([
-                    #----- Player filter
-                        dcc.Dropdown(
-                            id='dropdown6',
-                            options=[{'label': i, 'value': i} for i in player_choices],
-                            value = 'Roger Federer'
-                        )
-                    ],width=6),
-                    dbc.Col([
-                    #----- Surface filter
-                        dcc.Dropdown(
-                            id='dropdown7',
-                            style={'color':'black'},
-                            options=[{'label': i, 'value': i} for i in surface_choices],
-                            value = surface_choices[0:4],
-                            multi = True
-                        )
-                    ],width=6),
-                ]),
-                dbc.Row([
-                    dbc.Col([
-                        dbc.Card(id="card5")
-                    ],width=3),
-                    dbc.Col([
-                        dbc.Card(id="card6")
-                    ],width=3),
-                    dbc.Col([
-                        dbc.Card(id="card7")
-                    ],width=3),
-                    dbc.Col([
-                        dbc.Card(id="card8")
-                    ],width=3)
-                ],className="g-0"),
-
-                dbc.Row([
-                    dbc.Col([
-                        dcc.Graph(id = 'predicted_wins')
-                    ], width = 8),
-                    dbc.Col([
-                        dcc.Graph(id = 'confusion_matrix')
-                    ],width = 4)
-                ])
-            ]
+            children=html.Div(id='tab-5-content')
+        ),
+        dcc.Tab(label='Ratings',value='tab-6',style=tab_style, selected_style=tab_selected_style,
+            children=html.Div(id='tab-6-content')
         )
 
      
@@ -438,405 +229,519 @@ app.layout = html.Div([
 ])
 
 
-#Configure Reactivity for Tab Colors
-@app.callback(Output('tabs-content-inline', 'children'),
-              Input('tabs-styled-with-inline', 'value'))
-def render_content(tab):
-    if tab == 'tab-1':
-        return html.Div([
-            html.H3('Tab content 1')
-        ])
-    elif tab == 'tab-2':
-        return html.Div([
-            html.H3('Tab content 2')
-        ])
-    elif tab == 'tab-3':
-        return html.Div([
-            html.H3('Tab content 3')
-        ])
-    elif tab == 'tab-4':
-        return html.Div([
-            html.H3('Tab content 4')
-        ])
-    elif tab == 'tab-5':
-        return html.Div([
-            html.H3('Tab content 5')
+#----- Tabs other than Welcome are laid out the first time they are opened, so the page
+#is served before any data is loaded and each tab only waits for its own resources
+def match_history_layout():
+    '''Match History: master matches table filterable by player, surface, and year range.'''
+    player_choices, surface_choices, (first_year, last_year) = choices.get()
+    return [
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    dbc.Button("Click Here for Instructions", id="open1",color='secondary',style={"fontSize":18}),
+                    dbc.Modal([
+                            dbc.ModalHeader("Instructions"),
+                            dbc.ModalBody(
+                                children=[
+                                    html.P('Below is a player-specific table with details about each ATP match from 1991 to 2022.'),
+                                    html.P('You can update the table by selecting a player, surface, and timeframe.'),
+                                ]
+                            ),
+                            dbc.ModalFooter(
+                                dbc.Button("Close", id="close1", className="ml-auto")
+                            ),
+                    ],id="modal1",size="md",scrollable=True),
+                ],className="d-grid gap-2")
+            ],width=12)
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dbc.Label('Choose a player:')
+            ], width = 4),
+            dbc.Col([
+                dbc.Label('Choose a court surface:')
+            ], width = 4),
+            dbc.Col([
+                dbc.Label('Choose a year range:')
+            ], width = 4)
+        ]),
+        dbc.Row([
+            dbc.Col([
+                #----- Player filter
+                dcc.Dropdown(
+                    id='dropdown0',
+                    style={'color':'black'},
+                    options=[{'label': i, 'value': i} for i in player_choices],
+                    value=player_choices[0]
+                )
+            ],width=4),
+            dbc.Col([
+                #----- Surface filter
+                dcc.Dropdown(
+                    id='dropdown1',
+                    style={'color':'black'},
+                    options=[{'label': i, 'value': i} for i in surface_choices],
+                    value = surface_choices[1]
+                )
+            ],width=4),
+                #----- Year filter
+            dbc.Col([
+                dcc.RangeSlider(
+                    id='range_slider',
+                    min=first_year,
+                    max=last_year,
+                    step=1,
+                    value=[first_year, last_year],
+                    allowCross=False,
+                    pushable=1,
+                    tooltip={"placement": "bottom", "always_visible": True},
+                    marks={
+                        1991: '1991',
+                        2000: '2000',
+                        2010: '2010',
+                        2020: '2020'
+                    }
+                )
+            ],width=4)
+        ]),
+        dbc.Row([
+            dbc.Col([
+                #----- Paged and sorted on the server, only the visible page is sent
+                dash_table.DataTable(
+                    id='matches_table',
+                    columns=[{"name": i, "id": i} for i in match_table_columns.values()],
+                    style_data_conditional=[{
+                        'if': {'row_index': 'odd'},'backgroundColor': 'rgb(248, 248, 248)'}],
+                    style_header={'backgroundColor': 'rgb(230, 230, 230)','fontWeight': 'bold'},
+                    style_data={'width': '125px', 'minWidth': '125px', 'maxWidth': '125px','overflow': 'hidden','textOverflow': 'ellipsis'},
+                    sort_action='custom',sort_mode="multi",sort_by=[],
+                    page_action="custom", page_current= 0,page_size= 14,
+                    style_table={'overflowX': 'auto'}
+                )
+            ], width = 12)
         ])
-
-    
-#----- Tab #2: Master matches table filterable by player, surface, and
-@app.callback(
-    Output('matches_table','children'),
-    Input('dropdown0','value'),
-    Input('dropdown1','value'),
-    Input('range_slider','value')
-)
-def match_table(dd0, dd1, range_slider):
-
-    filtered = atp_df[
-        (atp_df['player_name']==dd0) &
-        (atp_df['surface']==dd1) &
-        (atp_df['year']>= range_slider[0]) &
-        (atp_df['year']<=range_slider[1])
     ]
-    #filtered = atp_df[atp_df['player_name']=='Roger Federer']
-    filtered = filtered[['tourney_name','surface','tourney_date','player_age', 'rank',
-                         'round','num_aces','num_dfs','serve1_in_perc',
-                         'serve1_win_perc','serve2_win_perc','num_brkpts_saved',
-                         'num_brkpts_faced','outcome','total_games_won',
-                         'total_games_lost','game_win_perc']]
-
-    new_df = filtered.rename(columns={
-                filtered.columns[0]: "Tourney Name",
-                filtered.columns[1]: "Surface",
-                filtered.columns[2]: "Tourney Date",
-                filtered.columns[3]: "Player Age",
-                filtered.columns[4]: "Rank",
-                filtered.columns[5]: "Round",
-                filtered.columns[6]: "# Aces",
-                filtered.columns[7]: "# Double Faults",
-                filtered.columns[8]: "1st Serve In %",
-                filtered.columns[9]: "1st Serve Win %",
-                filtered.columns[10]: "2nd Serve Win %",
-                filtered.columns[11]: "# Breakpoints Saved",
-                filtered.columns[12]: "# Breakpoints Faced",
-                filtered.columns[13]: "Outcome",
-                filtered.columns[14]: "# Games Won",
-                filtered.columns[15]: "# Games Lost",
-                filtered.columns[16]: "% Games Won"
-    })
-
-    round_order = ['F','SF','QF','R16','R32','R64','R128','RR','BR','ER']
-
-    new_df['Round'] = pd.Categorical(new_df['Round'], categories = round_order)
-    new_df = new_df.sort_values(['Tourney Date','Round'], ascending=[True, False])
-    new_df['% Games Won'] = new_df['% Games Won']*100
-    new_df = new_df.round(1)
-    new_df['% Games Won'].astype(str) + '%'
-    
-    return html.Div([
-        dash_table.DataTable(
-            columns=[{"name": i, "id": i} for i in new_df.columns],
-            style_data_conditional=[{
-                'if': {'row_index': 'odd'},'backgroundColor': 'rgb(248, 248, 248)'}],
-            style_header={'backgroundColor': 'rgb(230, 230, 230)','fontWeight': 'bold'},
-            #filter_action='native',
-            style_data={'width': '125px', 'minWidth': '125px', 'maxWidth': '125px','overflow': 'hidden','textOverflow': 'ellipsis'},
-            sort_action='native',sort_mode="multi",
-            page_action="native", page_current= 0,page_size= 14,                     
-            data=new_df.to_dict('records'),
-            style_table={'overflowX': 'auto'}
-
 
-        )
-    ])
-
-#----- Tab 3: Individual Stats filterable by player and specific statistic
-
-@app.callback(
-    Output('stat_timeline_chart','figure'),
-    Input('dropdown2','value'),
-    Input('dropdown3','value')
-)
-def stat_timeline_chart(dd2, dd3):
 
-    filtered = atp_df[atp_df['player_name']==dd2] 
+def individual_stats_layout():
+    '''Individual Stats: statistics over time filterable by player and statistic.'''
+    player_choices, _, _ = choices.get()
+    return [
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    dbc.Button("Click Here for Instructions", id="open2",color='secondary',style={"fontSize":18}),
+                    dbc.Modal([
+                        dbc.ModalHeader("Instructions"),
+                        dbc.ModalBody(
+                            children=[
+                                html.P('Below is a chart showcasing how the selected player has performed over time utilizing several statistics.'),
+                                html.P('You can update the chart by selecting a player and one of the 8 available statistics.  Data is aggregated at the quarterly level.'),
+                            ]
+                        ),
+                        dbc.ModalFooter(
+                            dbc.Button("Close", id="close2", className="ml-auto")
+                        ),
+                    ],id="modal2",size="md",scrollable=True),
+                ],className="d-grid gap-2")
+            ],width=12)
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dbc.Label('Choose a player:')
+            ], width = 6),
+            dbc.Col([
+                dbc.Label('Choose a statistic:')
+             ], width = 6),
+        ]),
+        dbc.Row([
+            dbc.Col([
+            #----- Player filter
+                dcc.Dropdown(
+                    id='dropdown2',
+                    style={'color':'black'},
+                    options=[{'label': i, 'value': i} for i in player_choices],
+                    value='Rafael Nadal'
+                )
+            ],width=6),  
+            dbc.Col([
+             #----- Statistic filter
+                dcc.Dropdown(
+                    id='dropdown3',
+                    style={'color':'black'},
+                    #multi = True,
+                    options=[{'label': i, 'value': i} for i in statistic_choices],
+                    value = statistic_choices[0]
+                )
+            ],width=6),
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='stat_timeline_chart'),
+                dcc.Store(id='stat_timeline_store')
+            ],width = 12)
+        ])
+    ]
 
-    #filtered = atp_df[atp_df['player_name']=='Roger Federer']
 
-    filtered = filtered[['tourney_name','surface','tourney_date','player_age', 
-                        'rank','num_aces','num_dfs','serve1_in_perc',
-                         'serve1_win_perc','serve2_win_perc','num_brkpts_saved',
-                         'num_brkpts_faced','outcome','game_win_perc']]
+def head_to_head_layout():
+    '''Head-to-Head Matchups: player vs. opponent cards and cumulative wins.'''
+    player_choices, _, _ = choices.get()
+    return [
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    dbc.Button("Click Here for Instructions", id="open3",color='secondary',style={"fontSize":18}),
+                    dbc.Modal([
+                        dbc.ModalHeader("Instructions"),
+                        dbc.ModalBody(
+                            children=[
+                                html.P('Below is a chart showcasing the cumulative wins earned for the selected player against the selected opponent.  Average match statistics are also presented.'),
+                                html.P('You can update the chart and statistics by selecting a player and then select any of his opponents.'),
+                            ]
+                        ),
+                        dbc.ModalFooter(
+                            dbc.Button("Close", id="close3", className="ml-auto")
+                        ),
+                    ],id="modal3",size="md",scrollable=True),
+                ],className="d-grid gap-2")
+            ],width=12)
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dbc.Label('Choose player:')
+            ], width = 6),
+            dbc.Col([
+                dbc.Label('Choose opponent:')
+            ], width = 6),
+        ]),
+        dbc.Row([
+            dbc.Col([
+            #----- Player filter
+                dcc.Dropdown(
+                    id='dropdown4',
+                    style={'color':'black'},
+                    options=[{'label': i, 'value': i} for i in player_choices],
+                    value = 'Roger Federer'
+                )
+            ],width=6),
+            dbc.Col([
+            #----- Opponent filter
+                dcc.Dropdown(
+                    id='dropdown5',
+                    style={'color':'black'},
+                    options=[{'label': i, 'value': i} for i in player_choices],
+                    value = player_choices[1]
+                )
+            ],width=6),
+        ]),
+        #----- Head to Head Stat Cards
+        dbc.Row([
+            dbc.Col([
+                dbc.Card(id = 'card0')
+            ])
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dbc.Card(id="card1")
+            ],width=3),
+            dbc.Col([
+                dbc.Card(id="card2")
+            ],width=3),
+            dbc.Col([
+                dbc.Card(id="card3")
+            ],width=3),
+            dbc.Col([
+                dbc.Card(id="card4")
+            ],width=3)
+        ],className="g-0"),
+        dbc.Row([
+            dcc.Graph(id = 'cumulative_wins')
+        ])
+    ]
 
-    filtered['game_win_perc'] = filtered['game_win_perc']*100
 
+def predict_winners_layout():
+    '''Predict Winners: actual vs. predicted wins and model performance.'''
+    player_choices, surface_choices, _ = choices.get()
+    return [
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    dbc.Button("Click Here for Instructions", id="open4",color='secondary',style={"fontSize":18}),
+                    dbc.Modal([
+                        dbc.ModalHeader("Instructions"),
+                        dbc.ModalBody(
+                            children=[
+                                html.P('Below is a chart and table showcasing the results of fitting an XGBoost model to match-level statistics in order to predict the outcome of any ATP match.  In order to update the page, select a player and select a combination of surfaces.'),
+                                html.P('The model used the number of aces, double faults, 1st serve in %, age of the player, surface, and the number of break points saved and faced to predict the outcome of the match.'),
+                                html.P('The chart compares the actual outcome for the selected player (blue) and the predicted outcome (green).  The performance of the model can be analyzed using the 4 statistics above the chart and the confusion matrix to the right of the chart.'),
+                                html.P('Accuracy measures the # of correct predictions (wins and losses) out of all predictions.  Precision measures how many predicted wins were correct out of all predicted wins (wins that were correct and incorrect).  Recall measures the number of correct predictions of wins out of all the predictions that should be wins (correct wins and wins that were predicted as losses). The F1 score measures the balance between precision and recall.'),
+                                html.P('The charts below the predictions explain them: how much each statistic pushed the model towards a win (positive) or a loss (negative) in every match, and on average over the selected matches.  They are SHAP values in log-odds, as computed by XGBoost for every match.')
+                            ]
+                        ),
+                        dbc.ModalFooter(
+                            dbc.Button("Close", id="close4", className="ml-auto")
+                        ),
+                    ],id="modal4",size="md",scrollable=True),
+                ],className="d-grid gap-2")
+            ],width=12)
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dbc.Label('Choose a player:')
+            ], width = 6),
+            dbc.Col([
+                dbc.Label('Choose a surface:')
+            ], width = 6),
+        ]),
+        dbc.Row([
+            dbc.Col([
+            #----- Player filter
+                dcc.Dropdown(
+                    id='dropdown6',
+                    options=[{'label': i, 'value': i} for i in player_choices],
+                    value = 'Roger Federer'
+                )
+            ],width=6),
+            dbc.Col([
+            #----- Surface filter
+                dcc.Dropdown(
+                    id='dropdown7',
+                    style={'color':'black'},
+                    options=[{'label': i, 'value': i} for i in surface_choices],
+                    value = surface_choices[0:4],
+                    multi = True
+                )
+            ],width=6),
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dbc.Card(id="card5")
+            ],width=3),
+            dbc.Col([
+                dbc.Card(id="card6")
+            ],width=3),
+            dbc.Col([
+                dbc.Card(id="card7")
+            ],width=3),
+            dbc.Col([
+                dbc.Card(id="card8")
+            ],width=3)
+        ],className="g-0"),
+
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id = 'predicted_wins')
+            ], width = 8),
+            dbc.Col([
+                dcc.Graph(id = 'confusion_matrix')
+            ],width = 4)
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id = 'match_attributions')
+            ], width = 8),
+            dbc.Col([
+                dcc.Graph(id = 'feature_attributions')
+            ],width = 4)
+        ])
+    ]
 
-    stats_df = filtered.groupby(['tourney_date','surface']).agg({
-        'num_aces':'sum',
-        'num_dfs':'sum',
-        'serve1_in_perc':'mean',
-        'serve1_win_perc':'mean',
-        'serve2_win_perc':'mean',
-        'game_win_perc': 'mean',
-        'num_brkpts_faced':'sum',
-        'num_brkpts_saved':'sum'
-    }).reset_index()
 
-    stats_df['tourney_date'] = pd.to_datetime(stats_df['tourney_date'], format='%Y%m%d')  
-    
-    first_match = stats_df['tourney_date'].min()
-    last_match = stats_df['tourney_date'].max()
+def ratings_layout():
+    '''Ratings: Elo rating timelines and the ratings on a chosen date.'''
+    player_choices, surface_choices, (_, last_year) = choices.get()
+    return [
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    dbc.Button("Click Here for Instructions", id="open5",color='secondary',style={"fontSize":18}),
+                    dbc.Modal([
+                        dbc.ModalHeader("Instructions"),
+                        dbc.ModalBody(
+                            children=[
+                                html.P('Below is a chart of the Elo ratings of the selected players over their careers and a table of their ratings on the selected date.'),
+                                html.P('Every player starts at 1500.  After each match the winner takes rating points from the loser: more for an upset, fewer when the favorite wins, and fewer as a player plays more matches.  Surface ratings only count the matches played on that surface.'),
+                                html.P('You can update the chart and table by selecting players, a surface, and a date.')
+                            ]
+                        ),
+                        dbc.ModalFooter(
+                            dbc.Button("Close", id="close5", className="ml-auto")
+                        ),
+                    ],id="modal5",size="md",scrollable=True),
+                ],className="d-grid gap-2")
+            ],width=12)
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dbc.Label('Choose players:')
+            ], width = 6),
+            dbc.Col([
+                dbc.Label('Choose a surface:')
+            ], width = 3),
+            dbc.Col([
+                dbc.Label('Ratings on:')
+            ], width = 3),
+        ]),
+        dbc.Row([
+            dbc.Col([
+            #----- Player filter
+                dcc.Dropdown(
+                    id='dropdown8',
+                    style={'color':'black'},
+                    options=[{'label': i, 'value': i} for i in player_choices],
+                    value = ['Roger Federer', 'Rafael Nadal', 'Novak Djokovic'],
+                    multi = True
+                )
+            ],width=6),
+            dbc.Col([
+            #----- Surface filter
+                dcc.Dropdown(
+                    id='dropdown9',
+                    style={'color':'black'},
+                    options=[{'label': i, 'value': i} for i in ['All Surfaces'] + surface_choices],
+                    value = 'All Surfaces'
+                )
+            ],width=3),
+            dbc.Col([
+            #----- Date of the ratings table
+                dcc.DatePickerSingle(
+                    id='rating_date',
+                    date=f'{last_year}-12-31',
+                    display_format='YYYY-MM-DD'
+                )
+            ],width=3),
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id = 'rating_timeline')
+            ], width = 8),
+            dbc.Col([
+                dash_table.DataTable(
+                    id='ratings_on_date',
+                    columns=[{"name": i, "id": i} for i in ['Player', 'Elo Rating', 'Matches']],
+                    style_data_conditional=[{
+                        'if': {'row_index': 'odd'},'backgroundColor': 'rgb(248, 248, 248)'}],
+                    style_header={'backgroundColor': 'rgb(230, 230, 230)','fontWeight': 'bold'}
+                )
+            ],width = 4)
+        ])
+    ]
 
-    delta = last_match - first_match
-    num_days = delta.days
 
+TAB_LAYOUTS = {
+    'tab-2': match_history_layout,
+    'tab-3': individual_stats_layout,
+    'tab-4': head_to_head_layout,
+    'tab-5': predict_winners_layout,
+    'tab-6': ratings_layout
+}
 
-    my_range = pd.date_range(
-        min(stats_df['tourney_date']), 
-        periods=num_days, 
-        freq='1d'
-    )
 
-    date_df = pd.DataFrame(my_range)
-    date_df = date_df.rename(columns={date_df.columns[0]: "tourney_date"})
+@app.callback(
+    [Output(f'{tab}-content', 'children') for tab in TAB_LAYOUTS],
+    Input('tabs', 'value'),
+    [State(f'{tab}-content', 'children') for tab in TAB_LAYOUTS]
+)
+def render_content(tab, *contents):
+    #A tab laid out once keeps its children, and with them the user's selections
+    return [
+        TAB_LAYOUTS[name]() if name == tab and not content else dash.no_update
+        for name, content in zip(TAB_LAYOUTS, contents)
+    ]
 
-    full_days_df = pd.merge(
-        date_df,
-        stats_df,
-        on = 'tourney_date',
-        how = 'left'
-    )
 
-    full_days_df['year'] = full_days_df['tourney_date'].astype(str).str[0:4]
-    full_days_df['quarter'] = full_days_df['tourney_date'].dt.quarter
-    full_days_df['yq'] = full_days_df['year'].astype(str) + "Q" + full_days_df['quarter'].astype(str)
-    full_days_df['quarter_date'] = pd.PeriodIndex(
-        full_days_df['tourney_date'], freq='Q'
-    ).to_timestamp()
-
-
-
-    line_chart_df = full_days_df.groupby(['quarter_date','surface']).agg({
-        'num_aces':'sum',
-        'num_dfs':'sum',
-        'serve1_in_perc':'mean',
-        'serve1_win_perc':'mean',
-        'serve2_win_perc':'mean',
-        'game_win_perc': 'mean',
-        'num_brkpts_faced':'sum',
-        'num_brkpts_saved':'sum'
-
-    }).reset_index()
-
-    #----- Stat #1: % Games Won
-    if statistic_choices[0] in dd3:
-
-        line_chart = px.line(
-                line_chart_df, 
-                color = 'surface',
-                x="quarter_date", 
-                y="game_win_perc", 
-                markers=True,
-                template = 'plotly_dark',
-                labels={"quarter_date": "Month-Year (Q)",
-                        "game_win_perc": "% Games Won"
-                }
-        )
+#----- Tab #2: Master matches table filterable by player, surface, and year range
+@app.callback(
+    Output('matches_table','data'),
+    Output('matches_table','page_count'),
+    Input('dropdown0','value'),
+    Input('dropdown1','value'),
+    Input('range_slider','value'),
+    Input('matches_table','page_current'),
+    Input('matches_table','page_size'),
+    Input('matches_table','sort_by')
+)
+@cached_callback
+def match_table(dd0, dd1, range_slider, page_current, page_size, sort_by):
+    import pandas as pd
 
-        line_chart.update_layout(
-            title_x=0.5,
-            legend_title=None,
-            legend=dict(
-                orientation="h",
-                yanchor="top",
-                y=1.075,
-                xanchor="center",
-                x=0.5
-            )
-        )
-        return line_chart
-
-    #----- Stat #2: 1st Serve in %
-    elif statistic_choices[1] in dd3:
-
-        line_chart = px.line(
-                line_chart_df, 
-                color = 'surface',
-                x="quarter_date", 
-                y="serve1_in_perc", 
-                markers=True,
-                template = 'plotly_dark',
-                labels={"quarter_date": "Month-Year (Q)",
-                        "serve1_in_perc": "1st Serve in %"
-                }
-        )
-        line_chart.update_layout(
-            title_x=0.5,
-            legend_title=None,
-            legend=dict(
-                orientation="h",
-                yanchor="top",
-                y=1.075,
-                xanchor="center",
-                x=0.5
-            )
-        )
+    atp_df, player_index = matches.get()
 
-        return line_chart
+    #Player rows are in season order, so the year range is a slice of them
+    player_df = year_rows(player_rows(atp_df, player_index, dd0), range_slider[0], range_slider[1])
+    count_rows(len(player_df))
+    filtered = player_df[player_df['surface']==dd1]
+    filtered = filtered[list(match_table_columns)]
 
-    #----- Stat #3: 1st Serve Win %
-    elif statistic_choices[2] in dd3:
-    
-        line_chart = px.line(
-                line_chart_df, 
-                color = 'surface',
-                x="quarter_date", 
-                y="serve1_win_perc", 
-                markers=True,
-                template = 'plotly_dark',
-                labels={"quarter_date": "Month-Year (Q)",
-                        "serve1_win_perc": "1st Serve Win %"
-                }
-        )
-        line_chart.update_layout(
-            title_x=0.5,
-            legend_title=None,
-            legend=dict(
-                orientation="h",
-                yanchor="top",
-                y=1.075,
-                xanchor="center",
-                x=0.5
-            )
-        )
+    #Rounds sort in draw order rather than alphabetically
+    round_order = ['F','SF','QF','R16','R32','R64','R128','RR','BR','ER']
+    filtered = filtered.assign(round=pd.Categorical(filtered['round'], categories = round_order))
 
-        return line_chart
-
-    #----- Stat #4: 2nd Serve Win %
-    elif statistic_choices[3] in dd3:
-        
-        line_chart = px.line(
-                line_chart_df, 
-                color = 'surface',
-                x="quarter_date", 
-                y="serve2_win_perc", 
-                markers=True,
-                template = 'plotly_dark',
-                labels={"quarter_date": "Month-Year (Q)",
-                        "serve2_win_perc": "2nd Serve Win %"
-                }
-        )
-        line_chart.update_layout(
-            title_x=0.5,
-            legend_title=None,
-            legend=dict(
-                orientation="h",
-                yanchor="top",
-                y=1.075,
-                xanchor="center",
-                x=0.5
-            )
-        )
+    #Default order is by date with the earliest rounds first, otherwise whatever columns were clicked
+    if sort_by:
+        column_ids = {v: k for k, v in match_table_columns.items()}
+        sort_columns = [column_ids[col['column_id']] for col in sort_by]
+        ascending = [col['direction'] == 'asc' for col in sort_by]
+    else:
+        sort_columns, ascending = ['tourney_date','round'], [True, False]
+    filtered = filtered.sort_values(sort_columns, ascending=ascending, kind='stable')
 
-        return line_chart
-
-    #----- Stat #5: Aces
-    elif statistic_choices[4] in dd3:
-            
-        line_chart = px.line(
-                line_chart_df, 
-                color = 'surface',
-                x="quarter_date", 
-                y="num_aces", 
-                markers=True,
-                template = 'plotly_dark',
-                labels={"quarter_date": "Month-Year (Q)",
-                        "num_aces": "# Aces"
-                }
-        )
-        line_chart.update_layout(
-            title_x=0.5,
-            legend_title=None,
-            legend=dict(
-                orientation="h",
-                yanchor="top",
-                y=1.075,
-                xanchor="center",
-                x=0.5
-            )
-        )
+    page_count = max(1, -(-len(filtered) // page_size))
+    page_current = min(page_current or 0, page_count - 1)
+    page = filtered.iloc[page_current*page_size:(page_current + 1)*page_size]
 
-        return line_chart
-
-    #----- Stat #6: Break Points Faced
-    elif statistic_choices[5] in dd3:
-            
-        line_chart = px.line(
-                line_chart_df, 
-                color = 'surface',
-                x="quarter_date", 
-                y="num_brkpts_faced", 
-                markers=True,
-                template = 'plotly_dark',
-                labels={"quarter_date": "Month-Year (Q)",
-                        "num_brkpts_faced": "# Break Points Faced"
-                }
-            )
-        line_chart.update_layout(
-            title_x=0.5,
-            legend_title=None,
-            legend=dict(
-                orientation="h",
-                yanchor="top",
-                y=1.075,
-                xanchor="center",
-                x=0.5
-            )
-        )
+    new_df = page.rename(columns=match_table_columns)
+    #float32 stats would otherwise serialize as e.g. 8.100000381469727 after rounding
+    new_df = new_df.astype({col: 'float64' for col in new_df.select_dtypes('float32').columns})
+    new_df['% Games Won'] = new_df['% Games Won']*100
+    new_df = new_df.round(1)
 
-        return line_chart
-
-    #----- Stat #7: Break Points Saved
-    elif statistic_choices[6] in dd3:
-            
-        line_chart = px.line(
-                line_chart_df, 
-                color = 'surface',
-                x="quarter_date", 
-                y="num_brkpts_saved", 
-                markers=True,
-                template = 'plotly_dark',
-                labels={"quarter_date": "Month-Year (Q)",
-                        "num_brkpts_saved": "# Break Points Saved"
-                }
-        )
+    return new_df.to_dict('records'), page_count
 
-        line_chart.update_layout(
-            title_x=0.5,
-            legend_title=None,
-            legend=dict(
-                orientation="h",
-                yanchor="top",
-                y=1.075,
-                xanchor="center",
-                x=0.5
-            )
-        )
+#----- Tab 3: Individual Stats filterable by player and specific statistic
+#The server sends every statistic for the selected player once; switching statistics
+#is handled in the browser by atp.statTimeline (assets/clientside.js)
+@app.callback(
+    Output('stat_timeline_store','data'),
+    Input('dropdown2','value')
+)
+@cached_callback
+def stat_timeline_data(dd2):
+    import pandas as pd
 
-        return line_chart
+    quarterly_stats, quarterly_stats_index = individual_stats.get()
 
+    #Quarterly aggregates for every player are built once at load time
+    line_chart_df = player_rows(quarterly_stats, quarterly_stats_index, dd2)
+    count_rows(len(line_chart_df))
 
+    #One line per surface, in the order the surfaces first show up in the player's career
+    surfaces = line_chart_df['surface'].to_numpy()
+    x = date_strings(line_chart_df['quarter_date'].to_numpy())
 
-    #----- Stat #8: # Double Faults
-    elif statistic_choices[7] in dd3:
-            
-        line_chart = px.line(
-                line_chart_df, 
-                color = 'surface',
-                x="quarter_date", 
-                y="num_dfs", 
-                markers=True,
-                template = 'plotly_dark',
-                labels={"quarter_date": "Month-Year (Q)",
-                        "num_dfs": "# Double Faults"
-                }
+    traces = [
+        line_trace(
+            x[surfaces==surface],
+            {column: line_chart_df[column].to_numpy()[surfaces==surface] for column, _ in stat_columns.values()},
+            surface
         )
+        for surface in pd.unique(surfaces)
+    ]
 
-        line_chart.update_layout(
-            title_x=0.5,
-            legend_title=None,
-            legend=dict(
-                orientation="h",
-                yanchor="top",
-                y=1.075,
-                xanchor="center",
-                x=0.5
-            )
-        )
+    return {
+        'figure': line_figure(traces, x_title="Month-Year (Q)"),
+        'stat_columns': stat_columns
+    }
 
 
-        return line_chart
+app.clientside_callback(
+    ClientsideFunction(namespace='atp', function_name='statTimeline'),
+    Output('stat_timeline_chart','figure'),
+    Input('stat_timeline_store','data'),
+    Input('dropdown3','value')
+)
 
 
 #--- Set up a dependent dropdown menu for head to head tab (tab 4) - player vs. opponent
@@ -845,13 +750,14 @@ def stat_timeline_chart(dd2, dd3):
     Output('dropdown5', 'value'),
     Input('dropdown4', 'value') #----- Select the player
 )
+@cached_callback
 def set_character_options(selected_player):
+    _, opponent_map = head_to_head.get()
 
-    if selected_player == "Roger Federer":
-        return [{'label': i, 'value': i} for i in player_opponents_dict[selected_player]], player_opponents_dict[selected_player][196]
-    else:
-
-        return [{'label': i, 'value': i} for i in player_opponents_dict[selected_player]], player_opponents_dict[selected_player][0]
+    #Each opponent listed once, most frequent first, so the default is the player's biggest rival
+    opponents, _ = player_opponents(opponent_map, selected_player)
+    count_rows(len(opponents))
+    return [{'label': i, 'value': i} for i in opponents], (opponents[0] if opponents else None)
 
 
 #----- Callback to update all the head-to-head statistics on tab 4
@@ -865,16 +771,12 @@ def set_character_options(selected_player):
     Input('dropdown5', 'value')
 )
 
+@cached_callback
 def head_to_head_match_stats(dd4, dd5):
-    player1_df = atp_df[atp_df['player_name']==dd4]
-    player2_df = atp_df[atp_df['player_name']==dd5]
-
-    new_df = pd.merge(
-        player1_df,
-        player2_df,
-        how = 'inner',
-        on = ['tourney_id','match_num']
-    )
+    atp_df, _ = matches.get()
+    pair_index, _ = head_to_head.get()
+    new_df = pair_matches(atp_df, pair_index, dd4, dd5)
+    count_rows(len(new_df))
 
     win_df = new_df[new_df['outcome_x']==1]
     loss_df = new_df[new_df['outcome_x']==0]
@@ -978,98 +880,42 @@ def head_to_head_match_stats(dd4, dd5):
     Input('dropdown4','value'),
     Input('dropdown5','value')
 )
+@cached_callback
 def cumulative_wins(dd4, dd5):
+    atp_df, _ = matches.get()
+    pair_index, _ = head_to_head.get()
+
+    #Pair index rows are already sorted by tourney_date
+    new_df = pair_matches(atp_df, pair_index, dd4, dd5)
+    count_rows(len(new_df))
+
+    match_num = np.arange(1, len(new_df) + 1)
+    customdata = np.column_stack([
+        new_df['tourney_name_x'].astype(str).to_numpy(),
+        date_strings(new_df['tourney_date_x'].to_numpy()),
+        new_df['surface_x'].astype(str).to_numpy()
+    ])
 
-    player1_df = atp_df[atp_df['player_name']==dd4]
-    player2_df = atp_df[atp_df['player_name']==dd5]
-
-    #player1_df = atp_df[atp_df['player_name']=="Rafael Nadal"]
-    #player2_df = atp_df[atp_df['player_name']=="Roger Federer"]
-
-    new_df = pd.merge(
-        player1_df,
-        player2_df,
-        how = 'inner',
-        on = ['tourney_id','match_num']
-    )
-
-    cum_win_df  = new_df[[
-        'tourney_id','tourney_name_x','surface_x', 'tourney_date_x',
-        'player_name_x','outcome_x','player_name_y','outcome_y'
-    ]]
-    cum_win_df = cum_win_df.sort_values(['tourney_date_x'], ascending=True)
-
-    cum_win_df['cum_wins_x'] = cum_win_df['outcome_x'].cumsum()
-    cum_win_df['cum_wins_y'] = cum_win_df['outcome_y'].cumsum()
-    cum_win_df['Match #'] = range(len(cum_win_df))
-
-
-    df1 = cum_win_df[[
-        'tourney_id','tourney_name_x','surface_x',
-        'tourney_date_x','player_name_x','cum_wins_x',
-        'Match #'
-    ]]
-    df1 = df1.rename(columns={
-        'player_name_x': "player_name",
-        'cum_wins_x':'cum_wins'
-    })
-
-    df2 = cum_win_df[[
-        'tourney_id','tourney_name_x','surface_x',
-        'tourney_date_x','player_name_y','cum_wins_y',
-        'Match #'
-    ]]
-    df2 = df2.rename(columns={
-        'player_name_y': "player_name",
-        'cum_wins_y':'cum_wins'
-    })
-
-    df_stacked = pd.concat([df1, df2])
-    df_stacked['Match #'] = df_stacked['Match #'] + 1 
-    df_stacked['tourney_date_x'] = pd.to_datetime(df_stacked['tourney_date_x'], format='%Y%m%d').dt.date
-    
-    line_chart = px.line(
-        df_stacked, 
-        x = "Match #", 
-        color = 'player_name',
-        y = "cum_wins", 
-        markers=True,
-        template = 'plotly_dark',
-        hover_data = {
-            "player_name":True,
-            "tourney_name_x":True,
-            "tourney_date_x":True,
-            "surface_x":True,
-            "cum_wins":True,
-            "tourney_id":False,
-            #"# Match":False
-        },
-        labels={
-            "tourney_id": "Tourney-ID",
-            "tourney_name_x": "Tourney Name",
-            "surface_x": "Surface",
-            "tourney_date_x":"Tourney Date",
-            "player_name": "Player Name",
-            "cum_wins":"Cumulative Wins"
-        }
-    )
-
-    line_chart.update_layout(
-        title_text=f"Cumulative Games Won ({dd4} vs. {dd5})", 
-        title_x=0.5,
-        legend_title=None,
-        legend=dict(
-            orientation="h",
-            yanchor="top",
-            y=1.075,
-            xanchor="center",
-            x=0.5
+    traces = [
+        line_trace(
+            match_num, new_df[outcome].cumsum().to_numpy(), player,
+            customdata=customdata,
+            hovertemplate=(
+                f'Player Name={player}<br>Match #=%{{x}}<br>Cumulative Wins=%{{y}}<br>'
+                'Tourney Name=%{customdata[0]}<br>Tourney Date=%{customdata[1]}<br>'
+                'Surface=%{customdata[2]}<extra></extra>'
+            )
         )
-    )
-
-    line_chart.update_xaxes(type='category')
+        for player, outcome in [(dd4, 'outcome_x'), (dd5, 'outcome_y')]
+    ]
 
-    return line_chart
+    return line_figure(
+        traces,
+        x_title="Match #",
+        y_title="Cumulative Wins",
+        title=f"Cumulative Games Won ({dd4} vs. {dd5})",
+        category_x=True
+    )
 
 #----- Callback for everything on tab 5 - XGBoost model results
 
@@ -1083,138 +929,78 @@ def cumulative_wins(dd4, dd5):
     Input('dropdown6','value'),
     Input('dropdown7','value')
 )
+@cached_callback
 def pred_cumulative_wins(dd6, dd7):
+    atp_df, player_index = matches.get()
+    model_metrics, model_metrics_index = predict_winners.get()
 
-    player_df = atp_df[atp_df['player_name']==dd6]
+    player_df = player_rows(atp_df, player_index, dd6)
+    count_rows(len(player_df))
     surface_player_df = player_df[player_df['surface'].isin(dd7)]
 
     #player_df = atp_df[atp_df['player_name']=="Rafael Nadal"]
    
+    #Player rows are already in date order
     pred_cum_win_df  = surface_player_df[[
         'tourney_id','tourney_name','surface', 'tourney_date',
         'player_name','outcome','pred_wins'
     ]]
-    pred_cum_win_df = pred_cum_win_df.sort_values(['tourney_date'], ascending=True)
-
-    pred_cum_win_df['Match #'] = range(len(pred_cum_win_df))
-
-
-    pred_cum_win_df['Match #'] = pred_cum_win_df['Match #'] + 1 
-    pred_cum_win_df['tourney_date'] = pd.to_datetime(pred_cum_win_df['tourney_date'], format='%Y%m%d').dt.date
-    
-    actuals = pred_cum_win_df.loc[:, pred_cum_win_df.columns != 'pred_wins']
-    actuals['type'] = "Actual"
-    predictions = pred_cum_win_df.loc[:, pred_cum_win_df.columns != 'outcome']
-    predictions['type'] = "Prediction"
 
+    match_num = np.arange(1, len(pred_cum_win_df) + 1)
+    customdata = np.column_stack([
+        pred_cum_win_df['tourney_name'].astype(str).to_numpy(),
+        date_strings(pred_cum_win_df['tourney_date'].to_numpy()),
+        pred_cum_win_df['surface'].astype(str).to_numpy()
+    ])
 
-    actuals = actuals.rename(
-        columns={"outcome": "Outcome"}
-    )
-
-    predictions = predictions.rename(
-        columns={"pred_wins": "Outcome"}
-    )
-
-
-    actuals['cum_wins'] = actuals['Outcome'].cumsum()
-    predictions['cum_wins'] = predictions['Outcome'].cumsum()
-
-    df_stacked = pd.concat([actuals, predictions])
-
-
-    line_chart = px.line(
-        df_stacked, 
-        x = "Match #", 
-        color = 'type',
-        y = "cum_wins", 
-        markers=True,
-        template = 'plotly_dark',
-        hover_data = {
-            "tourney_name":True,
-            "tourney_date":True,
-            "surface":True,
-            "cum_wins":True,
-            "tourney_id":False,
-            #"# Match":False
-        },
-        labels={
-            "tourney_id": "Tourney-ID",
-            "tourney_name": "Tourney Name",
-            "surface": "Surface",
-            "tourney_date":"Tourney Date",
-            "cum_wins":"Cumulative Wins"
-        }
-    )
-
-    line_chart.update_layout(
-        title_text=f"{dd6} Predicted Wins vs. Actual Wins", 
-        title_x=0.5,
-        legend_title=None,
-        legend=dict(
-            orientation="h",
-            yanchor="top",
-            y=1.075,
-            xanchor="center",
-            x=0.5
+    #Predictions in green
+    traces = [
+        line_trace(
+            match_num, pred_cum_win_df[outcome].cumsum().to_numpy(), kind,
+            color=color,
+            customdata=customdata,
+            hovertemplate=(
+                f'type={kind}<br>Match #=%{{x}}<br>Cumulative Wins=%{{y}}<br>'
+                'Tourney Name=%{customdata[0]}<br>Tourney Date=%{customdata[1]}<br>'
+                'Surface=%{customdata[2]}<extra></extra>'
+            )
         )
-    )
-
-    line_chart.update_xaxes(type='category')
-    #line_chart['data'][1]['line']['dash'] = 'dash'
-    #line_chart['data'][0]['line']['color']='#2DFE54'
-
-    line_chart['data'][1]['line']['color']='#2DFE54'
-
-    #----- Measuring how well the predictions are doing
-    cm_df = pred_cum_win_df[['outcome','pred_wins']]
-
-    conditions = [
-        ((cm_df['outcome'] == 1) & (cm_df['pred_wins'] == 1)),
-        ((cm_df['outcome'] == 0) & (cm_df['pred_wins'] == 0)),
-        ((cm_df['outcome'] == 1) & (cm_df['pred_wins'] == 0)),
-        ((cm_df['outcome'] == 0) & (cm_df['pred_wins'] == 1))
+        for kind, outcome, color in [('Actual', 'outcome', COLORWAY[0]), ('Prediction', 'pred_wins', '#2DFE54')]
     ]
 
-    values = [
-        'Actual Win, Pred Win', 
-        'Actual Win, Pred Loss', 
-        'Actual Loss, Pred Loss', 
-        'Actual Loss, Pred Win'
-    ]
+    line_chart = line_figure(
+        traces,
+        x_title="Match #",
+        y_title="Cumulative Wins",
+        title=f"{dd6} Predicted Wins vs. Actual Wins",
+        category_x=True
+    )
 
-    cm_df['cm'] = np.select(conditions, values)
+    #----- Measuring how well the predictions are doing
+    #Sum the player's precomputed counts over the selected surfaces (one row each)
+    player_metrics = player_rows(model_metrics, model_metrics_index, dd6)
+    true_pos, false_pos, true_neg, false_neg = (
+        player_metrics.loc[player_metrics['surface'].isin(dd7), CONFUSION_COLUMNS].sum().to_numpy()
+    )
 
     matrix = np.array([
-        [cm_df['cm'].value_counts()[0],cm_df['cm'].value_counts()[1]],
-        [cm_df['cm'].value_counts()[3],cm_df['cm'].value_counts()[2]]
+        [true_pos, false_neg],
+        [false_pos, true_neg]
     ])
 
     Index= ['Actual Win', 'Actual Loss']
     Cols = ['Predicted Win', 'Predicted Loss']
-    heat_map_df = pd.DataFrame(matrix, index=Index, columns=Cols)
-
-    heat_map = px.imshow(
-        heat_map_df,
-        template = 'plotly_dark',
-        text_auto=True
 
-    )
-    heat_map.update_xaxes(side="top")
-
-    true_pos = heat_map_df['Predicted Win'][0] 
-    false_pos = heat_map_df['Predicted Win'][1] 
-    false_neg = heat_map_df['Predicted Loss'][0] 
-    true_neg = heat_map_df['Predicted Loss'][1] 
+    heat_map = heatmap_figure(matrix, Cols, Index)
 
-    accuracy = round(((true_pos + true_neg) / (true_pos + false_pos + false_neg + true_neg) ) *100,1)
-    precision = round(((true_pos) / (true_pos + false_pos) ) *100,1)
-    recall = round(((true_pos) / (true_pos + false_neg) ) *100,1)
-    f1_score = round(2*((precision*recall)/(precision+recall)),1)
+    metrics = {
+        name: 'n/a' if value is None else f'{value}%'
+        for name, value in classification_metrics(true_pos, false_pos, true_neg, false_neg).items()
+    }
 
     card5 = dbc.Card([
             dbc.CardBody([
-                html.H5(f'{accuracy}%'),
+                html.H5(metrics['accuracy']),
                 html.P('Accuracy')
             ])
         ],
@@ -1229,7 +1015,7 @@ def pred_cumulative_wins(dd6, dd7):
 
     card6 = dbc.Card([
             dbc.CardBody([
-                html.H5(f'{precision}%'),
+                html.H5(metrics['precision']),
                 html.P('Precision')
             ])
         ],
@@ -1244,7 +1030,7 @@ def pred_cumulative_wins(dd6, dd7):
 
     card7 = dbc.Card([
             dbc.CardBody([
-                html.H5(f'{recall}%'),
+                html.H5(metrics['recall']),
                 html.P('Recall')
             ])
         ],
@@ -1259,7 +1045,7 @@ def pred_cumulative_wins(dd6, dd7):
 
     card8 = dbc.Card([
             dbc.CardBody([
-                html.H5(f'{f1_score}%'),
+                html.H5(metrics['f1_score']),
                 html.P('F1 Score')
             ])
         ],
@@ -1275,6 +1061,60 @@ def pred_cumulative_wins(dd6, dd7):
     return line_chart, heat_map, card5, card6, card7, card8
 
 
+#----- Why the model predicted what it did: per-match and average feature contributions.
+#The SHAP values are computed with the predictions by train_model.py (pred_contribs, see
+#model_artifact.py) and sit next to them in the matches table, so explaining a career is
+#a slice of it.  For older model artifacts they are computed here, one batch per selection
+@app.callback(
+    Output('match_attributions','figure'),
+    Output('feature_attributions','figure'),
+    Input('dropdown6','value'),
+    Input('dropdown7','value')
+)
+@cached_callback
+def feature_attributions(dd6, dd7):
+    atp_df, player_index = matches.get()
+
+    player_df = player_rows(atp_df, player_index, dd6)
+    count_rows(len(player_df))
+    surface_player_df = player_df[player_df['surface'].isin(dd7)]
+
+    explain = explainer.get()
+    if explain is None:
+        contributions = surface_player_df[CONTRIBUTION_COLUMNS].to_numpy(dtype=np.float64)
+    else:
+        from model_artifact import predict_contributions
+        contributions = predict_contributions(*explain, surface_player_df).astype(np.float64)
+    #features x matches, without the bias (the same for every match)
+    contributions = contributions[:, :-1].T
+    feature_labels = [match_table_columns[feature] for feature in EXPLAINED_FEATURES]
+
+    #Match # lines up with the predictions chart above, which has the tournament details
+    n_matches = contributions.shape[1]
+    match_chart = contribution_heatmap(
+        np.round(contributions, 3), np.arange(1, n_matches + 1), feature_labels,
+        hovertemplate='Match #=%{x}<br>%{y}=%{z}<extra></extra>',
+        x_title="Match #",
+        title=f"{dd6} Feature Contributions per Match",
+        category_x=True
+    )
+
+    #Average over the selected matches, largest average impact first
+    mean = contributions.sum(axis=1) / max(n_matches, 1)
+    impact = np.abs(contributions).sum(axis=1) / max(n_matches, 1)
+    order = np.argsort(-impact, kind='stable')
+
+    bar_chart = bar_figure(
+        np.round(mean[order], 3), [feature_labels[i] for i in order],
+        colors=['#2DFE54' if value >= 0 else '#E15F99' for value in mean[order]],
+        hovertemplate='%{y}<br>Average Contribution=%{x}<extra></extra>',
+        x_title="Average Contribution (log-odds)",
+        title="Average Feature Contributions"
+    )
+
+    return match_chart, bar_chart
+
+
 #----------Configure reactivity for Button #1 (Instructions) --> Tab #2----------#
 @app.callback(
     Output("modal1", "is_open"),
@@ -1329,7 +1169,94 @@ def toggle_modal3(n1, n2, is_open):
     return is_open  
 
 
+#----- Elo ratings: a player's block of the rating history is date ordered, so the
+#timeline is a slice and the rating on a date a binary search in it
+def rating_rows(dd8, dd9):
+    '''player --> (dates, ratings) of the selected players, overall or on one surface.'''
+    rating_history, rating_index = ratings.get()
+    selected = {}
+    for player in dd8 or []:
+        rows = player_rows(rating_history, rating_index, player)
+        column = 'rating'
+        if dd9 and dd9 != 'All Surfaces':
+            rows = rows[(rows['surface'] == dd9).to_numpy()]
+            column = 'surface_rating'
+        count_rows(len(rows))
+        selected[player] = (rows['tourney_date'].to_numpy(), rows[column].to_numpy())
+    return selected
+
+
+@app.callback(
+    Output('rating_timeline','figure'),
+    Input('dropdown8','value'),
+    Input('dropdown9','value')
+)
+@cached_callback
+def rating_timeline(dd8, dd9):
+    traces = [
+        line_trace(
+            date_strings(dates), np.round(values, 1), player,
+            hovertemplate=f'{player}<br>Date=%{{x}}<br>Elo Rating=%{{y}}<extra></extra>'
+        )
+        for player, (dates, values) in rating_rows(dd8, dd9).items()
+    ]
+    return line_figure(
+        traces,
+        x_title="Date",
+        y_title="Elo Rating",
+        title=f"Elo Ratings ({dd9 or 'All Surfaces'})"
+    )
+
+
+@app.callback(
+    Output('ratings_on_date','data'),
+    Input('dropdown8','value'),
+    Input('dropdown9','value'),
+    Input('rating_date','date')
+)
+@cached_callback
+def ratings_on_date(dd8, dd9, date):
+    from ratings import rating_at
+
+    day = int(str(date)[:10].replace('-', '')) if date else 99991231
+    table = []
+    for player, (dates, values) in rating_rows(dd8, dd9).items():
+        played = int(np.searchsorted(dates, day, side='right'))
+        table.append({
+            'Player': player,
+            'Elo Rating': round(rating_at(dates, values, day), 1),
+            'Matches': played
+        })
+    return sorted(table, key=lambda row: -row['Elo Rating'])
+
+
+#----------Configure reactivity for Button #5 (Instructions) --> Tab #6----------#
+@app.callback(
+    Output("modal5", "is_open"),
+    Input("open5", "n_clicks"),
+    Input("close5", "n_clicks"),
+    State("modal5", "is_open")
+)
+
+def toggle_modal5(n1, n2, is_open):
+    if n1 or n2:
+        return not is_open
+    return is_open
+
+
+#----- Per-callback timings, payload sizes and process gauges at /metrics
+instrument_callbacks(app)
+register_metrics_route(server)
+
 #app.run_server(host='0.0.0.0',port='8049')
 
 if __name__=='__main__':
+	if '--profile-startup' in sys.argv:
+		#Import / data / model timings from a fresh interpreter (see profile_startup.py)
+		from profile_startup import main
+		main()
+		sys.exit()
+
+	#Build the tabs' data in the background while the server already answers
+	warm_up()
 	app.run_server()
\ No newline at end of file
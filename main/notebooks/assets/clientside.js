@@ -0,0 +1,25 @@
+//Clientside callbacks for the dashboard
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    atp: {
+        //Individual Stats tab: pick the selected statistic out of the player's
+        //quarterly data (stat_timeline_store) without a server round trip
+        statTimeline: function(data, statistic) {
+            if (!data || !(statistic in data.stat_columns)) {
+                return window.dash_clientside.no_update;
+            }
+            const column = data.stat_columns[statistic][0];
+            const label = data.stat_columns[statistic][1];
+
+            const traces = data.figure.data.map(function(trace) {
+                return Object.assign({}, trace, {
+                    y: trace.y[column],
+                    hovertemplate: 'surface=' + trace.name + '<br>Month-Year (Q)=%{x}<br>' + label + '=%{y}<extra></extra>'
+                });
+            });
+            const layout = JSON.parse(JSON.stringify(data.figure.layout));
+            layout.yaxis.title.text = label;
+
+            return {data: traces, layout: layout};
+        }
+    }
+});
@@ -0,0 +1,248 @@
+#Latency, peak memory and payload size of the dashboard callbacks, runnable offline
+#
+#Run from main/notebooks:
+#    python benchmarks/bench_callbacks.py --data ../data/model_df_v2.parquet.gzip --out run.json
+#    python benchmarks/bench_callbacks.py --data ... --compare run.json   # flag regressions
+#--data / --cache-dir / --model-dir are set as ATP_DATA_URL / ATP_CACHE_DIR / ATP_MODEL_DIR
+#before app.py is imported, so a local parquet fixture (plus a model trained on it with
+#train_model.py) is all that is needed - nothing is downloaded.
+#
+#Importing app.py and then building every tab's resources (data, indexes) is timed
+#first, in fresh interpreters, so startup is reported on its own.  Then each callback is called directly across a
+#matrix of players, surfaces and year ranges with the callback cache switched off.
+#Latency is the callback plus the json encoding Dash does on every response; peak
+#memory is the tracemalloc peak of one extra call (Python and NumPy allocations).
+#stat_timeline_chart is drawn in the browser now, so its server half stat_timeline_data
+#is what gets timed.
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+
+NOTEBOOKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+CALLBACKS = [
+    'match_table', 'stat_timeline_data', 'head_to_head_match_stats',
+    'cumulative_wins', 'pred_cumulative_wins', 'feature_attributions', 'set_character_options',
+    'rating_timeline', 'ratings_on_date'
+]
+
+#A callback whose p50 grows by more than this ratio (and by at least REGRESSION_MIN_MS,
+#so sub-millisecond noise is ignored) against --compare is reported as a regression
+REGRESSION_RATIO = 1.2
+REGRESSION_MIN_MS = 1.0
+
+IMPORT_SNIPPET = '''
+import json, os, sys, time, warnings
+warnings.filterwarnings('ignore')
+sys.path.insert(0, os.getcwd())
+start = time.perf_counter()
+import app
+import_seconds = time.perf_counter() - start
+from resources import warm_up
+warm_up(background=False)
+seconds = time.perf_counter() - start
+import resource
+print(json.dumps({'seconds': seconds, 'import_seconds': import_seconds, 'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}))
+'''
+
+
+def measure_import(runs):
+    '''Wall time and peak RSS of `import app` plus the resource warm-up in fresh interpreters.
+    The first run may build the cache and the snapshot.'''
+    results = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, '-c', IMPORT_SNIPPET],
+            cwd=NOTEBOOKS_DIR, capture_output=True, text=True, check=True
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    seconds = [r['seconds'] for r in results]
+    return {
+        'runs': runs,
+        'first_s': seconds[0],
+        'median_s': float(np.median(seconds[1:] or seconds)),
+        'import_median_s': float(np.median([r['import_seconds'] for r in results[1:] or results])),
+        'max_rss_mb': max(r['max_rss'] for r in results) / 2**20,
+    }
+
+
+def case_matrix(app, players, page_size=14):
+    '''(callback name, args) for every combination benchmarked.'''
+    atp_df, player_index = app.matches.get()
+    _, _, (first_year, last_year) = app.choices.get()
+    cases = []
+    for player in players:
+        player_df = app.player_rows(atp_df, player_index, player)
+        surfaces = sorted(player_df['surface'].astype(str).unique())
+        career = sorted(player_df['year'].unique().tolist())
+        year_ranges = [
+            [first_year, last_year],
+            [max(first_year, last_year - 4), last_year],
+            [career[len(career) // 2], career[len(career) // 2]],
+        ]
+        opponents = app.set_character_options(player)[0][:3]
+
+        for surface in surfaces:
+            for years in year_ranges:
+                cases.append(('match_table', (player, surface, years, 0, page_size, None)))
+        cases.append(('stat_timeline_data', (player,)))
+        cases.append(('set_character_options', (player,)))
+        for opponent in opponents:
+            cases.append(('head_to_head_match_stats', (player, opponent['value'])))
+            cases.append(('cumulative_wins', (player, opponent['value'])))
+        for selected in [surfaces] + [[surface] for surface in surfaces]:
+            cases.append(('pred_cumulative_wins', (player, selected)))
+            cases.append(('feature_attributions', (player, selected)))
+        for surface in ['All Surfaces'] + surfaces:
+            cases.append(('rating_timeline', ([player], surface)))
+            cases.append(('ratings_on_date', ([player], surface, f'{last_year}-06-30')))
+    return cases
+
+
+def run_case(fn, args, repeats, to_json):
+    fn(*args)  #warm-up
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        payload = to_json(fn(*args))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return latencies, peak, len(payload.encode())
+
+
+def summarize(records):
+    summary = {}
+    for name in CALLBACKS:
+        rows = [r for r in records if r['callback'] == name]
+        if not rows:
+            continue
+        latencies = np.concatenate([r['latencies_ms'] for r in rows])
+        summary[name] = {
+            'cases': len(rows),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'peak_mem_mb': max(r['peak_mem_bytes'] for r in rows) / 2**20,
+            'payload_kb_median': float(np.median([r['payload_bytes'] for r in rows])) / 1024,
+            'payload_kb_max': max(r['payload_bytes'] for r in rows) / 1024,
+        }
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=NOTEBOOKS_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(summary, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['summary']
+    print(f'\nvs. {baseline_path}')
+    print(f"{'callback':<26} {'p50 before':>11} {'p50 now':>9} {'ratio':>7}")
+    regressions = 0
+    for name, now in summary.items():
+        if name not in baseline:
+            continue
+        ratio = now['p50_ms'] / baseline[name]['p50_ms']
+        slower = ratio > REGRESSION_RATIO and now['p50_ms'] - baseline[name]['p50_ms'] >= REGRESSION_MIN_MS
+        flag = '  REGRESSION' if slower else ''
+        regressions += bool(flag)
+        print(f"{name:<26} {baseline[name]['p50_ms']:>11.2f} {now['p50_ms']:>9.2f} {ratio:>7.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data', help='local parquet file / partition directory (ATP_DATA_URL)')
+    parser.add_argument('--cache-dir', help='arrow cache directory (ATP_CACHE_DIR)')
+    parser.add_argument('--model-dir', help='model artifacts trained on --data (ATP_MODEL_DIR)')
+    parser.add_argument('--players', nargs='+', help='players to benchmark (default: the --top busiest)')
+    parser.add_argument('--top', type=int, default=3)
+    parser.add_argument('--repeats', type=int, default=10, help='timed calls per case')
+    parser.add_argument('--import-runs', type=int, default=3)
+    parser.add_argument('--out', help='write the results as json')
+    parser.add_argument('--compare', help='json from an earlier run to check for regressions')
+    args = parser.parse_args()
+
+    for value, variable in [(args.data, 'ATP_DATA_URL'), (args.cache_dir, 'ATP_CACHE_DIR'), (args.model_dir, 'ATP_MODEL_DIR')]:
+        if value:
+            os.environ[variable] = os.path.abspath(value) if os.path.exists(value) else value
+    os.environ.setdefault('PYTHONWARNINGS', 'ignore')
+
+    startup = measure_import(args.import_runs)
+    print(
+        f"import app + warm-up: first {startup['first_s']:.2f} s, then {startup['median_s']:.2f} s (median,"
+        f" import alone {startup['import_median_s']:.2f} s), peak RSS {startup['max_rss_mb']:.0f} MB"
+    )
+
+    sys.path.insert(0, NOTEBOOKS_DIR)
+    warnings.filterwarnings('ignore')
+    import app
+    import callback_cache
+    from plotly.io.json import to_json_plotly
+
+    callback_cache.cache.max_bytes = 0
+
+    atp_df, _ = app.matches.get()
+    players = args.players or atp_df['player_name'].value_counts().index[:args.top].tolist()
+    records = []
+    for name, case_args in case_matrix(app, players):
+        latencies, peak, payload = run_case(getattr(app, name), case_args, args.repeats, to_json_plotly)
+        records.append({
+            'callback': name, 'args': case_args, 'latencies_ms': latencies,
+            'peak_mem_bytes': peak, 'payload_bytes': payload,
+        })
+
+    summary = summarize(records)
+    print(f'\n{len(players)} players, {len(records)} cases x {args.repeats} calls ({", ".join(players)})')
+    print(f"{'callback':<26} {'cases':>6} {'p50 ms':>8} {'p95 ms':>8} {'peak MB':>8} {'payload KB':>11} {'max KB':>8}")
+    for name, s in summary.items():
+        print(
+            f"{name:<26} {s['cases']:>6} {s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} {s['peak_mem_mb']:>8.2f}"
+            f" {s['payload_kb_median']:>11.1f} {s['payload_kb_max']:>8.1f}"
+        )
+
+    if args.out:
+        result = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'dataset': {
+                'source': os.environ.get('ATP_DATA_URL'),
+                'version': app.snapshot.get().dataset_sha256,
+                'rows': len(atp_df),
+                'players': len(app.choices.get()[0]),
+            },
+            'repeats': args.repeats,
+            'startup': startup,
+            'summary': summary,
+            'cases': records,
+        }
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=1)
+        print(f'\nWrote {args.out}')
+
+    if args.compare and compare(summary, args.compare):
+        sys.exit(1)
+
+
+if __name__=='__main__':
+    main()
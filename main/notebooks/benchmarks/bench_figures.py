@@ -0,0 +1,99 @@
+#Figure construction: plotly.express (the old callback code) vs. the lean dict builder in figures.py
+#
+#Run from main/notebooks:  python benchmarks/bench_figures.py
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+warnings.filterwarnings('ignore')
+
+import app
+import callback_cache
+from indexes import player_rows, pair_matches
+
+callback_cache.cache.max_bytes = 0
+
+REPEATS = 30
+PLAYER = 'Rafael Nadal'
+
+
+def px_stat_timeline(line_chart_df):
+    line_chart = px.line(
+            line_chart_df,
+            color = 'surface',
+            x="quarter_date",
+            y="num_aces",
+            markers=True,
+            template = 'plotly_dark',
+            labels={"quarter_date": "Month-Year (Q)",
+                    "num_aces": "# Aces"
+            }
+    )
+    line_chart.update_layout(
+        title_x=0.5,
+        legend_title=None,
+        legend=dict(orientation="h", yanchor="top", y=1.075, xanchor="center", x=0.5)
+    )
+    return line_chart
+
+
+def px_cumulative_wins(new_df, dd4, dd5):
+    cum_win_df = new_df[['tourney_id','tourney_name_x','surface_x','tourney_date_x','player_name_x','outcome_x','player_name_y','outcome_y']].copy()
+    cum_win_df['cum_wins_x'] = cum_win_df['outcome_x'].cumsum()
+    cum_win_df['cum_wins_y'] = cum_win_df['outcome_y'].cumsum()
+    cum_win_df['Match #'] = range(1, len(cum_win_df) + 1)
+    df1 = cum_win_df.rename(columns={'player_name_x': 'player_name', 'cum_wins_x': 'cum_wins'})
+    df2 = cum_win_df.rename(columns={'player_name_y': 'player_name', 'cum_wins_y': 'cum_wins'})
+    cols = ['tourney_id','tourney_name_x','surface_x','tourney_date_x','player_name','cum_wins','Match #']
+    df_stacked = pd.concat([df1[cols], df2[cols]])
+    df_stacked['tourney_date_x'] = pd.to_datetime(df_stacked['tourney_date_x'], format='%Y%m%d').dt.date
+    line_chart = px.line(
+        df_stacked, x="Match #", color='player_name', y="cum_wins", markers=True, template='plotly_dark',
+        hover_data={"player_name":True, "tourney_name_x":True, "tourney_date_x":True, "surface_x":True, "cum_wins":True, "tourney_id":False},
+        labels={"tourney_name_x": "Tourney Name", "surface_x": "Surface", "tourney_date_x":"Tourney Date", "player_name": "Player Name", "cum_wins":"Cumulative Wins"}
+    )
+    line_chart.update_layout(title_text=f"Cumulative Games Won ({dd4} vs. {dd5})", title_x=0.5, legend_title=None,
+                             legend=dict(orientation="h", yanchor="top", y=1.075, xanchor="center", x=0.5))
+    line_chart.update_xaxes(type='category')
+    return line_chart
+
+
+def time_ms(fn):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.median(timings)
+
+
+if __name__=='__main__':
+    opponent = app.set_character_options(PLAYER)[1]
+    line_chart_df = player_rows(*app.individual_stats.get(), PLAYER)
+    new_df = pair_matches(app.matches.get()[0], app.head_to_head.get()[0], PLAYER, opponent)
+
+    cases = {
+        'stat_timeline_data': (
+            lambda: px_stat_timeline(line_chart_df),
+            lambda: app.stat_timeline_data(PLAYER),
+        ),
+        'cumulative_wins': (
+            lambda: px_cumulative_wins(new_df, PLAYER, opponent),
+            lambda: app.cumulative_wins(PLAYER, opponent),
+        ),
+    }
+
+    print(f'{PLAYER} vs. {opponent} ({len(new_df)} matches), median of {REPEATS} calls (ms)')
+    print(f"{'figure':<22} {'px build':>9} {'px +json':>9} {'lean build':>11} {'lean +json':>11}")
+    for name, (old, new) in cases.items():
+        print(
+            f'{name:<22} {time_ms(old):9.2f} {time_ms(lambda: pio.json.to_json_plotly(old())):9.2f}'
+            f' {time_ms(new):11.2f} {time_ms(lambda: pio.json.to_json_plotly(new())):11.2f}'
+        )
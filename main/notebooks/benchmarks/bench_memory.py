@@ -0,0 +1,62 @@
+#Resident memory of one worker's copy of atp_df: raw parquet dtypes vs. the declared SCHEMA
+#
+#Each variant runs in a fresh interpreter so the numbers don't bleed into each other.
+#Run from main/notebooks:  python benchmarks/bench_memory.py
+import json
+import os
+import subprocess
+import sys
+
+
+NOTEBOOKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+VARIANTS = {
+    #What app.py used to hold: every parquet column at its stored dtype, object strings
+    'raw parquet': '''
+import pandas as pd
+from data_loader import DATA_URL
+atp_df = pd.read_parquet(DATA_URL)
+counts = atp_df.groupby('player_name')['player_name'].transform('size')
+atp_df = atp_df[counts >= 300]
+''',
+    #Current loader: pruned columns, categoricals, downcast numerics, memory-mapped cache
+    'schema + arrow cache': '''
+from data_loader import load_dataset, filter_active_players
+atp_df = filter_active_players(load_dataset())
+''',
+    #Whole dashboard process, every tab's resources and the layout included
+    'app.py import': '''
+import app, resources
+resources.warm_up(background=False)
+atp_df, _ = app.matches.get()
+''',
+}
+
+MEASURE = '''
+import json, os, sys, warnings
+warnings.filterwarnings('ignore')
+sys.path.insert(0, os.getcwd())
+{setup}
+try:
+    import psutil
+    rss = psutil.Process().memory_info().rss
+except ImportError:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+print(json.dumps({{'rss': rss, 'frame': int(atp_df.memory_usage(deep=True).sum()), 'rows': len(atp_df)}}))
+'''
+
+
+def measure(setup):
+    out = subprocess.run(
+        [sys.executable, '-c', MEASURE.format(setup=setup)],
+        cwd=NOTEBOOKS_DIR, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+if __name__=='__main__':
+    print(f"{'variant':<22} {'rows':>9} {'atp_df MB':>10} {'process RSS MB':>15}")
+    for name, setup in VARIANTS.items():
+        result = measure(setup)
+        print(f"{name:<22} {result['rows']:>9,} {result['frame'] / 2**20:>10.1f} {result['rss'] / 2**20:>15.1f}")
@@ -0,0 +1,74 @@
+#Per-callback latency with the old full-table player scan vs. the per-player row index
+#
+#Run from main/notebooks:  python benchmarks/bench_player_index.py
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+warnings.filterwarnings('ignore')
+
+import app
+import callback_cache
+
+#Time the callbacks themselves, not cache hits
+callback_cache.cache.max_bytes = 0
+
+
+PLAYERS = ['Roger Federer', 'Rafael Nadal', 'Novak Djokovic']
+REPEATS = 20
+
+
+def scan_rows(df, player_index, player):
+    #What every callback did before: a boolean scan over the whole frame
+    return df[df['player_name']==player]
+
+
+def callbacks_for(player):
+    opponent = app.set_character_options(player)[1]
+    return {
+        'match_table': lambda: app.match_table(player, 'Hard', [1991, 2022], 0, 14, []),
+        'stat_timeline_data': lambda: app.stat_timeline_data(player),
+        'head_to_head_match_stats': lambda: app.head_to_head_match_stats(player, opponent),
+        'cumulative_wins': lambda: app.cumulative_wins(player, opponent),
+        'pred_cumulative_wins': lambda: app.pred_cumulative_wins(player, app.choices.get()[1]),
+    }
+
+
+def time_ms(fn):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.median(timings)
+
+
+def run(lookup):
+    app.player_rows = lookup
+    results = {}
+    for player in PLAYERS:
+        if player not in app.matches.get()[1]:
+            continue
+        for name, fn in callbacks_for(player).items():
+            try:
+                results[(player, name)] = time_ms(fn)
+            except Exception as e:
+                results[(player, name)] = type(e).__name__
+    return results
+
+
+if __name__=='__main__':
+    index_lookup = app.player_rows
+    before = run(scan_rows)
+    after = run(index_lookup)
+
+    print(f'{len(app.matches.get()[0]):,} rows, median of {REPEATS} calls (ms)')
+    print(f"{'player':<16} {'callback':<26} {'scan':>9} {'index':>9}")
+    for (player, name), old in before.items():
+        new = after[(player, name)]
+        fmt = lambda v: f'{v:9.2f}' if isinstance(v, float) else f'{v:>9}'
+        print(f'{player:<16} {name:<26} {fmt(old)} {fmt(new)}')
@@ -0,0 +1,83 @@
+#Scaling curve: training time, dashboard startup and callback latency vs. dataset size
+#
+#Run from main/notebooks:  python benchmarks/bench_scaling.py --scales 1 10 100
+#For every scale a synthetic dataset is written with synthetic_data.py into --work-dir,
+#the model is trained on it with train_model.py and bench_callbacks.py is run against
+#it, each in its own interpreter with ATP_DATA_URL / ATP_CACHE_DIR / ATP_MODEL_DIR set
+#for that scale.  Nothing touches the real cache or models.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pyarrow.parquet as pq
+
+
+NOTEBOOKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+
+def run(args, env):
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable] + args, cwd=NOTEBOOKS_DIR, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        #The output is captured, so a failing step would otherwise leave nothing to go on
+        sys.exit(f"{' '.join(args)} failed with exit code {out.returncode}:\n{out.stderr}")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10])
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'atp_scaling'))
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--out', help='write the results as json')
+    args = parser.parse_args()
+
+    results = []
+    for scale in args.scales:
+        directory = os.path.join(args.work_dir, f'{scale:g}x')
+        os.makedirs(directory, exist_ok=True)
+        data = os.path.join(directory, 'matches.parquet')
+        env = dict(
+            os.environ, PYTHONWARNINGS='ignore', ATP_DATA_URL=data,
+            ATP_CACHE_DIR=os.path.join(directory, 'cache'), ATP_MODEL_DIR=os.path.join(directory, 'models')
+        )
+
+        generate_s = run(['synthetic_data.py', '--scale', str(scale), '--compression', 'snappy', '--out', data], env)
+        #Training goes first: its first load_dataset builds the arrow cache the others reuse
+        train_s = run(['train_model.py'], env)
+        callbacks_json = os.path.join(directory, 'callbacks.json')
+        run(['benchmarks/bench_callbacks.py', '--top', '2', '--repeats', str(args.repeats), '--out', callbacks_json], env)
+
+        with open(callbacks_json) as f:
+            callbacks = json.load(f)
+        results.append({
+            'scale': scale,
+            'rows': pq.read_metadata(data).num_rows,
+            'dashboard_rows': callbacks['dataset']['rows'],
+            'dashboard_players': callbacks['dataset']['players'],
+            'generate_s': generate_s,
+            'train_s': train_s,
+            'startup': callbacks['startup'],
+            'callbacks': {name: s['p50_ms'] for name, s in callbacks['summary'].items()},
+        })
+
+    names = list(results[0]['callbacks'])
+    print(f"{'scale':>6} {'rows':>11} {'shown':>9} {'players':>8} {'train s':>8} {'import s':>9} {'RSS MB':>7}  p50 ms: " + ' '.join(f'{n[:12]:>12}' for n in names))
+    for r in results:
+        print(
+            f"{r['scale']:>6g} {r['rows']:>11,} {r['dashboard_rows']:>9,} {r['dashboard_players']:>8,} {r['train_s']:>8.1f}"
+            f" {r['startup']['median_s']:>9.2f} {r['startup']['max_rss_mb']:>7.0f}         "
+            + ' '.join(f"{r['callbacks'][n]:>12.2f}" for n in names)
+        )
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,142 @@
+#Score parsing: the notebook's replace-list / invert_score pipeline vs. scores.parse_games
+#
+#Run from main/notebooks:  python benchmarks/bench_scores.py [--csv PATH]
+#Both are run on every match of atp_matches_till_2022.csv, stacked into a winner row
+#and a loser row like the notebook does, and their outputs are checked for equality.
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+warnings.filterwarnings('ignore')
+
+from scores import SET_COUNT, parse_games
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, 'data', 'atp_matches_till_2022.csv')
+
+
+#----- The notebook pipeline (ATP EDA 10.14.23.ipynb), wrapped in a function
+replace_unknown = ['nan','UNK','DEF','RET','Apr-00','', ' ','?-?','W/O','ABD',
+                   'Played','and','Def.','NA', 'unfinished','Default', 'abandoned']
+
+replace76 = ['7-6(0)', '7-6(1)', '7-6(2)', '7-6(3)', '7-6(4)', '7-6(5)', '7-6(6)' ,'7-6(7)', '7-6(8)','7-6(9)',
+             '7-6(10)','7-6(11)','7-6(12)','7-6(13)','7-6(14)','7-6(15)','7-6(16)', '7-6(17)',  '7-6(18)','7-6(22)']
+replace75 = ['7-5(1)','7-5(2)','7-5(3)', '7-5(5)', '7-5(6)', '7-5(7)','7-5(12)','7-5?']
+replace67 = ['6-7(0)', '6-7(1)','6-7(2)','6-7(3)','6-7(4)','6-7(5)','6-7(6)','6-7(7)','6-7(8)','6-7(9)','6-7(10)',
+             '6-7(11)','6-7(12)','6-7(13)', '6-7(14)','6-7(15)','6-7(16)','6-7(17)','6-7(18)','[6-7]']
+replace66 = ['6-6(0)','6-6(1)', '6-6(2)','6-6(4)','6-6(6)','6-6?']
+replace64 = ['6-4(2)','6-4(3)','6-4(4)','6-4(5)','6-4(8)','6-4?']
+replace63 = ['6-3(2)','6-3(4)','6-3(5)','6-3(6)','6-3?']
+replace62 = ['6-2(2)']
+replace61 = ['6-1(4)','6-1?']
+replace60 = ['6-0(3)']
+replace57 = ['5-7(5)']
+replace43 = ['4-3(1)','4-3(2)','4-3(3)','4-3(4)','4-3(5)','4-3(6)','4-3(7)', '4-3(8)','4-3(9)','4-3(10)']
+replace46 = ['4-6?']
+replace34 = ['3-4(2)','3-4(3)','3-4(4)','3-4(5)','3-4(6)','3-4(7)','3-4(8)']
+replace36 = ['3-6(4)']
+replace_brackets = {
+    '1-0': ['1-0(1)','1-0(2)','1-0(3)','1-0(4)','1-08','[1-0]'], '0-1': ['[0-1]'],
+    '3-10': ['[3-10]'], '4-10': ['[4-10]'], '7-10': ['[7-10]'],
+    '10-1': ['[10-1]'], '10-2': ['[10-2]'], '10-4': ['[10-4]'], '10-5': ['[10-5]'],
+    '10-6': ['[10-6]'], '10-7': ['[10-7]'], '10-8': ['[10-8]'],
+    '11-13': ['[11-13]'], '11-9': ['[11-9]'], '12-14': ['[12-14]'], '13-11': ['[13-11]'],
+}
+
+#Which lists the notebook applied to which set column
+SET_REPLACEMENTS = {
+    1: [(replace76,'7-6'),(replace75,'7-5'),(replace67,'6-7'),(replace66,'6-6'),(replace64,'6-4'),
+        (replace63,'6-3'),(replace62,'6-2'),(replace57,'5-7'),(replace34,'3-4'),(replace43,'4-3')],
+    2: [(replace76,'7-6'),(replace75,'7-5'),(replace67,'6-7'),(replace66,'6-6'),(replace64,'6-4'),
+        (replace63,'6-3'),(replace62,'6-2'),(replace61,'6-1'),(replace60,'6-0'),(replace57,'5-7'),
+        (replace43,'4-3'),(replace34,'3-4'),(replace36,'3-6')],
+}
+SET_REPLACEMENTS[3] = SET_REPLACEMENTS[2] + [(replace46,'4-6')] + [(v, k) for k, v in replace_brackets.items()]
+SET_REPLACEMENTS[4] = SET_REPLACEMENTS[3]
+SET_REPLACEMENTS[5] = SET_REPLACEMENTS[3] + [(['13-12(3)', '13-12(2)'],'13-12')]
+
+
+def invert_score(score):
+    if pd.isnull(score):
+        None
+    else:
+        return ' '.join(['-'.join(s.split('-')[::-1]) for s in score.split()])
+
+
+def notebook_games(matches):
+    matches = matches.copy()
+    matches['score'] = matches['score'].replace(['W/O','Walkover','W/O'], 0)
+    matches['sets'] = matches['score'].str.split(' ', n = 5, expand = False)
+
+    for i in range(1, SET_COUNT + 1):
+        column = f'set{i}_score'
+        matches[column] = matches['sets'].str[i - 1]
+        matches[column] = matches[column].replace(replace_unknown, 0)
+        for values, replacement in SET_REPLACEMENTS[i]:
+            matches[column] = matches[column].replace(values, replacement)
+        matches[column] = matches[column].astype(str)
+        matches.loc[matches['outcome'] == 0, column] = matches.loc[matches['outcome'] == 0, column].apply(invert_score)
+
+    for i in range(1, SET_COUNT + 1):
+        matches[f'set{i}_games_won'] = matches[f'set{i}_score'].str.split('-', n = 2, expand = False).str[0]
+    for i in range(1, SET_COUNT + 1):
+        matches[f'set{i}_games_lost'] = matches[f'set{i}_score'].str.split('-', n = 2, expand = False).str[1]
+
+    for i in range(1, SET_COUNT + 1):
+        matches[f'set{i}_games_won'] = matches[f'set{i}_games_won'].replace(['nan'], 0).astype(int)
+    matches['total_games_won'] = sum(matches[f'set{i}_games_won'] for i in range(1, SET_COUNT + 1))
+    for i in range(1, SET_COUNT + 1):
+        matches[f'set{i}_games_lost'] = matches[f'set{i}_games_lost'].astype(str).replace(['nan'], 0).astype(int)
+    matches['total_games_lost'] = sum(matches[f'set{i}_games_lost'] for i in range(1, SET_COUNT + 1))
+
+    matches['total_games_played'] = matches['total_games_won'] + matches['total_games_lost']
+    for i in range(1, SET_COUNT + 1):
+        matches[f'set{i}_win_perc'] = matches[f'set{i}_games_won'] / (matches[f'set{i}_games_won'] + matches[f'set{i}_games_lost'])
+    matches['game_win_perc'] = matches['total_games_won'] / (matches['total_games_won'] + matches['total_games_lost'])
+    return matches
+
+
+def timed(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', default=DEFAULT_CSV)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    scores = pd.read_csv(args.csv, usecols=['score'])['score']
+    #One row per player, winners first, like the notebook's stacked frame
+    matches = pd.DataFrame({
+        'score': pd.concat([scores, scores], ignore_index=True),
+        'outcome': np.repeat([1, 0], len(scores)),
+    })
+
+    old, old_time = timed(lambda: notebook_games(matches), 1)
+    new, new_time = timed(lambda: parse_games(matches['score'], matches['outcome'].to_numpy()), args.repeats)
+
+    for column in new.columns:
+        if column.endswith('_win_perc'):
+            assert np.allclose(old[column], new[column], equal_nan=True), column
+        else:
+            assert (old[column].to_numpy() == new[column].to_numpy()).all(), column
+
+    rows = len(matches)
+    print(f'{rows:,} player rows ({len(scores):,} matches), outputs identical')
+    print(f'{"notebook pipeline":<20}{old_time:>8.2f} s{rows / old_time:>14,.0f} rows/s')
+    print(f'{"parse_games":<20}{new_time:>8.2f} s{rows / new_time:>14,.0f} rows/s')
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,104 @@
+#Throughput and tail latency of POST /api/score under concurrent load,
+#with micro-batching vs. one predict per request
+#
+#Run from main/notebooks (after train_model.py):  python benchmarks/bench_scoring.py
+import argparse
+import http.client
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+from flask import Flask
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+warnings.filterwarnings('ignore')
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+from data_loader import load_dataset
+from scoring import ARROW_STREAM, FEATURES, Scorer, register_scoring_route
+
+
+def start_server(scorer):
+    flask_app = Flask(__name__)
+    register_scoring_route(flask_app, scorer=scorer)
+    httpd = make_server('127.0.0.1', 0, flask_app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def encode(rows, fmt):
+    if fmt == 'json':
+        return json.dumps(rows.to_dict('list')).encode(), 'application/json'
+    table = pa.Table.from_pandas(rows, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes(), ARROW_STREAM
+
+
+def run_load(port, bodies, clients, requests_per_client):
+    local = threading.local()
+
+    def post(i):
+        if not hasattr(local, 'conn'):
+            local.conn = http.client.HTTPConnection('127.0.0.1', port)
+        body, content_type = bodies[i % len(bodies)]
+        start = time.perf_counter()
+        local.conn.request('POST', '/api/score', body=body, headers={'Content-Type': content_type})
+        response = local.conn.getresponse()
+        response.read()
+        assert response.status == 200, response.status
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        latencies = list(pool.map(post, range(clients * requests_per_client)))
+    return np.array(latencies), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=50, help='requests per client')
+    parser.add_argument('--rows', type=int, default=20, help='rows per request')
+    parser.add_argument('--format', choices=['json', 'arrow'], default='json')
+    args = parser.parse_args()
+
+    df = load_dataset()[FEATURES].astype({'surface': str})
+    rng = np.random.default_rng(0)
+    bodies = [encode(df.iloc[rng.integers(0, len(df), args.rows)], args.format) for _ in range(64)]
+
+    variants = {
+        'one predict per request': Scorer(max_rows=1, max_wait_ms=0),
+        'micro-batched': Scorer(),
+    }
+
+    print(f'{args.clients} clients x {args.requests} requests x {args.rows} rows ({args.format})')
+    print(f'{"variant":<26}{"rows/s":>10}{"p50 ms":>9}{"p99 ms":>9}{"batches":>9}')
+    for name, scorer in variants.items():
+        httpd = start_server(scorer)
+        port = httpd.server_port
+        run_load(port, bodies, 4, 5)  #warm-up: loads the artifact and opens connections
+        scorer.batcher.batches = 0
+
+        latencies, elapsed = run_load(port, bodies, args.clients, args.requests)
+        httpd.shutdown()
+
+        rows = len(latencies) * args.rows
+        print(
+            f'{name:<26}{rows / elapsed:>10,.0f}'
+            f'{np.percentile(latencies, 50) * 1000:>9.1f}{np.percentile(latencies, 99) * 1000:>9.1f}'
+            f'{scorer.batcher.batches:>9}'
+        )
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,67 @@
+#Wall-clock time of the model search vs. number of training processes
+#
+#Run from main/notebooks (uses ATP_DATA_URL / ATP_CACHE_DIR like the dashboard):
+#    python benchmarks/bench_training.py --workers 1 2 4 8 --threads 1
+#Every run does the whole cross-validation grid of train_model.py (model_search.py) with
+#an empty results cache of its own, so nothing is reused between runs; the inputs are
+#prepared once up front and not timed.  Speedup is against the first worker count.  With
+#workers x threads above the number of cores the runs only fight over them.
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from data_loader import load_dataset, dataset_version, filter_active_players
+from model_search import ALL_SURFACES, prepare, load_inputs, cross_validate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=1, help='threads per training process')
+    parser.add_argument('--folds', type=int, default=3)
+    parser.add_argument('--out', help='write the results as json')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='atp_training_')
+    try:
+        df = filter_active_players(load_dataset())
+        directory = prepare(df, dataset_version(), args.folds, work_dir)
+        models = [ALL_SURFACES] + load_inputs(directory)['surface_columns']
+
+        results = []
+        print(f"{os.cpu_count()} cores, {len(df):,} rows, {len(models)} models")
+        print(f"{'workers':>7} {'threads':>7} {'jobs':>5} {'wall s':>8} {'job s':>8} {'speedup':>8}")
+        for workers in args.workers:
+            shutil.rmtree(os.path.join(directory, 'results'))
+            os.makedirs(os.path.join(directory, 'results'))
+
+            start = time.perf_counter()
+            cv = cross_validate(directory, models, workers=workers, threads=args.threads, log=None)
+            wall_s = time.perf_counter() - start
+
+            r = {
+                'workers': workers,
+                'threads': args.threads,
+                'jobs': len(cv),
+                'wall_s': wall_s,
+                'job_s': sum(result['seconds'] for result in cv),
+            }
+            r['speedup'] = results[0]['wall_s'] / wall_s if results else 1.0
+            results.append(r)
+            print(f"{workers:>7} {args.threads:>7} {r['jobs']:>5} {wall_s:>8.1f} {r['job_s']:>8.1f} {r['speedup']:>8.2f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,143 @@
+#Memory of a gunicorn deployment vs. number of workers, preloaded or not
+#
+#Run from main/notebooks (linux, gunicorn installed):
+#    python benchmarks/bench_workers.py --workers 1 2 4 8
+#For every worker count gunicorn serves app:server with gunicorn.conf.py (preload + frozen
+#gc) and, with --no-preload-too, once more with each worker importing app.py on its own.
+#Every worker answers a few dashboard requests first, then the resident (RSS), proportional
+#(PSS: shared pages split between the processes mapping them) and unique (USS) memory of
+#the master and each worker is read from /proc/<pid>/smaps_rollup.  Total PSS is what the
+#deployment really costs; its growth per worker is the number to watch.
+import argparse
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+
+NOTEBOOKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+#Server half of the Individual Stats tab: reads the quarterly stats, the largest table
+UPDATE_BODY = json.dumps({
+    'output': 'stat_timeline_store.data',
+    'outputs': {'id': 'stat_timeline_store', 'property': 'data'},
+    'inputs': [{'id': 'dropdown2', 'property': 'value', 'value': None}],
+    'changedPropIds': [],
+})
+
+
+def children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def request(port, method, url, body=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    headers = {'Content-Type': 'application/json'} if body else {}
+    connection.request(method, url, body=body, headers=headers)
+    response = connection.getresponse()
+    response.read()
+    return response.status
+
+
+def memory(pid):
+    '''RSS, PSS and USS of one process in MB.'''
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[-1] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return values['Rss'], values['Pss'], values['Private_Clean'] + values['Private_Dirty']
+
+
+def measure(workers, config, port, requests_per_worker, timeout=300):
+    server = subprocess.Popen(
+        ['gunicorn', '-c', config, '-w', str(workers), '-b', f'127.0.0.1:{port}', 'app:server'],
+        cwd=NOTEBOOKS_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        start = time.perf_counter()
+        deadline = time.time() + timeout
+        while True:
+            if time.time() > deadline or server.poll() is not None:
+                raise RuntimeError(f'gunicorn with {workers} workers did not come up')
+            if len(children(server.pid)) == workers:
+                try:
+                    request(port, 'GET', '/metrics')
+                    break
+                except OSError:
+                    pass
+            time.sleep(0.2)
+        ready_s = time.perf_counter() - start
+
+        for _ in range(workers * requests_per_worker):
+            request(port, 'POST', '/_dash-update-component', UPDATE_BODY)
+
+        master = memory(server.pid)
+        worker_memory = [memory(pid) for pid in children(server.pid)]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(30)
+
+    return {
+        'workers': workers,
+        'ready_s': ready_s,
+        'master': dict(zip(['rss_mb', 'pss_mb', 'uss_mb'], master)),
+        'worker_uss_mb': max(m[2] for m in worker_memory),
+        'total_pss_mb': master[1] + sum(m[1] for m in worker_memory),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--config', default=os.path.join(NOTEBOOKS_DIR, 'gunicorn.conf.py'))
+    parser.add_argument('--no-preload-too', action='store_true', help='also measure workers that import app.py themselves')
+    parser.add_argument('--requests', type=int, default=20, help='dashboard requests per worker before measuring')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--out', help='write the results as json')
+    args = parser.parse_args()
+
+    variants = [('preload', args.config)]
+    if args.no_preload_too:
+        #An empty config file: gunicorn defaults, every worker loads the app after the fork
+        empty = tempfile.NamedTemporaryFile('w', suffix='.py', delete=False)
+        empty.close()
+        variants.append(('no preload', empty.name))
+
+    results = []
+    print(f"{'mode':<11} {'workers':>7} {'ready s':>8} {'master PSS':>11} {'worker USS':>11} {'total PSS':>10} {'per worker':>11}")
+    for mode, config in variants:
+        previous = None
+        for workers in args.workers:
+            r = measure(workers, config, args.port, args.requests)
+            r['mode'] = mode
+            results.append(r)
+            #Growth per worker against the previous worker count
+            step = '' if previous is None else f"{(r['total_pss_mb'] - previous['total_pss_mb']) / (workers - previous['workers']):>11.1f}"
+            print(
+                f"{mode:<11} {workers:>7} {r['ready_s']:>8.2f} {r['master']['pss_mb']:>11.1f}"
+                f" {r['worker_uss_mb']:>11.1f} {r['total_pss_mb']:>10.1f} {step}"
+            )
+            previous = r
+
+    if args.no_preload_too:
+        os.unlink(variants[1][1])
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__=='__main__':
+    if not sys.platform.startswith('linux'):
+        sys.exit('bench_workers.py reads /proc and only runs on linux')
+    main()
@@ -0,0 +1,77 @@
+#Smoke check of bench_callbacks.py --out on a small synthetic dataset
+#
+#Run from main/notebooks:  python benchmarks/check_bench_output.py
+#Writes a tiny synthetic dataset with synthetic_data.py, trains a model on it, runs
+#bench_callbacks.py with --out (one player, one call per case) and loads the json back,
+#checking the fields bench_scaling.py and --compare read.  Everything goes to a temp
+#directory; nothing touches the real cache or models.  Takes well under a minute.
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+NOTEBOOKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+
+def run(args, env):
+    out = subprocess.run([sys.executable] + args, cwd=NOTEBOOKS_DIR, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        sys.exit(f"FAIL: {' '.join(args)} exited with {out.returncode}:\n{out.stderr}")
+
+
+def check(result):
+    '''Problems with a bench_callbacks.py --out json, as a list of messages.'''
+    problems = []
+    for key in ['created', 'commit', 'dataset', 'repeats', 'startup', 'summary', 'cases']:
+        if key not in result:
+            problems.append(f'missing {key!r}')
+    dataset = result.get('dataset', {})
+    for key in ['source', 'version', 'rows', 'players']:
+        if not dataset.get(key):
+            problems.append(f'dataset has no {key!r}')
+    if not result.get('cases'):
+        problems.append('no cases')
+    for name, summary in result.get('summary', {}).items():
+        if 'p50_ms' not in summary:
+            problems.append(f'summary of {name} has no p50_ms')
+    if 'median_s' not in result.get('startup', {}):
+        problems.append('startup has no median_s')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=float, default=0.2)
+    parser.add_argument('--keep', action='store_true', help='keep the temp directory')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='atp_bench_check_')
+    try:
+        data = os.path.join(directory, 'matches.parquet')
+        env = dict(
+            os.environ, PYTHONWARNINGS='ignore', ATP_DATA_URL=data,
+            ATP_CACHE_DIR=os.path.join(directory, 'cache'), ATP_MODEL_DIR=os.path.join(directory, 'models')
+        )
+        out = os.path.join(directory, 'callbacks.json')
+
+        run(['synthetic_data.py', '--scale', str(args.scale), '--compression', 'snappy', '--out', data], env)
+        run(['train_model.py', '--folds', '2'], env)
+        run(['benchmarks/bench_callbacks.py', '--top', '1', '--repeats', '1', '--import-runs', '1', '--out', out], env)
+
+        with open(out) as f:
+            problems = check(json.load(f))
+    finally:
+        if not args.keep:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if problems:
+        sys.exit('FAIL: ' + '; '.join(problems))
+    print('OK: bench_callbacks.py --out wrote a complete result')
+
+
+if __name__=='__main__':
+    main()
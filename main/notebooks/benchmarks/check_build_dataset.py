@@ -0,0 +1,192 @@
+#Parity check: build_dataset.py vs. the EDA notebook's cells on the same raw csv
+#
+#Run from main/notebooks:
+#    python benchmarks/check_build_dataset.py [--csv PATH] [--workers N]
+#The notebook cells that make model_df_v2 (6-10, 27-49 through bench_scores.py's copy,
+#55-75) run on the csv as the reference, build_dataset.py builds its file from the same
+#csv, and the two frames are compared column by column: names and order, dtypes, row
+#order and values.  The notebook's sets column (the raw token lists) is not written by
+#build_dataset.py and is dropped from the reference.
+#
+#atp_matches_till_2022.csv is not in the tree; without --csv a random raw csv of
+#--matches matches is written instead, with the quirks the cleaning is for: matches
+#before 1991 and under 30 minutes, missing stats, minutes and ages, negative break
+#points saved, over 100 first serves in, tiebreaks, retirements and walkovers.
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+warnings.filterwarnings('ignore')
+
+from bench_scores import notebook_games
+from build_dataset import TOURNEY_COLUMNS, PLAYER_COLUMNS, MATCH_COLUMNS, STAT_COLUMNS, build
+
+
+#----- The notebook, cells 6-74 (cell 75 deletes score before writing)
+def notebook_model_df(matches):
+    win_matches = matches.iloc[:,np.r_[0:15,23:36,45:47]]
+    lose_matches = matches.iloc[:,np.r_[0:7,15:27,36:45,47:49]]
+    for frame, prefix, stat_prefix, outcome in ((win_matches, 'winner', 'w', 1), (lose_matches, 'loser', 'l', 0)):
+        renames = {f'{prefix}_{c}': f'player_{c}' for c in PLAYER_COLUMNS}
+        renames.update({f'{stat_prefix}_{k}': v for k, v in STAT_COLUMNS.items()})
+        renames.update({f'{prefix}_rank': 'rank', f'{prefix}_rank_points': 'rank_points'})
+        frame.rename(columns=renames, inplace=True)
+        frame['outcome'] = outcome
+    matches = pd.concat([win_matches, lose_matches], ignore_index=True, axis=0)
+    matches['year'] = matches['tourney_id'].str[0:4].astype(int)
+
+    matches = notebook_games(matches)
+
+    matches_v2 = matches[matches['year']>=1991]
+    matches_v2.loc[matches_v2['minutes'] < 30] = np.nan
+    matches_v2['minutes'] = matches_v2['minutes'].fillna(matches_v2.groupby('total_games_played')['minutes'].transform('median'))
+    matches_v2.dropna(subset=['minutes'], inplace=True)
+    matches_v2['num_brkpts_faced'] = matches_v2['num_brkpts_faced'].fillna(matches_v2.groupby('total_games_played')['num_brkpts_faced'].transform('median'))
+    matches_v2['num_brkpts_saved'] = matches_v2['num_brkpts_saved'].fillna(matches_v2.groupby('total_games_played')['num_brkpts_saved'].transform('median'))
+    matches_v2 = matches_v2[matches_v2['num_brkpts_saved']>=0]
+    matches_v2['num_dfs'] = matches_v2['num_dfs'].fillna(matches_v2.groupby('total_games_lost')['num_dfs'].transform('median'))
+    matches_v2['num_aces'] = matches_v2['num_aces'].fillna(matches_v2.groupby('total_games_won')['num_aces'].transform('median'))
+    matches_v2['serve1_in_perc'] = matches_v2['serve1_in_perc'].fillna(matches_v2.groupby('total_games_won')['serve1_in_perc'].transform('median'))
+    matches_v2['serve1_in_perc'] = np.where(matches_v2['serve1_in_perc']>100,100, matches_v2['serve1_in_perc'])
+
+    model_df = matches_v2[(matches_v2['player_age'].notnull())]
+    del model_df['score']
+    return model_df.drop(columns='sets').reset_index(drop=True)
+
+
+#----- A raw csv in Sackmann's layout
+#Sets 1-2 only use the tokens the notebook's replace lists handle there, 3-5 the rest
+EARLY_SETS = ['6-4','6-3','7-5','3-6','6-2','6-1','4-6','7-6(5)','6-7(3)','7-6(10)','6-4?','6-3?']
+LATE_SETS = EARLY_SETS + ['[10-8]','[7-10]','1-08','4-6?','6-1?','RET','DEF','Def.']
+WHOLE_SCORES = ['W/O','Walkover','RET','UNK','?-?','Apr-00','DEF']
+
+
+def raw_matches(n, seed=0):
+    rng = np.random.default_rng(seed)
+    missing = lambda p: rng.random(n) < p
+    years = np.sort(rng.integers(1985, 2023, n))
+    tourney = np.arange(n) // 30
+    columns = {
+        'tourney_id': [f'{year}-{t:04d}' for year, t in zip(years, tourney)],
+        'tourney_name': [f'Open {t % 80}' for t in tourney],
+        'surface': np.array(['Hard','Clay','Grass','Carpet'])[tourney % 4],
+        'draw_size': 32,
+        'tourney_level': 'A',
+        'tourney_date': years * 10000 + 101 + (tourney % 11) * 100,
+        'match_num': np.arange(n) % 30 + 1,
+    }
+    players = rng.integers(0, 900, (n, 2))
+    for side, k in (('winner', 0), ('loser', 1)):
+        columns.update({
+            f'{side}_id': 100000 + players[:, k],
+            f'{side}_seed': np.where(missing(0.8), np.nan, rng.integers(1, 17, n)),
+            f'{side}_entry': np.where(missing(0.1), 'Q', None),
+            f'{side}_name': [f'Player {i}' for i in players[:, k]],
+            f'{side}_hand': np.where(players[:, k] % 7 == 0, 'L', 'R'),
+            f'{side}_ht': np.where(missing(0.1), np.nan, 170 + players[:, k] % 30),
+            f'{side}_ioc': np.array(['ESP','USA','FRA','SRB'])[players[:, k] % 4],
+            f'{side}_age': np.where(missing(0.01), np.nan, rng.uniform(17, 38, n).round(1)),
+        })
+
+    scores = []
+    for _ in range(n):
+        draw = rng.random()
+        if draw < 0.01:
+            scores.append(rng.choice(WHOLE_SCORES))
+        elif draw < 0.012:
+            scores.append(None)
+        else:
+            sets = rng.integers(2, 7)
+            tokens = [rng.choice(EARLY_SETS) for _ in range(min(sets, 2))] + [rng.choice(LATE_SETS) for _ in range(sets - 2)]
+            scores.append(' '.join(tokens).replace(' ', '  ', 1) if rng.random() < 0.005 else ' '.join(tokens))
+    columns.update({
+        'score': scores,
+        'best_of': 3,
+        'round': rng.choice(['R32','R16','QF','SF','F'], n),
+        'minutes': np.where(missing(0.08), np.nan, rng.integers(10, 240, n)),
+    })
+
+    for prefix in ('w', 'l'):
+        for stat, high in (('ace',25),('df',10),('svpt',120),('1stIn',110),('1stWon',60),('2ndWon',30),('SvGms',15),('bpSaved',10),('bpFaced',15)):
+            values = rng.integers(0, high, n).astype(float)
+            if stat == 'bpSaved':
+                values[missing(0.003)] = -1
+            columns[f'{prefix}_{stat}'] = np.where(missing(0.06), np.nan, values)
+    for side in ('winner', 'loser'):
+        columns[f'{side}_rank'] = np.where(missing(0.05), np.nan, rng.integers(1, 500, n))
+        columns[f'{side}_rank_points'] = rng.integers(0, 9000, n)
+
+    order = (
+        TOURNEY_COLUMNS + [f'winner_{c}' for c in PLAYER_COLUMNS] + [f'loser_{c}' for c in PLAYER_COLUMNS]
+        + MATCH_COLUMNS + [f'w_{k}' for k in STAT_COLUMNS] + [f'l_{k}' for k in STAT_COLUMNS]
+        + ['winner_rank','winner_rank_points','loser_rank','loser_rank_points']
+    )
+    return pd.DataFrame(columns)[order]
+
+
+#----- Comparison
+def compare(expected, built):
+    '''Differences between the notebook's frame and build_dataset's, as a list of messages.'''
+    if list(expected.columns) != list(built.columns):
+        return [f'columns differ:\n  notebook {list(expected.columns)}\n  built    {list(built.columns)}']
+    if len(expected) != len(built):
+        return [f'{len(expected):,} notebook rows, {len(built):,} built']
+
+    problems = []
+    for column in expected.columns:
+        a, b = expected[column], built[column]
+        if str(a.dtype) != str(b.dtype):
+            problems.append(f'{column}: dtype {a.dtype} in the notebook, {b.dtype} built')
+        elif a.dtype == object:
+            if not (a.fillna('<NA>').to_numpy() == b.fillna('<NA>').to_numpy()).all():
+                problems.append(f'{column}: values differ')
+        elif not np.allclose(a.to_numpy(), b.to_numpy(), equal_nan=True):
+            problems.append(f'{column}: values differ')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', help='raw match csv (default: a random one)')
+    parser.add_argument('--matches', type=int, default=100000, help='matches in the random csv')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='atp_build_check_')
+    try:
+        csv = args.csv
+        if csv is None:
+            csv = os.path.join(directory, 'matches.csv')
+            raw_matches(args.matches).to_csv(csv, index=False)
+
+        start = time.perf_counter()
+        expected = notebook_model_df(pd.read_csv(csv))
+        notebook_s = time.perf_counter() - start
+
+        out = os.path.join(directory, 'model_df_v2.parquet.gzip')
+        start = time.perf_counter()
+        build([csv], out, args.workers, work_dir=directory)
+        build_s = time.perf_counter() - start
+        built = pd.read_parquet(out)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    problems = compare(expected, built)
+    if problems:
+        sys.exit('FAIL:\n' + '\n'.join(problems))
+    print(
+        f'OK: {len(built):,} rows x {len(built.columns)} columns identical to the notebook '
+        f'(notebook {notebook_s:.1f} s, build_dataset.py {build_s:.1f} s)'
+    )
+
+
+if __name__=='__main__':
+    main()
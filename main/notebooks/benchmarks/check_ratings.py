@@ -0,0 +1,140 @@
+#Incremental vs. full Elo ratings
+#
+#Run from main/notebooks:  python benchmarks/check_ratings.py
+#rate_matches() with a saved state rates only the matches added since the state was
+#saved.  On a small random frame this checks that the ratings come out the same as one
+#pass over everything, and that a state which no longer fits the stream - an earlier
+#match changed, matches removed, an unreadable file - is thrown away and everything is
+#rated again.  "The same" is every array of the state, history included, compared exactly.
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from ratings import EloRatings, rate_matches
+
+
+def random_matches(n_matches=3000, n_players=60, seed=0):
+    '''Two rows per match (winner, loser) with the columns match_stream reads.'''
+    rng = np.random.default_rng(seed)
+    tourney = np.arange(n_matches) // 15
+    dates = (20000101 + 10000 * (tourney // 20) + 100 * (tourney % 20 // 2) + tourney % 2).astype(np.int64)
+    players = np.array([rng.choice(n_players, 2, replace=False) for _ in range(n_matches)])
+    match = {
+        'tourney_id': [f'T{t:05d}' for t in tourney],
+        'tourney_date': dates,
+        'match_num': np.arange(n_matches) % 15 + 1,
+        'surface': np.array(['Hard', 'Clay', 'Grass', 'Carpet'])[tourney % 4],
+    }
+    rows = []
+    for k, outcome in ((0, 1), (1, 0)):
+        side = pd.DataFrame(match)
+        side['player_name'] = [f'Player {p:02d}' for p in players[:, k]]
+        side['outcome'] = outcome
+        rows.append(side)
+    return pd.concat(rows, ignore_index=True)
+
+
+def differences(a, b):
+    '''Names of the state fields in which two EloRatings differ.'''
+    fields = {
+        'players': (a.players, b.players), 'surfaces': (a.surfaces, b.surfaces),
+        'n_matches': (a.n_matches, b.n_matches), 'last_date': (a.last_date, b.last_date),
+        'fingerprint': (a.fingerprint, b.fingerprint),
+        'rating': (a.rating, b.rating), 'played': (a.played, b.played),
+        'surface_rating': (a.surface_rating, b.surface_rating), 'surface_played': (a.surface_played, b.surface_played),
+    }
+    fields.update({'history_' + field: (a.history[field], b.history[field]) for field in a.history})
+    return [name for name, (x, y) in fields.items() if not np.array_equal(np.asarray(x), np.asarray(y))]
+
+
+class CountedUpdates:
+    '''Records how many matches each EloRatings.update call rates.'''
+
+    def __enter__(self):
+        self.calls = []
+        self._update = EloRatings.update
+
+        def update(ratings_, dates, *rest):
+            self.calls.append(len(dates))
+            return self._update(ratings_, dates, *rest)
+
+        EloRatings.update = update
+        return self
+
+    def __exit__(self, *exc):
+        EloRatings.update = self._update
+
+
+def check():
+    '''Problems found, as a list of messages.'''
+    df = random_matches()
+    full = rate_matches(df)
+    total = full.n_matches
+    dates = df['tourney_date']
+    problems = []
+
+    directory = tempfile.mkdtemp(prefix='atp_ratings_check_')
+    try:
+        #----- Seasons appended one at a time: each run rates only the new matches
+        state = os.path.join(directory, 'ratings.npz')
+        cutoffs = np.quantile(dates.unique(), [0.3, 0.6, 0.8])
+        parts = [df[dates <= cutoff] for cutoff in cutoffs] + [df]
+        rated = 0
+        for part in parts:
+            with CountedUpdates() as updates:
+                result = rate_matches(part, state)
+            matches = len(part) // 2
+            if updates.calls != [matches - rated]:
+                problems.append(f'{matches:,} matches after {rated:,} rated: updates of {updates.calls}, expected [{matches - rated}]')
+            rated = matches
+        for name in differences(result, full):
+            problems.append(f'incremental ratings differ from one pass in {name}')
+        for name in differences(EloRatings.load(state), full):
+            problems.append(f'saved state differs from one pass in {name}')
+
+        #----- A state that does not fit the stream: everything is rated again
+        early = df[dates <= cutoffs[0]]
+        changed = df.copy()
+        first = changed.index[(changed['tourney_date'] == dates.min()) & (changed['outcome'] == 1)][0]
+        changed.loc[first, 'player_name'] = 'Player renamed'
+        cases = [
+            ('an earlier match changed', early, changed),
+            ('matches removed', df, early),
+            ('an unreadable state file', None, df),
+        ]
+        for label, saved, current in cases:
+            if saved is None:
+                with open(state, 'wb') as f:
+                    f.write(b'not a state')
+            else:
+                rate_matches(saved, state)
+            with CountedUpdates() as updates:
+                result = rate_matches(current, state)
+            expected = rate_matches(current)
+            if updates.calls != [expected.n_matches]:
+                problems.append(f'{label}: updates of {updates.calls}, expected one of all {expected.n_matches:,} matches')
+            for name in differences(result, expected):
+                problems.append(f'{label}: ratings differ from one pass in {name}')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if total != len(df) // 2:
+        problems.append(f'{total:,} matches rated, {len(df) // 2:,} in the frame')
+    return problems
+
+
+def main():
+    problems = check()
+    if problems:
+        sys.exit('FAIL:\n' + '\n'.join(problems))
+    print('OK: incremental ratings match one pass; a stale state is rated again from scratch')
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,100 @@
+#Case table for scores.parse_games
+#
+#Run from main/notebooks:  python benchmarks/check_scores.py
+#Every rule in the scores.py header, checked on hand-written scores without the raw CSV
+#(bench_scores.py checks the whole file against the notebook when it is there).  Each
+#case is a raw score and the five set scores the notebook wrote for the winner's row;
+#the loser's row must read them the other way round, and the games and percentages
+#follow from the set scores.
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from scores import SET_COUNT, parse_games
+
+
+CASES = [
+    ('6-4 6-3',                    ['6-4', '6-3', 'nan', 'nan', 'nan']),
+    #Tiebreak points
+    ('7-6(5) 6-7(10) 7-6(0)',      ['7-6', '6-7', '7-6', 'nan', 'nan']),
+    ('6-4 3-6 6-4 4-6 13-12(3)',   ['6-4', '3-6', '6-4', '4-6', '13-12']),
+    #Match tiebreaks
+    ('6-4 3-6 [10-8]',             ['6-4', '3-6', '10-8', 'nan', 'nan']),
+    ('6-7 7-6 [6-7]',              ['6-7', '7-6', '6-7', 'nan', 'nan']),
+    #Trailing junk
+    ('6-4? 7-5?',                  ['6-4', '7-5', 'nan', 'nan', 'nan']),
+    #Data entry error for 1-0
+    ('6-4 3-6 1-08',               ['6-4', '3-6', '1-0', 'nan', 'nan']),
+    #Retirements and defaults: the token is not a score
+    ('6-4 2-1 RET',                ['6-4', '2-1', '0', 'nan', 'nan']),
+    ('6-3 DEF',                    ['6-3', '0', 'nan', 'nan', 'nan']),
+    ('6-3 1-0 Def.',               ['6-3', '1-0', '0', 'nan', 'nan']),
+    ('RET',                        ['0', 'nan', 'nan', 'nan', 'nan']),
+    ('UNK',                        ['0', 'nan', 'nan', 'nan', 'nan']),
+    ('?-? ?-?',                    ['0', '0', 'nan', 'nan', 'nan']),
+    ('Apr-00',                     ['0', 'nan', 'nan', 'nan', 'nan']),
+    #Walkovers were blanked before splitting, so no set at all
+    ('W/O',                        ['nan', 'nan', 'nan', 'nan', 'nan']),
+    ('Walkover',                   ['nan', 'nan', 'nan', 'nan', 'nan']),
+    (None,                         ['nan', 'nan', 'nan', 'nan', 'nan']),
+    #A doubled space is an empty set
+    ('6-4  6-3',                   ['6-4', '0', '6-3', 'nan', 'nan']),
+    #Five sets, and only the first five tokens of a longer score
+    ('6-7(3) 7-6(5) 4-6 7-5 6-4',  ['6-7', '7-6', '4-6', '7-5', '6-4']),
+    ('6-4 6-4 6-4 4-6 6-4 6-2',    ['6-4', '6-4', '6-4', '4-6', '6-4']),
+]
+
+
+def invert(set_score):
+    return '-'.join(set_score.split('-')[::-1])
+
+
+def expected_columns(sets):
+    '''The columns parse_games should give for a row whose set scores are sets.'''
+    games = [[int(g) for g in s.split('-')] if '-' in s else [0, 0] for s in sets]
+    won, lost = [g[0] for g in games], [g[1] for g in games]
+    columns = {}
+    for i in range(SET_COUNT):
+        columns[f'set{i + 1}_score'] = sets[i]
+        columns[f'set{i + 1}_games_won'] = won[i]
+        columns[f'set{i + 1}_games_lost'] = lost[i]
+        columns[f'set{i + 1}_win_perc'] = won[i] / (won[i] + lost[i]) if won[i] + lost[i] else np.nan
+    columns['total_games_won'] = sum(won)
+    columns['total_games_lost'] = sum(lost)
+    columns['total_games_played'] = sum(won) + sum(lost)
+    columns['game_win_perc'] = sum(won) / (sum(won) + sum(lost)) if sum(won) + sum(lost) else np.nan
+    return columns
+
+
+def check(cases=CASES):
+    '''Mismatches between parse_games and the case table, as a list of messages.'''
+    scores = pd.Series([score for score, _ in cases] * 2, dtype=object)
+    outcome = np.repeat([1, 0], len(cases))
+    games = parse_games(scores, outcome)
+
+    problems = []
+    for row, (score, sets) in enumerate(cases * 2):
+        loser = outcome[row] == 0
+        expected = expected_columns([invert(s) for s in sets] if loser else sets)
+        for column, value in expected.items():
+            got = games[column].iloc[row]
+            same = np.isclose(got, value, equal_nan=True) if isinstance(value, float) else got == value
+            if not same:
+                side = 'loser' if loser else 'winner'
+                problems.append(f'{score!r} ({side}): {column} is {got!r}, expected {value!r}')
+    return problems
+
+
+def main():
+    problems = check()
+    if problems:
+        sys.exit('FAIL:\n' + '\n'.join(problems))
+    print(f'OK: {len(CASES)} scores, winner and loser rows')
+
+
+if __name__=='__main__':
+    main()
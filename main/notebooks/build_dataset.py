@@ -0,0 +1,307 @@
+#Rebuild model_df_v2.parquet.gzip from the raw match CSVs
+#
+#The same steps as the EDA notebook, without the notebook:
+#    1. stack every match into a winner row and a loser row (outcome 1 / 0), add year
+#       and the set scores, games won / lost and win percentages parsed from the score
+#       (scores.py)
+#    2. keep 1991 onwards (no match stats before that), drop matches under 30 minutes
+#    3. median-impute the missing stats in the notebook's order - minutes by games
+#       played, break points by games played, double faults by games lost, aces and
+#       1st serves in by games won - dropping the rows the notebook dropped in between
+#    4. cap 1st serves in at 100 and keep rows with a player age
+#The columns are the notebook's (cell 75) in its order, without score, which it deleted
+#before writing the file, and without its sets column, the raw token lists the set scores
+#were cut from.  Rows come out winners then losers, each in csv order as long as the csv
+#is in year order like Sackmann's files.  benchmarks/check_build_dataset.py runs the
+#notebook cells and this script on the same csv and compares the two.
+#
+#The CSVs are streamed in chunks and split into one shard per year on disk, so only a
+#chunk or a shard is ever in memory.  The medians in step 3 are over the whole dataset;
+#every shard reports (group, value) counts, the counts are summed and the exact medians
+#come out of the combined histogram.  Each of the three imputation rounds needs the
+#rows that survived the one before, hence three map / reduce rounds over the shards,
+#run in a process pool.
+#
+#Usage:  python build_dataset.py [--matches CSV ...] [--out PATH] [--workers N]
+import argparse
+import os
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+from scores import SET_COUNT, parse_games
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'data')
+MATCHES_CSV = os.path.join(DATA_DIR, 'atp_matches_till_2022.csv')
+OUTPUT = os.path.join(DATA_DIR, 'model_df_v2.parquet.gzip')
+
+#Csv is read in blocks of this size (about 40k matches)
+BLOCK_MB = 8
+
+#Match statistics are not available until 1991
+FIRST_YEAR = 1991
+MIN_MINUTES = 30
+
+#----- Raw layout: tourney columns, then a winner_/loser_ block, match columns, w_/l_ stats, ranks
+TOURNEY_COLUMNS = ['tourney_id','tourney_name','surface','draw_size','tourney_level','tourney_date','match_num']
+PLAYER_COLUMNS = ['id','seed','entry','name','hand','ht','ioc','age']
+MATCH_COLUMNS = ['score','best_of','round','minutes']
+STAT_COLUMNS = {
+    'ace':'num_aces',
+    'df':'num_dfs',
+    'svpt':'num_svpts',
+    '1stIn':'serve1_in_perc',
+    '1stWon':'serve1_win_perc',
+    '2ndWon':'serve2_win_perc',
+    'SvGms':'num_games_served',
+    'bpSaved':'num_brkpts_saved',
+    'bpFaced':'num_brkpts_faced',
+}
+STRING_COLUMNS = [
+    'tourney_id','tourney_name','surface','tourney_level','score','round',
+    *[f'{side}_{c}' for side in ('winner','loser') for c in ('entry','name','hand','ioc')]
+]
+
+#What scores.parse_games adds, in the notebook's order (cells 28-49)
+SETS = range(1, SET_COUNT + 1)
+SET_SCORE_COLUMNS = [f'set{i}_score' for i in SETS]
+GAME_COLUMNS = (
+    SET_SCORE_COLUMNS + [f'set{i}_games_won' for i in SETS] + [f'set{i}_games_lost' for i in SETS]
+    + ['total_games_won','total_games_lost','total_games_played']
+    + [f'set{i}_win_perc' for i in SETS] + ['game_win_perc']
+)
+
+#The stacked frame, in the order the notebook left it, score deleted
+OUTPUT_COLUMNS = (
+    TOURNEY_COLUMNS + [f'player_{c}' for c in PLAYER_COLUMNS] + [c for c in MATCH_COLUMNS if c != 'score']
+    + list(STAT_COLUMNS.values()) + ['rank','rank_points','outcome','year'] + GAME_COLUMNS
+)
+OUTPUT_STRING_COLUMNS = [
+    'tourney_id','tourney_name','surface','tourney_level',
+    'player_entry','player_name','player_hand','player_ioc','round'
+] + SET_SCORE_COLUMNS
+#Everything else is float64, as it was after the notebook blanked rows with NaN
+OUTPUT_SCHEMA = pa.schema([
+    (column, pa.string() if column in OUTPUT_STRING_COLUMNS else pa.float64())
+    for column in OUTPUT_COLUMNS
+])
+
+#(column to impute, column whose value groups the median), one list per reduce round
+IMPUTATION_ROUNDS = [
+    [('minutes','total_games_played')],
+    [('num_brkpts_faced','total_games_played'), ('num_brkpts_saved','total_games_played')],
+    [('num_dfs','total_games_lost'), ('num_aces','total_games_won'), ('serve1_in_perc','total_games_won')],
+]
+
+
+def player_rows(chunk, side, outcome):
+    '''One side of every match as player_* rows.'''
+    prefix, stat_prefix = ('winner', 'w') if side == 'winner' else ('loser', 'l')
+    columns = {column: column for column in TOURNEY_COLUMNS}
+    columns.update({f'{prefix}_{c}': f'player_{c}' for c in PLAYER_COLUMNS})
+    columns.update({column: column for column in MATCH_COLUMNS})
+    columns.update({f'{stat_prefix}_{k}': v for k, v in STAT_COLUMNS.items()})
+    columns.update({f'{prefix}_rank': 'rank', f'{prefix}_rank_points': 'rank_points'})
+
+    rows = chunk[list(columns)].rename(columns=columns)
+    rows['outcome'] = float(outcome)
+    rows['row'] = chunk.index.to_numpy()
+    return rows
+
+
+def stack_chunk(chunk):
+    '''Steps 1-2 for one chunk of raw matches.'''
+    stacked = pd.concat([player_rows(chunk, 'winner', 1), player_rows(chunk, 'loser', 0)], ignore_index=True)
+    stacked['year'] = stacked['tourney_id'].str[0:4].astype(float)
+    stacked = stacked[stacked['year'] >= FIRST_YEAR].copy()
+
+    games = parse_games(stacked['score'], stacked['outcome'].to_numpy())
+    for column in GAME_COLUMNS:
+        stacked[column] = games[column] if column in SET_SCORE_COLUMNS else games[column].astype(float)
+    stacked = stacked.drop(columns='score')
+
+    #The notebook blanks matches under 30 minutes and drops them with the unimputable ones
+    return stacked[~(stacked['minutes'] < MIN_MINUTES)]
+
+
+def _shard_chunk(chunk, chunk_no, shard_root):
+    stacked = stack_chunk(chunk)
+    for year, rows in stacked.groupby('year'):
+        directory = os.path.join(shard_root, f'{int(year)}')
+        os.makedirs(directory, exist_ok=True)
+        pq.write_table(pa.Table.from_pandas(rows, preserve_index=False), os.path.join(directory, f'{chunk_no:05d}.parquet'))
+    return len(chunk), len(stacked)
+
+
+def _read_shard(directory):
+    return pd.concat(
+        [pq.read_table(os.path.join(directory, name)).to_pandas() for name in sorted(os.listdir(directory))],
+        ignore_index=True
+    )
+
+
+def apply_round(df, round_no, medians):
+    '''Fill one round's columns with the global medians and drop what the notebook dropped next.'''
+    for column, key in IMPUTATION_ROUNDS[round_no]:
+        df[column] = df[column].fillna(df[key].map(medians[column, key]))
+
+    if round_no == 0:
+        return df.dropna(subset=['minutes'])
+    if round_no == 1:
+        return df[df['num_brkpts_saved'] >= 0].copy()
+    df['serve1_in_perc'] = np.where(df['serve1_in_perc'] > 100, 100, df['serve1_in_perc'])
+    return df
+
+
+def _shard_histograms(directory, round_no, medians):
+    df = _read_shard(directory)
+    for done in range(round_no):
+        df = apply_round(df, done, medians)
+    return {
+        (column, key): df.groupby([key, column]).size()
+        for column, key in IMPUTATION_ROUNDS[round_no]
+    }
+
+
+def exact_medians(counts):
+    '''Per-group median from summed (group, value) -> count histograms, as groupby().median() would give.'''
+    counts = counts.groupby(level=[0, 1]).sum().sort_index()
+    key = counts.index.get_level_values(0)
+    values = counts.index.get_level_values(1).to_numpy()
+
+    seen = counts.groupby(level=0).cumsum().to_numpy()
+    total = counts.groupby(level=0).transform('sum').to_numpy()
+
+    #First value whose running count passes the middle position(s)
+    lower = pd.Series(values[seen > (total - 1) // 2], index=key[seen > (total - 1) // 2]).groupby(level=0).first()
+    upper = pd.Series(values[seen > total // 2], index=key[seen > total // 2]).groupby(level=0).first()
+    return (lower + upper) / 2
+
+
+def _finish_shard(directory, medians, out_directory):
+    df = _read_shard(directory)
+    for round_no in range(len(IMPUTATION_ROUNDS)):
+        df = apply_round(df, round_no, medians)
+    df = df[df['player_age'].notnull()].sort_values(['outcome','row'], ascending=[False, True])
+
+    for name, rows in (('winners', df[df['outcome'] == 1]), ('losers', df[df['outcome'] == 0])):
+        table = pa.Table.from_pandas(rows[OUTPUT_COLUMNS], preserve_index=False).cast(OUTPUT_SCHEMA)
+        pq.write_table(table, os.path.join(out_directory, f'{name}-{os.path.basename(directory)}.parquet'))
+    return len(df)
+
+
+def read_chunks(paths, block_mb=BLOCK_MB):
+    '''Raw matches in chunks of about block_mb of csv, indexed by their row number across all files.'''
+    offset = 0
+    for path in paths:
+        header = pd.read_csv(path, nrows=0).columns
+        column_types = {column: pa.string() if column in STRING_COLUMNS else pa.float64() for column in header}
+        reader = pv.open_csv(
+            path,
+            read_options=pv.ReadOptions(block_size=int(block_mb * 2**20)),
+            convert_options=pv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+        )
+        for batch in reader:
+            chunk = batch.to_pandas()
+            chunk.index = np.arange(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+
+
+def _peak_memory_mb():
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own / 1024, children / 1024
+
+
+def build(paths, out=OUTPUT, workers=None, work_dir=None, block_mb=BLOCK_MB):
+    '''Run the pipeline and write out. Returns [(stage, seconds, rows)].'''
+    workers = workers or os.cpu_count()
+    timings = []
+    tmp = tempfile.mkdtemp(prefix='atp-build-', dir=work_dir)
+    shard_root = os.path.join(tmp, 'shards')
+    out_root = os.path.join(tmp, 'out')
+    os.makedirs(out_root)
+
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            #----- Stage 1: stream the CSVs, stack / parse each chunk in the pool, shard by year
+            start = time.perf_counter()
+            pending, raw_rows, player_rows_kept = set(), 0, 0
+            for chunk_no, chunk in enumerate(read_chunks(paths, block_mb)):
+                #Bound the chunks in flight so memory does not grow with the file
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        raw, kept = future.result()
+                        raw_rows, player_rows_kept = raw_rows + raw, player_rows_kept + kept
+                pending.add(pool.submit(_shard_chunk, chunk, chunk_no, shard_root))
+            for future in pending:
+                raw, kept = future.result()
+                raw_rows, player_rows_kept = raw_rows + raw, player_rows_kept + kept
+            timings.append(('read + stack + shard', time.perf_counter() - start, player_rows_kept))
+
+            shards = [os.path.join(shard_root, name) for name in sorted(os.listdir(shard_root))]
+
+            #----- Stages 2-4: one histogram map / median reduce per imputation round
+            medians = {}
+            for round_no, columns in enumerate(IMPUTATION_ROUNDS):
+                start = time.perf_counter()
+                histograms = list(pool.map(_shard_histograms, shards, [round_no] * len(shards), [medians] * len(shards)))
+                for column, key in columns:
+                    medians[column, key] = exact_medians(pd.concat([h[column, key] for h in histograms]))
+                label = 'impute ' + ', '.join(column for column, _ in columns)
+                timings.append((label, time.perf_counter() - start, len(shards)))
+
+            #----- Stage 5: apply everything per shard
+            start = time.perf_counter()
+            rows = sum(pool.map(_finish_shard, shards, [medians] * len(shards), [out_root] * len(shards)))
+            timings.append(('finish shards', time.perf_counter() - start, rows))
+
+        #----- Stage 6: concatenate into one file, winners then losers, a shard at a time
+        start = time.perf_counter()
+        tmp_out = out + '.tmp'
+        with pq.ParquetWriter(tmp_out, OUTPUT_SCHEMA, compression='gzip') as writer:
+            for name in ('winners', 'losers'):
+                for shard in shards:
+                    writer.write_table(pq.read_table(os.path.join(out_root, f'{name}-{os.path.basename(shard)}.parquet')))
+        os.replace(tmp_out, out)
+        timings.append(('write ' + os.path.basename(out), time.perf_counter() - start, rows))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build model_df_v2.parquet.gzip from the raw match CSVs')
+    parser.add_argument('--matches', nargs='+', default=[MATCHES_CSV], help='raw match csv file(s)')
+    parser.add_argument('--out', default=OUTPUT)
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: all cores)')
+    parser.add_argument('--block-mb', type=float, default=BLOCK_MB, help='csv read block size')
+    parser.add_argument('--work-dir', default=None, help='where the temporary year shards go')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    timings = build(args.matches, args.out, args.workers, args.work_dir, args.block_mb)
+
+    print(f'{"stage":<52}{"seconds":>9}{"rows":>10}')
+    for stage, seconds, rows in timings:
+        print(f'{stage:<52}{seconds:>9.2f}{rows:>10,}')
+    own, children = _peak_memory_mb()
+    print(f'{"total":<52}{time.perf_counter() - start:>9.2f}')
+    print(f'peak RSS: {own:.0f} MB main process, {children:.0f} MB largest worker')
+    print(f'Wrote {args.out}')
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,123 @@
+#Bounded in-process memoization for the dashboard callbacks
+#
+#Results are keyed on (callback name, inputs, dataset version) and evicted least
+#recently used first once the pickled size of everything held passes the byte budget
+#(ATP_CALLBACK_CACHE_MB, default 64, 0 turns caching off).  Changing the dataset
+#version drops every entry.  The version comes from the source registered with
+#set_dataset_version_source (the dashboard's snapshot), asked for before the first key
+#is built, so no entry is ever keyed on a version that is not known yet.
+import functools
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+
+class CallbackCache:
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.version = None
+        self.version_source = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, value):
+        try:
+            size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def set_version(self, version):
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.bytes = 0
+                self.version = version
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+cache = CallbackCache(int(float(os.environ.get('ATP_CALLBACK_CACHE_MB', 64)) * 2**20))
+
+
+def _freeze(value):
+    #Dash hands callbacks lists (range slider, multi dropdowns, sort_by) - make them hashable
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def set_dataset_version(version):
+    cache.set_version(version)
+
+
+def set_dataset_version_source(source):
+    '''Register source() --> current dataset version, called before the first cached lookup.'''
+    cache.version_source = source
+
+
+def cache_stats():
+    return cache.stats()
+
+
+def cached_callback(func):
+    '''Memoize a callback on its inputs. Put it under @app.callback.'''
+    @functools.wraps(func)
+    def wrapper(*args):
+        if cache.max_bytes <= 0:
+            return func(*args)
+
+        if cache.version is None and cache.version_source is not None:
+            cache.set_version(cache.version_source())
+        if cache.version is None:
+            return func(*args)
+
+        key = (func.__name__, _freeze(args), cache.version)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+
+        result = func(*args)
+        cache.put(key, result)
+        return result
+
+    return wrapper
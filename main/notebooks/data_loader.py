@@ -0,0 +1,218 @@
+#Data loading layer for the dashboard
+#
+#The processed dataset is fetched once (from github by default, or any local path /
+#url given in ATP_DATA_URL - including the year-partitioned directory written by
+#partitions.py), cut down to the columns the dashboard uses with the
+#compact dtypes in SCHEMA, written uncompressed as an Arrow IPC (feather v2) file
+#under main/data/cache and memory-mapped on every later startup.  A small json
+#manifest next to the arrow file records where it came from and the sha256 of its
+#bytes, so a truncated or stale cache gets rebuilt instead of silently used.  For a
+#partitioned source it also records a fingerprint of the partition files, so appending
+#a season rebuilds the cache.
+import hashlib
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from partitions import read_matches
+
+try:
+    import fcntl
+except ImportError:  #----- windows: no cross-process lock, workers may race the first download
+    fcntl = None
+
+
+DATA_URL = os.environ.get(
+    'ATP_DATA_URL',
+    'https://raw.githubusercontent.com/statzenthusiast921/ATP_Analysis/main/main/data/model_df_v2.parquet.gzip'
+)
+CACHE_DIR = os.environ.get(
+    'ATP_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'data', 'cache')
+)
+CACHE_NAME = 'model_df_v2'
+
+#Bump when the on-disk layout or SCHEMA changes so old caches are rebuilt
+CACHE_FORMAT = 3
+
+#Columns kept for the dashboard and their in-memory types.  String dimensions become
+#categoricals (integer codes + one copy of each label); the counting stats are
+#median-imputed in the notebook so they can hold halves and stay float32.
+SCHEMA = {
+    'tourney_id': 'category',
+    'tourney_name': 'category',
+    'surface': 'category',
+    'tourney_date': 'int32',
+    'match_num': 'int16',
+    'round': 'category',
+    'year': 'int16',
+    'player_name': 'category',
+    'player_age': 'float32',
+    'rank': 'float32',
+    'num_aces': 'float32',
+    'num_dfs': 'float32',
+    'serve1_in_perc': 'float32',
+    'serve1_win_perc': 'float32',
+    'serve2_win_perc': 'float32',
+    'num_brkpts_saved': 'float32',
+    'num_brkpts_faced': 'float32',
+    'outcome': 'int8',
+    'total_games_won': 'int16',
+    'total_games_lost': 'int16',
+    'game_win_perc': 'float32',
+}
+
+
+def apply_schema(df, schema=SCHEMA):
+    '''Prune to the schema columns and cast them. Categories are sorted so codes follow label order.'''
+    df = df[list(schema)]
+    columns = {}
+    for column, dtype in schema.items():
+        if dtype == 'category':
+            labels = sorted(df[column].dropna().unique())
+            columns[column] = df[column].astype(pd.CategoricalDtype(labels))
+        else:
+            columns[column] = df[column].astype(dtype)
+    return pd.DataFrame(columns)
+
+
+def _cache_paths(cache_dir):
+    arrow_path = os.path.join(cache_dir, CACHE_NAME + '.arrow')
+    manifest_path = os.path.join(cache_dir, CACHE_NAME + '.json')
+    lock_path = os.path.join(cache_dir, CACHE_NAME + '.lock')
+    return arrow_path, manifest_path, lock_path
+
+
+def _sha256(path, chunk_size=8 * 1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_manifest(manifest_path):
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _source_fingerprint(source):
+    '''Hash of the file names, sizes and mtimes under a partitioned source; None for a single file / url.'''
+    if not os.path.isdir(source):
+        return None
+    digest = hashlib.sha256()
+    for directory, _, files in sorted(os.walk(source)):
+        for name in sorted(files):
+            stat = os.stat(os.path.join(directory, name))
+            digest.update(f'{os.path.relpath(os.path.join(directory, name), source)}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode())
+    return digest.hexdigest()
+
+
+def _read_source(source):
+    if os.path.isdir(source):
+        return read_matches(source, columns=list(SCHEMA))
+    return pd.read_parquet(source, columns=list(SCHEMA))
+
+
+def _is_valid(arrow_path, manifest, source):
+    if manifest is None or not os.path.exists(arrow_path):
+        return False
+    if manifest.get('format') != CACHE_FORMAT or manifest.get('source') != source:
+        return False
+    if manifest.get('source_fingerprint') != _source_fingerprint(source):
+        return False
+    if os.path.getsize(arrow_path) != manifest.get('size'):
+        return False
+    return _sha256(arrow_path) == manifest.get('sha256')
+
+
+def materialize(source=DATA_URL, cache_dir=CACHE_DIR):
+    '''Fetch the parquet source and write it to the local arrow cache. Returns the manifest.'''
+    arrow_path, manifest_path, _ = _cache_paths(cache_dir)
+
+    fingerprint = _source_fingerprint(source)
+    df = apply_schema(_read_source(source))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    #----- Write to temp files and rename so readers never see a half written cache
+    tmp_arrow = arrow_path + '.tmp'
+    feather.write_feather(table, tmp_arrow, compression='uncompressed')
+
+    manifest = {
+        'format': CACHE_FORMAT,
+        'source': source,
+        'source_fingerprint': fingerprint,
+        'rows': table.num_rows,
+        'size': os.path.getsize(tmp_arrow),
+        'sha256': _sha256(tmp_arrow),
+    }
+    tmp_manifest = manifest_path + '.tmp'
+    with open(tmp_manifest, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    os.replace(tmp_arrow, arrow_path)
+    os.replace(tmp_manifest, manifest_path)
+    return manifest
+
+
+def ensure_cache(source=DATA_URL, cache_dir=CACHE_DIR):
+    '''Make sure a verified arrow cache exists for source and return (arrow_path, manifest).'''
+    os.makedirs(cache_dir, exist_ok=True)
+    arrow_path, manifest_path, lock_path = _cache_paths(cache_dir)
+
+    manifest = _read_manifest(manifest_path)
+    if _is_valid(arrow_path, manifest, source):
+        return arrow_path, manifest
+
+    #----- Only one process downloads, the others wait on the lock and then re-check
+    with open(lock_path, 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            manifest = _read_manifest(manifest_path)
+            if not _is_valid(arrow_path, manifest, source):
+                manifest = materialize(source, cache_dir)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    return arrow_path, manifest
+
+
+def load_table(source=DATA_URL, cache_dir=CACHE_DIR):
+    '''Memory-map the cached dataset as a pyarrow Table (no copy of the column buffers).'''
+    arrow_path, manifest = ensure_cache(source, cache_dir)
+    with pa.memory_map(arrow_path, 'r') as source_file:
+        table = pa.ipc.open_file(source_file).read_all()
+    return table, manifest
+
+
+def load_dataset(source=DATA_URL, cache_dir=CACHE_DIR):
+    '''Load the dataset as a DataFrame backed by the memory-mapped arrow cache.'''
+    table, _ = load_table(source, cache_dir)
+
+    #split_blocks keeps numeric columns as views on the mapped file instead of
+    #consolidating them into fresh 2D blocks, so workers share the page cache
+    return table.to_pandas(split_blocks=True)
+
+
+def dataset_version(cache_dir=CACHE_DIR):
+    '''Content hash of the cached dataset, or None if it has not been materialized yet.'''
+    manifest = _read_manifest(_cache_paths(cache_dir)[1])
+    return manifest['sha256'] if manifest else None
+
+
+#----- Players shown in the dashboard (and used to fit the model)
+MIN_MATCHES = 300
+
+
+def filter_active_players(df, min_matches=MIN_MATCHES):
+    '''Keep players with at least min_matches matches in the dataset.'''
+    match_counts = df.groupby('player_name', observed=True)['player_name'].transform('size')
+    return df[match_counts >= min_matches]
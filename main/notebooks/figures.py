@@ -0,0 +1,134 @@
+#Lean figure construction for the hot callbacks
+#
+#plotly.express builds a DataFrame per trace, validates every property and resolves
+#the template on each call.  For a handful of line traces it is cheaper to hand Dash
+#the figure as a plain dict: traces are filled straight from NumPy arrays and the
+#dark template / legend layout is resolved once at import.
+import numpy as np
+import plotly.io as pio
+
+
+DARK_TEMPLATE = pio.templates['plotly_dark'].to_plotly_json()
+COLORWAY = DARK_TEMPLATE['layout']['colorway']
+
+LEGEND = dict(
+    orientation="h",
+    yanchor="top",
+    y=1.075,
+    xanchor="center",
+    x=0.5
+)
+
+#Above this many points per trace switch to WebGL
+GL_POINTS = 1000
+
+
+def date_strings(values):
+    '''datetime64 / YYYYMMDD int values as YYYY-MM-DD strings (what plotly expects on a date axis).'''
+    values = np.asarray(values)
+    if not np.issubdtype(values.dtype, np.datetime64):
+        values = _yyyymmdd(values)
+    return np.datetime_as_string(values, unit='D')
+
+
+def _yyyymmdd(values):
+    values = np.asarray(values, dtype=np.int64)
+    years, rest = np.divmod(values, 10000)
+    months, days = np.divmod(rest, 100)
+    return (
+        (years - 1970).astype('datetime64[Y]')
+        + (months - 1).astype('timedelta64[M]')
+    ).astype('datetime64[D]') + (days - 1).astype('timedelta64[D]')
+
+
+def line_trace(x, y, name, color=None, customdata=None, hovertemplate=None):
+    trace = {
+        'type': 'scattergl' if len(x) > GL_POINTS else 'scatter',
+        'mode': 'lines+markers',
+        'name': name,
+        'legendgroup': name,
+        'showlegend': True,
+        'x': x,
+        'y': y,
+    }
+    if color is not None:
+        trace['line'] = {'color': color}
+        trace['marker'] = {'color': color}
+    if customdata is not None:
+        trace['customdata'] = customdata
+    if hovertemplate is not None:
+        trace['hovertemplate'] = hovertemplate
+    return trace
+
+
+def dark_layout(x_title=None, y_title=None, title=None, category_x=False):
+    layout = {
+        'template': DARK_TEMPLATE,
+        'title': {'text': title, 'x': 0.5},
+        'legend': dict(LEGEND, title={'text': None}),
+        'xaxis': {'title': {'text': x_title}},
+        'yaxis': {'title': {'text': y_title}},
+    }
+    if category_x:
+        layout['xaxis']['type'] = 'category'
+    return layout
+
+
+def line_figure(traces, **layout):
+    '''Figure dict from line_trace()s; traces without a color take the next one from the dark colorway.'''
+    for i, trace in enumerate(traces):
+        if 'line' not in trace:
+            color = COLORWAY[i % len(COLORWAY)]
+            trace['line'] = {'color': color}
+            trace['marker'] = {'color': color}
+    return {'data': traces, 'layout': dark_layout(**layout)}
+
+
+def heatmap_figure(z, x, y):
+    '''Annotated heat map laid out like px.imshow(text_auto=True) with the x axis on top.'''
+    return {
+        'data': [{
+            'type': 'heatmap',
+            'z': z,
+            'x': x,
+            'y': y,
+            'coloraxis': 'coloraxis',
+            'texttemplate': '%{z}',
+            'hovertemplate': 'x: %{x}<br>y: %{y}<br>color: %{z}<extra></extra>',
+        }],
+        'layout': {
+            'template': DARK_TEMPLATE,
+            'coloraxis': {'colorscale': DARK_TEMPLATE['layout']['colorscale']['sequential']},
+            'xaxis': {'side': 'top', 'constrain': 'domain', 'scaleanchor': 'y'},
+            'yaxis': {'autorange': 'reversed', 'constrain': 'domain'},
+            'margin': {'t': 60},
+        },
+    }
+
+
+def contribution_heatmap(z, x, y, hovertemplate=None, **layout):
+    '''Heat map of signed values (features x matches) on a diverging scale centred on 0.'''
+    trace = {
+        'type': 'heatmap',
+        'z': z,
+        'x': x,
+        'y': y,
+        'zmid': 0,
+        'colorscale': DARK_TEMPLATE['layout']['colorscale']['diverging'],
+    }
+    if hovertemplate is not None:
+        trace['hovertemplate'] = hovertemplate
+    figure_layout = dark_layout(**layout)
+    figure_layout['yaxis']['autorange'] = 'reversed'
+    return {'data': [trace], 'layout': figure_layout}
+
+
+def bar_figure(x, y, colors, hovertemplate=None, **layout):
+    '''Horizontal bars, one per y label, top to bottom in the order given.'''
+    trace = {'type': 'bar', 'orientation': 'h', 'x': x, 'y': y, 'marker': {'color': colors}}
+    if hovertemplate is not None:
+        trace['hovertemplate'] = hovertemplate
+    figure_layout = dark_layout(**layout)
+    figure_layout['yaxis']['autorange'] = 'reversed'
+    figure_layout['showlegend'] = False
+    return {'data': [trace], 'layout': figure_layout}
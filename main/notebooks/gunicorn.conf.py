@@ -0,0 +1,41 @@
+#gunicorn settings for serving the dashboard, picked up from the working directory:
+#
+#    cd main/notebooks && gunicorn app:server
+#
+#preload_app imports app.py once in the master; the workers are forked from it and
+#share its memory.  The dataset and everything derived from it are memory-mapped from
+#the serving snapshot (see snapshot.py), so those pages are shared page cache in any
+#case.  The rest - the layout, the indexes' small Python objects, imported modules -
+#stays shared as long as nothing writes to it, but the cyclic garbage collector writes
+#to every object it traverses.  Freezing the master's objects before each fork keeps
+#the collector out of them, so a worker only adds the memory of its own requests.
+#
+#The tabs' data is built lazily (see resources.py).  ATP_WARM_UP picks when:
+#    master      the master builds it before forking, so the workers share it (default)
+#    background  each worker builds it in a thread once it is serving: the workers
+#                answer sooner but each holds its own indexes (~50 MB more per worker
+#                on the 10x synthetic dataset)
+#    off         each worker builds a tab's data when the tab is first opened
+import gc
+import os
+
+
+bind = os.environ.get('ATP_BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('ATP_WORKERS', 4))
+threads = int(os.environ.get('ATP_THREADS', 1))
+preload_app = True
+
+WARM_UP = os.environ.get('ATP_WARM_UP', 'master')
+
+
+def pre_fork(server, worker):
+    if WARM_UP == 'master':
+        from resources import warm_up
+        warm_up(background=False)
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    if WARM_UP == 'background':
+        from resources import warm_up
+        warm_up()
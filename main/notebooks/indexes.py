@@ -0,0 +1,160 @@
+#Lookup structures built once at startup so callbacks don't scan the whole frame
+#
+#pandas is imported by the builders, not here: app.py imports this module for the lookups
+#and should not pay for pandas before the first tab's data is loaded.
+from collections import namedtuple
+
+import numpy as np
+
+
+#----- Per-player row index
+def sort_by_player(df):
+    '''Sort so every player's matches form one contiguous, date ordered block of rows.'''
+    #year (the season, from tourney_id) leads the date so a season range is one slice even
+    #when a tournament starts in the last days of the previous calendar year
+    return df.sort_values(
+        ['player_name', 'year', 'tourney_date', 'match_num'],
+        kind='stable'
+    ).reset_index(drop=True)
+
+
+def build_player_index(df):
+    '''Map player_name --> (start, stop) row offsets. df must come from sort_by_player.'''
+    import pandas as pd
+
+    codes, names = pd.factorize(df['player_name'], sort=True)
+    if len(codes) == 0:
+        return {}
+
+    starts = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    starts = np.concatenate(([0], starts))
+    stops = np.concatenate((starts[1:], [len(codes)]))
+
+    return {names[codes[start]]: (int(start), int(stop)) for start, stop in zip(starts, stops)}
+
+
+def player_rows(df, player_index, player):
+    '''All rows for one player as a contiguous slice (empty frame for unknown players).'''
+    start, stop = player_index.get(player, (0, 0))
+    return df.iloc[start:stop]
+
+
+#----- Head-to-head pair index
+def match_pairs(df):
+    '''Row positions (row_x, row_y) of the two players in every match, once in each direction.'''
+    import pandas as pd
+
+    match_key = df.groupby(['tourney_id', 'match_num'], sort=False, observed=True).ngroup().to_numpy()
+    rows = np.arange(len(df))
+
+    #Same self-join the head-to-head callbacks used to run per request, done once on integer keys
+    keyed = pd.DataFrame({'key': match_key, 'row': rows})
+    pairs = keyed.merge(keyed, on='key')
+    pairs = pairs[pairs['row_x'] != pairs['row_y']]
+    return pairs['row_x'].to_numpy(), pairs['row_y'].to_numpy()
+
+
+#Flat integer arrays (like the opponent map) rather than a dict of small arrays, so the
+#index is a handful of buffers that can live in the memory-mapped serving snapshot
+PairIndex = namedtuple('PairIndex', ['players', 'keys', 'starts', 'stops', 'rows_x', 'rows_y'])
+
+
+def build_pair_index(df, pairs=None):
+    '''Rows of every (player, opponent) pair's matches, sorted by tourney_date. keys are
+    player_code * n_players + opponent_code, each owning rows_x/rows_y[start:stop].'''
+    import pandas as pd
+
+    row_x, row_y = match_pairs(df) if pairs is None else pairs
+
+    player_codes, player_names = pd.factorize(df['player_name'], sort=True)
+    code_x = player_codes[row_x].astype(np.int64)
+    code_y = player_codes[row_y].astype(np.int64)
+
+    order = np.lexsort((
+        df['match_num'].to_numpy()[row_x],
+        df['tourney_date'].to_numpy()[row_x],
+        code_y,
+        code_x
+    ))
+    row_x, row_y = row_x[order], row_y[order]
+    pair_codes = code_x[order] * len(player_names) + code_y[order]
+
+    starts = np.flatnonzero(np.diff(pair_codes, prepend=-1) != 0)
+    stops = np.append(starts[1:], len(pair_codes))
+    return PairIndex(
+        players=pd.Index(player_names),
+        keys=pair_codes[starts],
+        starts=starts,
+        stops=stops,
+        rows_x=row_x.astype(np.int32),
+        rows_y=row_y.astype(np.int32)
+    )
+
+
+def pair_rows(pair_index, player, opponent):
+    '''(player rows, opponent rows) of the matches between the two, empty if they never met.'''
+    codes = pair_index.players.get_indexer([player, opponent])
+    if (codes >= 0).all():
+        key = codes[0] * len(pair_index.players) + codes[1]
+        i = np.searchsorted(pair_index.keys, key)
+        if i < len(pair_index.keys) and pair_index.keys[i] == key:
+            start, stop = pair_index.starts[i], pair_index.stops[i]
+            return pair_index.rows_x[start:stop], pair_index.rows_y[start:stop]
+    return pair_index.rows_x[:0], pair_index.rows_y[:0]
+
+
+def pair_matches(df, pair_index, player, opponent):
+    '''Joined match rows for player vs. opponent, laid out like the old merge on tourney_id/match_num.'''
+    rows_x, rows_y = pair_rows(pair_index, player, opponent)
+
+    player_df = df.iloc[rows_x].reset_index(drop=True)
+    opponent_df = df.iloc[rows_y].drop(columns=['tourney_id', 'match_num']).reset_index(drop=True)
+    return player_df.join(opponent_df, lsuffix='_x', rsuffix='_y')
+
+
+#----- Opponent map
+OpponentMap = namedtuple('OpponentMap', ['players', 'offsets', 'opponents', 'counts'])
+
+
+def build_opponent_map(df, pairs=None):
+    '''Distinct opponents per player with match counts, most frequent first, stored as flat integer code arrays.'''
+    import pandas as pd
+
+    row_x, row_y = match_pairs(df) if pairs is None else pairs
+
+    player_codes, player_names = pd.factorize(df['player_name'], sort=True)
+    n_players = len(player_names)
+
+    #One pass: encode every (player, opponent) as a single int and count the distinct ones
+    pair_codes = player_codes[row_x].astype(np.int64) * n_players + player_codes[row_y]
+    pair_codes, counts = np.unique(pair_codes, return_counts=True)
+    code_x, code_y = pair_codes // n_players, pair_codes % n_players
+
+    order = np.lexsort((code_y, -counts, code_x))
+    code_x, code_y, counts = code_x[order], code_y[order], counts[order]
+
+    offsets = np.searchsorted(code_x, np.arange(n_players + 1))
+    return OpponentMap(
+        players=pd.Index(player_names),
+        offsets=offsets,
+        opponents=code_y.astype(np.int32),
+        counts=counts.astype(np.int32)
+    )
+
+
+def player_opponents(opponent_map, player):
+    '''(opponent names, match counts) for one player, most frequent opponent first.'''
+    code = opponent_map.players.get_indexer([player])[0]
+    if code < 0:
+        return [], []
+    start, stop = opponent_map.offsets[code], opponent_map.offsets[code + 1]
+    names = opponent_map.players[opponent_map.opponents[start:stop]]
+    return names.tolist(), opponent_map.counts[start:stop].tolist()
+
+
+def year_rows(rows, first_year, last_year):
+    '''Rows of one player's date-ordered slice within an inclusive year range, without a scan.'''
+    years = rows['year'].to_numpy()
+    start = np.searchsorted(years, first_year, side='left')
+    stop = np.searchsorted(years, last_year, side='right')
+    return rows.iloc[start:stop]
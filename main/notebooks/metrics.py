@@ -0,0 +1,243 @@
+#Runtime metrics for the dashboard in the Prometheus text format, served at /metrics
+#
+#instrument_callbacks(app) wraps every server-side callback Dash has registered and
+#records, per callback:
+#    atp_callback_duration_seconds   wall time, json encoding of the response included
+#    atp_callback_response_bytes     size of the json response sent to the browser
+#    atp_callback_rows_scanned       rows the callback read (reported with count_rows)
+#    atp_callback_exceptions_total   errors by exception type (PreventUpdate is not one)
+#Process gauges (dataset rows, load times, resident memory), the build time of every
+#lazily built resource and the callback cache and scoring counters are added at scrape
+#time.  Metrics are per process: with several
+#gunicorn workers a scrape is answered by whichever worker takes the request.
+import functools
+import os
+import resource
+import threading
+import time
+
+from dash.exceptions import PreventUpdate
+
+import model_artifact
+from callback_cache import cache_stats
+from resources import resources
+from scoring import scorer
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+ROWS_BUCKETS = (0, 10, 100, 1000, 10000, 100000, 1000000)
+
+START_TIME = time.time()
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+
+class Counter:
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, buckets, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        names = self.labelnames + ('le',)
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{_labels(names, labels + (_number(bound),))} {bucket_count}')
+                lines.append(f'{self.name}_bucket{_labels(names, labels + ("+Inf",))} {count}')
+                lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}')
+                lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+callback_seconds = Histogram(
+    'atp_callback_duration_seconds', 'Wall time of a dashboard callback, json encoding included',
+    LATENCY_BUCKETS, ['callback']
+)
+callback_bytes = Histogram(
+    'atp_callback_response_bytes', 'Size of the json response of a dashboard callback',
+    BYTES_BUCKETS, ['callback']
+)
+callback_rows = Histogram(
+    'atp_callback_rows_scanned', 'Dataset rows read by one dashboard callback call',
+    ROWS_BUCKETS, ['callback']
+)
+callback_exceptions = Counter(
+    'atp_callback_exceptions_total', 'Dashboard callbacks that raised, by exception type',
+    ['callback', 'exception']
+)
+
+#name --> (help, value) set once by the app (dataset rows, load times)
+_gauges = {}
+_local = threading.local()
+
+
+def set_gauge(name, value, help_text):
+    _gauges[name] = (help_text, value)
+
+
+def count_rows(n):
+    '''Add n to the rows scanned by the callback running on this thread.'''
+    _local.rows = getattr(_local, 'rows', 0) + n
+
+
+def _instrument(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _local.rows = 0
+        start = time.perf_counter()
+        try:
+            response = func(*args, **kwargs)
+        except PreventUpdate:
+            raise
+        except Exception as e:
+            callback_exceptions.inc((name, type(e).__name__))
+            raise
+        finally:
+            callback_seconds.observe((name,), time.perf_counter() - start)
+            callback_rows.observe((name,), _local.rows)
+        callback_bytes.observe((name,), len(response.encode()) if isinstance(response, str) else 0)
+        return response
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def instrument_callbacks(app):
+    '''Wrap every registered server-side callback. Call after the last @app.callback.'''
+    for entry in app.callback_map.values():
+        func = entry.get('callback')
+        if func is None or getattr(func, 'instrumented', False):
+            continue
+        entry['callback'] = _instrument(func.__name__, func)
+
+
+def _resident_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        #No procfs: peak instead of current (kB on linux, bytes on macos)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _process_lines():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    values = [
+        ('process_resident_memory_bytes', 'gauge', 'Resident memory size in bytes', _resident_bytes()),
+        ('process_cpu_seconds_total', 'counter', 'User and system CPU time in seconds', usage.ru_utime + usage.ru_stime),
+        ('process_start_time_seconds', 'gauge', 'Start time of the process since the epoch in seconds', START_TIME),
+    ]
+    for name, help_text, value in sorted((n, h, v) for n, (h, v) in _gauges.items()):
+        values.append((name, 'gauge', help_text, value))
+
+    stats = cache_stats()
+    values += [
+        ('atp_callback_cache_entries', 'gauge', 'Callback results held in the cache', stats['entries']),
+        ('atp_callback_cache_bytes', 'gauge', 'Pickled size of the cached callback results', stats['bytes']),
+        ('atp_callback_cache_hits_total', 'counter', 'Callback cache hits', stats['hits']),
+        ('atp_callback_cache_misses_total', 'counter', 'Callback cache misses', stats['misses']),
+        ('atp_callback_cache_evictions_total', 'counter', 'Callback cache evictions', stats['evictions']),
+    ]
+
+    if model_artifact.load_seconds is not None:
+        values.append((
+            'atp_model_load_seconds', 'gauge',
+            'Time this process took to load the model artifact (for /api/score or the explainer)',
+            model_artifact.load_seconds
+        ))
+
+    #The batcher only exists once /api/score has loaded the model
+    batcher = scorer.batcher
+    values += [
+        ('atp_score_batches_total', 'counter', 'Micro-batches predicted by /api/score', batcher.batches if batcher else 0),
+        ('atp_score_rows_total', 'counter', 'Rows scored by /api/score', batcher.rows if batcher else 0),
+    ]
+
+    lines = []
+    for name, kind, help_text, value in values:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name} {_number(value)}']
+    return lines
+
+
+def _resource_lines():
+    lines = [
+        '# HELP atp_resource_ready Whether a lazily built dashboard resource has been built',
+        '# TYPE atp_resource_ready gauge',
+    ]
+    lines += [f'atp_resource_ready{_labels(["resource"], [name])} {int(r.ready)}' for name, r in resources.items()]
+    lines += [
+        '# HELP atp_resource_build_seconds Time to build a dashboard resource, excluding the resources it requires',
+        '# TYPE atp_resource_build_seconds gauge',
+    ]
+    lines += [
+        f'atp_resource_build_seconds{_labels(["resource"], [name])} {_number(r.build_seconds)}'
+        for name, r in resources.items() if r.ready
+    ]
+    return lines
+
+
+def render():
+    '''Every metric in the Prometheus text exposition format.'''
+    lines = _process_lines() + _resource_lines()
+    for metric in (callback_seconds, callback_bytes, callback_rows, callback_exceptions):
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
+
+
+def register_metrics_route(server, url='/metrics'):
+    '''Serve render() from the dashboard's Flask server.'''
+    from flask import Response
+
+    @server.route(url)
+    def metrics():
+        return Response(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    return metrics
@@ -0,0 +1,198 @@
+#Versioned XGBoost model artifact written by train_model.py and read by the dashboard
+#
+#main/models/<version>/
+#    booster.ubj      - xgboost booster over all surfaces
+#    booster-<surface>.ubj - boosters of the surfaces where a model of their own did better
+#                       in cross-validation (meta['surface_models']); rows of those surfaces
+#                       are scored by them, all other rows by booster.ubj
+#    meta.json        - features, one-hot surface columns, scaler mean/scale, dataset hash
+#    pred_wins.npy    - int8 prediction for every row of the cached dataset, in cache order
+#    contributions.npy - float32 SHAP values (CONTRIBUTION_COLUMNS) for every row, in cache
+#                       order; optional, for older artifacts the dashboard computes them per player
+#main/models/LATEST  - name of the version the dashboard loads by default
+import json
+import os
+import time
+
+import numpy as np
+
+
+MODEL_DIR = os.environ.get(
+    'ATP_MODEL_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'models')
+)
+
+#Bump when the artifact layout changes
+ARTIFACT_FORMAT = 2
+
+#Seconds the last load_model() took in this process, None until a model is loaded
+#(by /api/score or the Predict Winners explainer); /metrics exports it
+load_seconds = None
+
+NUMERIC_FEATURES = ['num_aces','num_dfs','serve1_in_perc','player_age','num_brkpts_saved','num_brkpts_faced']
+
+#Features as the Predict Winners tab explains them: the one-hot surface columns count as one
+EXPLAINED_FEATURES = NUMERIC_FEATURES + ['surface']
+CONTRIBUTION_COLUMNS = [f'contrib_{feature}' for feature in EXPLAINED_FEATURES] + ['contrib_bias']
+
+
+def feature_matrix(df, surface_columns):
+    '''Model inputs in training column order: numeric stats followed by one-hot surface columns.'''
+    numeric = df[NUMERIC_FEATURES].to_numpy(dtype=np.float64)
+    surface = df['surface'].to_numpy()
+    one_hot = np.column_stack([surface == s for s in surface_columns]).astype(np.float64)
+    return np.hstack([numeric, one_hot])
+
+
+def scale(X, meta):
+    return (X - np.asarray(meta['scaler_mean'])) / np.asarray(meta['scaler_scale'])
+
+
+def latest_version(model_dir=MODEL_DIR):
+    try:
+        with open(os.path.join(model_dir, 'LATEST')) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def artifact_dir(version=None, model_dir=MODEL_DIR):
+    version = version or os.environ.get('ATP_MODEL_VERSION') or latest_version(model_dir)
+    if version is None:
+        raise FileNotFoundError(
+            f'No model artifact found in {model_dir} - run `python train_model.py` first'
+        )
+    return os.path.join(model_dir, version)
+
+
+def load_meta(version=None, model_dir=MODEL_DIR):
+    with open(os.path.join(artifact_dir(version, model_dir), 'meta.json')) as f:
+        return json.load(f)
+
+
+def load_pred_wins(dataset_sha256, n_rows, version=None, model_dir=MODEL_DIR):
+    '''Precomputed predictions, checked against the dataset they were scored on.'''
+    path = artifact_dir(version, model_dir)
+    meta = load_meta(version, model_dir)
+    if meta['dataset_sha256'] != dataset_sha256:
+        raise RuntimeError(
+            f'Model artifact {meta["version"]} was built for a different dataset - '
+            'rerun `python train_model.py`'
+        )
+
+    pred_wins = np.load(os.path.join(path, 'pred_wins.npy'), mmap_mode='r')
+    if len(pred_wins) != n_rows:
+        raise RuntimeError(f'Model artifact {meta["version"]} has {len(pred_wins)} predictions for {n_rows} rows')
+    return pred_wins
+
+
+def load_contributions(n_rows, version=None, model_dir=MODEL_DIR):
+    '''Precomputed contributions (check the dataset with load_pred_wins first), None if the artifact has none.'''
+    path = os.path.join(artifact_dir(version, model_dir), 'contributions.npy')
+    if not os.path.exists(path):
+        return None
+
+    contributions = np.load(path, mmap_mode='r')
+    if contributions.shape != (n_rows, len(CONTRIBUTION_COLUMNS)):
+        raise RuntimeError(f'Model artifact at {path} has contributions of shape {contributions.shape} for {n_rows} rows')
+    return contributions
+
+
+def load_booster(version=None, model_dir=MODEL_DIR):
+    from xgboost import Booster
+
+    booster = Booster()
+    booster.load_model(os.path.join(artifact_dir(version, model_dir), 'booster.ubj'))
+    return booster
+
+
+def load_model(version=None, model_dir=MODEL_DIR):
+    '''(boosters, meta): boosters maps None to the all-surface booster and every surface with a
+    model of its own to that booster.'''
+    global load_seconds
+    start = time.perf_counter()
+
+    meta = load_meta(version, model_dir)
+    path = artifact_dir(version, model_dir)
+    boosters = {None: load_booster(version, model_dir)}
+    for surface, surface_meta in meta.get('surface_models', {}).items():
+        from xgboost import Booster
+
+        boosters[surface] = Booster()
+        boosters[surface].load_model(os.path.join(path, surface_meta['booster']))
+
+    load_seconds = time.perf_counter() - start
+    return boosters, meta
+
+
+def model_rows(meta, X):
+    '''{model: row positions} of scaled rows, model being a surface with its own booster or None.'''
+    surface_models = meta.get('surface_models', {})
+    if not surface_models:
+        return {None: np.arange(len(X))}
+
+    #Undo the scaling of the one-hot columns to read each row's surface (-1: none set)
+    n_numeric = len(NUMERIC_FEATURES)
+    one_hot = X[:, n_numeric:] * np.asarray(meta['scaler_scale'][n_numeric:]) + np.asarray(meta['scaler_mean'][n_numeric:])
+    codes = np.where(one_hot.max(axis=1) > 0.5, one_hot.argmax(axis=1), -1)
+
+    models = [None] + list(surface_models)
+    model_of_code = np.array([models.index(s) if s in surface_models else 0 for s in meta['surface_columns']] + [0])
+    ids = model_of_code[codes]
+    return {models[i]: np.flatnonzero(ids == i) for i in np.unique(ids)}
+
+
+def predict_scaled(boosters, meta, X, **options):
+    '''booster.predict of scaled model inputs, every row by its surface's booster.'''
+    from xgboost import DMatrix
+
+    result = None
+    for model, rows in model_rows(meta, X).items():
+        best_iteration = meta['best_iteration'] if model is None else meta['surface_models'][model]['best_iteration']
+        values = boosters[model].predict(DMatrix(X[rows]), iteration_range=(0, best_iteration + 1), **options)
+        if result is None:
+            result = np.empty((len(X),) + values.shape[1:], dtype=values.dtype)
+        result[rows] = values
+    return np.empty(0, dtype=np.float32) if result is None else result
+
+
+def predict(boosters, meta, df):
+    '''0/1 win predictions for a frame holding the raw feature columns.'''
+    X = scale(feature_matrix(df, meta['surface_columns']), meta)
+    return (predict_scaled(boosters, meta, X) > 0.5).astype(np.int8)
+
+
+def predict_contributions(boosters, meta, df):
+    '''Per-row SHAP values from xgboost's pred_contribs in one batch per model, one-hot surface
+    columns summed: float32 (rows, CONTRIBUTION_COLUMNS).  Each row adds up to the log-odds of a win.'''
+    X = scale(feature_matrix(df, meta['surface_columns']), meta)
+    raw = predict_scaled(boosters, meta, X, pred_contribs=True)
+
+    n_numeric = len(NUMERIC_FEATURES)
+    return np.column_stack([
+        raw[:, :n_numeric],
+        raw[:, n_numeric:-1].sum(axis=1),
+        raw[:, -1]
+    ]).astype(np.float32)
+
+
+def save_artifact(boosters, meta, pred_wins, model_dir=MODEL_DIR, contributions=None):
+    '''Write a new version directory and point LATEST at it. boosters as returned by load_model.'''
+    path = os.path.join(model_dir, meta['version'])
+    tmp_path = path + '.tmp'
+    os.makedirs(tmp_path, exist_ok=True)
+
+    boosters[None].save_model(os.path.join(tmp_path, 'booster.ubj'))
+    for surface, surface_meta in meta.get('surface_models', {}).items():
+        boosters[surface].save_model(os.path.join(tmp_path, surface_meta['booster']))
+    np.save(os.path.join(tmp_path, 'pred_wins.npy'), np.asarray(pred_wins, dtype=np.int8))
+    if contributions is not None:
+        np.save(os.path.join(tmp_path, 'contributions.npy'), np.asarray(contributions, dtype=np.float32))
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    os.replace(tmp_path, path)
+    with open(os.path.join(model_dir, 'LATEST.tmp'), 'w') as f:
+        f.write(meta['version'])
+    os.replace(os.path.join(model_dir, 'LATEST.tmp'), os.path.join(model_dir, 'LATEST'))
+    return path
@@ -0,0 +1,266 @@
+#Parallel hyperparameter search for the match outcome models
+#
+#train_model.py fits a model over all surfaces and one per surface (Hard, Clay, Grass,
+#Carpet), each with the hyperparameters from GRID that cross-validate best on the
+#training split.  Every (model, params, fold) fit is an independent job for a process
+#pool.  A worker runs xgboost and BLAS with threads_per_job threads only, so workers x
+#threads stays within the cores instead of every fit starting an OpenMP pool the size
+#of the machine: more cores means more jobs at once, not more threads fighting.
+#
+#The inputs are written once to <cache>/training-<key>/ - scaled feature matrix, labels,
+#surface codes and the train/test split with its folds - and memory-mapped by the
+#workers rather than pickled into every job.  Each finished job writes its result to
+#results/<job>.json there, so a rerun (or a run stopped half way) only fits the jobs
+#without a result.  The key covers the dataset hash, the features, the split and
+#SEARCH_FORMAT.
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from data_loader import CACHE_DIR
+from model_artifact import NUMERIC_FEATURES, feature_matrix
+
+
+#Bump when the inputs, a job or its result change
+SEARCH_FORMAT = 1
+
+GRID = {
+    'max_depth': [3, 6],
+    'learning_rate': [0.1, 0.3],
+    'min_child_weight': [1, 10],
+}
+N_ESTIMATORS = 300
+EARLY_STOPPING_ROUNDS = 15
+TEST_SIZE = 0.30
+SEED = 42
+
+#Model fit on every surface; the others are named after their surface
+ALL_SURFACES = 'all'
+
+
+#----- Inputs, written once per dataset
+def prepare(df, dataset_sha256, folds=3, cache_dir=CACHE_DIR):
+    '''Write the training inputs of df (unless already there) and return their directory.'''
+    import pandas as pd
+    from sklearn.model_selection import KFold, train_test_split
+    from sklearn.preprocessing import StandardScaler
+
+    surface_columns = sorted(df['surface'].unique())
+    inputs = [SEARCH_FORMAT, dataset_sha256, len(df), NUMERIC_FEATURES, surface_columns, folds, TEST_SIZE, SEED]
+    key = hashlib.sha256(json.dumps(inputs).encode()).hexdigest()[:16]
+    directory = os.path.join(cache_dir, 'training-' + key)
+    if os.path.exists(os.path.join(directory, 'inputs.json')):
+        return directory
+
+    X = feature_matrix(df, surface_columns)
+    scaler = StandardScaler()
+    scaledX = scaler.fit_transform(X)
+    surfaces = pd.Categorical(df['surface'], categories=surface_columns).codes.astype(np.int8)
+
+    #Same split train_model.py always used; folds divide its training rows, the test rows get -1
+    rows = np.arange(len(df))
+    train_rows, _ = train_test_split(rows, test_size=TEST_SIZE, random_state=SEED)
+    fold = np.full(len(df), -1, dtype=np.int8)
+    for i, (_, fold_rows) in enumerate(KFold(folds, shuffle=True, random_state=SEED).split(train_rows)):
+        fold[train_rows[fold_rows]] = i
+
+    #Everything goes to a private directory that is renamed into place when complete
+    tmp_directory = f'{directory}.tmp-{uuid.uuid4().hex}'
+    os.makedirs(os.path.join(tmp_directory, 'results'))
+    np.save(os.path.join(tmp_directory, 'X.npy'), scaledX.astype(np.float32))
+    np.save(os.path.join(tmp_directory, 'y.npy'), df['outcome'].to_numpy().astype(np.int8))
+    np.save(os.path.join(tmp_directory, 'surface.npy'), surfaces)
+    np.save(os.path.join(tmp_directory, 'fold.npy'), fold)
+    with open(os.path.join(tmp_directory, 'inputs.json'), 'w') as f:
+        json.dump({
+            'surface_columns': surface_columns,
+            'scaler_mean': scaler.mean_.tolist(),
+            'scaler_scale': scaler.scale_.tolist(),
+            'folds': folds,
+            'rows': len(df),
+        }, f, indent=2)
+    try:
+        os.replace(tmp_directory, directory)
+    except OSError:
+        #Another run got there first with the same inputs
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+    return directory
+
+
+def load_inputs(directory):
+    with open(os.path.join(directory, 'inputs.json')) as f:
+        return json.load(f)
+
+
+#----- Jobs, run in the worker processes
+_worker = {}
+
+
+def _init_worker(directory, threads):
+    from threadpoolctl import threadpool_limits
+
+    threadpool_limits(threads)
+    _worker.update(
+        directory=directory,
+        threads=threads,
+        inputs=load_inputs(directory),
+        **{name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r') for name in ['X', 'y', 'surface', 'fold']}
+    )
+
+
+def _model_mask(model):
+    '''Rows a model is fit and validated on: all of them, or one surface's.'''
+    if model == ALL_SURFACES:
+        return np.ones(len(_worker['y']), dtype=bool)
+    return _worker['surface'] == _worker['inputs']['surface_columns'].index(model)
+
+
+def _fit(params, train, valid):
+    from xgboost import XGBClassifier
+
+    X, y = _worker['X'], _worker['y']
+    classifier = XGBClassifier(
+        n_estimators=N_ESTIMATORS,
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+        n_jobs=_worker['threads'],
+        random_state=SEED,
+        **params
+    )
+    classifier.fit(X[train], y[train], verbose=False, eval_set=[(X[valid], y[valid])])
+    return classifier
+
+
+def _correct_by_surface(classifier, rows):
+    '''{surface: [correct, rows]} of the classifier's predictions for rows.'''
+    correct = classifier.predict(_worker['X'][rows]) == _worker['y'][rows]
+    codes = _worker['surface'][rows]
+    return {
+        surface: [int(correct[codes == code].sum()), int((codes == code).sum())]
+        for code, surface in enumerate(_worker['inputs']['surface_columns'])
+        if (codes == code).any()
+    }
+
+
+def run_cv_job(job):
+    '''Fit job['model'] with job['params'] on all training folds but job['fold'], validate on
+    that fold and save the result.'''
+    start = time.perf_counter()
+    mask = _model_mask(job['model'])
+    fold = _worker['fold']
+    train = np.flatnonzero(mask & (fold >= 0) & (fold != job['fold']))
+    valid = np.flatnonzero(mask & (fold == job['fold']))
+
+    classifier = _fit(job['params'], train, valid)
+    result = dict(
+        job,
+        best_iteration=int(classifier.best_iteration),
+        correct=_correct_by_surface(classifier, valid),
+        seconds=time.perf_counter() - start,
+    )
+
+    path = os.path.join(_worker['directory'], 'results', job_name(job) + '.json')
+    tmp_path = f'{path}.tmp-{uuid.uuid4().hex}'
+    with open(tmp_path, 'w') as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+    return result
+
+
+def run_final_job(job):
+    '''Fit job['model'] with job['params'] on the training split, stopping early on the test
+    split as train_model.py always did. Returns the booster as ubj bytes.'''
+    mask = _model_mask(job['model'])
+    fold = _worker['fold']
+    train = np.flatnonzero(mask & (fold >= 0))
+    test = np.flatnonzero(mask & (fold < 0))
+
+    classifier = _fit(job['params'], train, test)
+    return dict(
+        job,
+        best_iteration=int(classifier.best_iteration),
+        correct=_correct_by_surface(classifier, test),
+        train_rows=int(len(train)),
+        booster=bytes(classifier.get_booster().save_raw('ubj')),
+    )
+
+
+#----- Running the search
+def job_name(job):
+    params = '-'.join(f'{name}={value}' for name, value in sorted(job['params'].items()))
+    return f"{job['model']}-{params}-fold{job['fold']}"
+
+
+def grid_params(grid=GRID):
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def default_workers(threads=1):
+    return max(1, (os.cpu_count() or 1) // threads)
+
+
+def run_jobs(fn, jobs, directory, workers=None, threads=1, log=print):
+    '''Results of fn(job) for every job, computed in a pool of workers with threads each.'''
+    workers = min(workers or default_workers(threads), max(1, len(jobs)))
+    results = []
+    #spawn, not fork: xgboost's OpenMP runtime is not safe to use in a forked child
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=(directory, threads)) as pool:
+        futures = [pool.submit(fn, job) for job in jobs]
+        for i, future in enumerate(as_completed(futures), 1):
+            results.append(future.result())
+            if log is not None and (i == len(jobs) or i % max(1, len(jobs) // 10) == 0):
+                log(f'  {i}/{len(jobs)} jobs done')
+    return results
+
+
+def cross_validate(directory, models, grid=GRID, workers=None, threads=1, log=print):
+    '''CV results of every (model, params, fold), reading finished jobs from the cache.'''
+    inputs = load_inputs(directory)
+    jobs = [
+        {'model': model, 'params': params, 'fold': fold}
+        for model in models for params in grid_params(grid) for fold in range(inputs['folds'])
+    ]
+
+    cached, todo = [], []
+    for job in jobs:
+        path = os.path.join(directory, 'results', job_name(job) + '.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                cached.append(json.load(f))
+        else:
+            todo.append(job)
+    if log is not None:
+        log(f'{len(jobs)} cross-validation jobs, {len(cached)} cached, {len(todo)} to run')
+    return cached + run_jobs(run_cv_job, todo, directory, workers, threads, log)
+
+
+def cv_accuracy(results, model, params, surface=None):
+    '''Accuracy of (model, params) over its validation folds, on one surface's rows or all of them.'''
+    correct = rows = 0
+    for result in results:
+        if result['model'] == model and result['params'] == params:
+            for name, (c, n) in result['correct'].items():
+                if surface is None or name == surface:
+                    correct, rows = correct + c, rows + n
+    return correct / rows if rows else None
+
+
+def best_params(results, model, surface=None):
+    '''(params, accuracy) of the model's best cross-validated parameters.'''
+    scores = [(cv_accuracy(results, model, params, surface), params) for params in _tried(results, model)]
+    accuracy, params = max((s for s in scores if s[0] is not None), key=lambda s: s[0])
+    return params, accuracy
+
+
+def _tried(results, model):
+    tried = {json.dumps(result['params'], sort_keys=True) for result in results if result['model'] == model}
+    return [json.loads(params) for params in sorted(tried)]
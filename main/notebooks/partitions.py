@@ -0,0 +1,185 @@
+#Year-partitioned copy of the processed match data
+#
+#main/data/matches/
+#    year=1991/part-<stamp>-<id>.parquet
+#    year=1992/...
+#
+#Each season lives in its own hive-style directory, so a new season is added by writing
+#files under its year=... directory only - history is never rewritten.  Files are sorted
+#by player so the parquet row-group statistics let a player filter skip most of a
+#partition, and read_matches pushes the year range and player list down to the scan.
+#
+#Usage:
+#    python partitions.py convert model_df_v2.parquet.gzip   # one-off split of the monolithic file
+#    python partitions.py append matches_2023.parquet         # ingest a new season (csv works too)
+#    python partitions.py info
+#Point the dashboard at the directory with ATP_DATA_URL=main/data/matches.
+import argparse
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+PARTITION_DIR = os.environ.get(
+    'ATP_PARTITION_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'data', 'matches')
+)
+
+#A player appears once per match
+MATCH_KEY = ['tourney_id', 'match_num', 'player_name']
+SORT_KEY = ['player_name', 'tourney_date', 'match_num']
+
+PARTITIONING = ds.partitioning(pa.schema([('year', pa.int16())]), flavor='hive')
+ROWS_PER_GROUP = 16384
+
+
+def open_dataset(root=PARTITION_DIR):
+    return ds.dataset(root, format='parquet', partitioning=PARTITIONING)
+
+
+def _filter(years=None, players=None):
+    '''Scan predicate for an inclusive (first, last) year range and/or a list of players.'''
+    expression = None
+    if years is not None:
+        expression = (ds.field('year') >= years[0]) & (ds.field('year') <= years[1])
+    if players is not None:
+        by_player = ds.field('player_name').isin(list(players))
+        expression = by_player if expression is None else expression & by_player
+    return expression
+
+
+def read_table(root=PARTITION_DIR, years=None, players=None, columns=None):
+    '''Arrow table of the matching rows; only partitions / row groups that can match are read.'''
+    return open_dataset(root).to_table(columns=columns, filter=_filter(years, players))
+
+
+def read_matches(root=PARTITION_DIR, years=None, players=None, columns=None):
+    '''read_table as a DataFrame.'''
+    return read_table(root, years, players, columns).to_pandas()
+
+
+def partition_years(root=PARTITION_DIR):
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        int(name.split('=', 1)[1]) for name in os.listdir(root)
+        if name.startswith('year=') and os.path.isdir(os.path.join(root, name))
+    )
+
+
+def _read_source(path):
+    df = pd.read_csv(path) if path.endswith('.csv') else pd.read_parquet(path)
+    return df.astype({'year': 'int16'})
+
+
+def write_partitions(df, root=PARTITION_DIR, schema=None):
+    '''Add df's rows as one new file per season under root/year=YYYY/, touching only those years.
+    schema (the stored dataset's) makes appended files agree with the existing ones.'''
+    df = df.sort_values(SORT_KEY, kind='stable')
+    for column in df.select_dtypes('category').columns:
+        df[column] = df[column].astype(str)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if schema is not None:
+        table = table.select(schema.names).cast(schema)
+    else:
+        #An all-missing object column (e.g. player_entry in a quiet season) would be typed
+        #null and later seasons could not be cast to it
+        schema = pa.schema([
+            field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+            for field in table.schema
+        ])
+        table = table.cast(schema)
+
+    #The season is in the directory name, not in the file
+    years = table['year'].to_numpy()
+    table = table.drop_columns(['year'])
+    basename = time.strftime('part-%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:8] + '.parquet'
+    for year in np.unique(years):
+        directory = os.path.join(root, f'year={year}')
+        os.makedirs(directory, exist_ok=True)
+
+        #----- Write to a hidden temp file (scans skip dot files) and rename so a reader
+        #never sees half a season
+        tmp_path = os.path.join(directory, '.' + basename + '.tmp')
+        pq.write_table(table.filter(years == year), tmp_path, row_group_size=ROWS_PER_GROUP)
+        os.replace(tmp_path, os.path.join(directory, basename))
+    return table.num_rows
+
+
+def convert(source, root=PARTITION_DIR):
+    '''Split the monolithic parquet file into year partitions (root must not exist yet).'''
+    if partition_years(root):
+        raise SystemExit(f'{root} already holds partitions - use append for new seasons')
+    return write_partitions(_read_source(source), root)
+
+
+def append_season(source, root=PARTITION_DIR, replace=False):
+    '''Ingest the rows in source. Rows already stored (same MATCH_KEY) are skipped unless replace
+    is set, in which case the seasons in source are rewritten. Returns (rows written, years).'''
+    df = _read_source(source)
+    years = sorted(df['year'].unique().tolist())
+
+    existing_years = partition_years(root)
+    schema = None
+    if existing_years:
+        schema = open_dataset(root).schema
+        expected = set(schema.names)
+        if set(df.columns) != expected:
+            missing = sorted(expected - set(df.columns))
+            extra = sorted(set(df.columns) - expected)
+            raise SystemExit(f'{source} does not match the stored columns (missing {missing}, extra {extra})')
+
+    touched = [year for year in years if year in existing_years]
+    if touched and replace:
+        for year in touched:
+            shutil.rmtree(os.path.join(root, f'year={year}'))
+    elif touched:
+        #Only the seasons being appended to are scanned for duplicates
+        stored = read_matches(root, years=(min(touched), max(touched)), columns=MATCH_KEY)
+        stored = stored.astype({column: df[column].dtype for column in MATCH_KEY})
+        seen = pd.MultiIndex.from_frame(stored)
+        df = df[~pd.MultiIndex.from_frame(df[MATCH_KEY]).isin(seen)]
+
+    if len(df) == 0:
+        return 0, years
+    return write_partitions(df, root, schema), years
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the year-partitioned match data')
+    parser.add_argument('--root', default=PARTITION_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert_parser = commands.add_parser('convert', help='split a monolithic parquet file into year partitions')
+    convert_parser.add_argument('source')
+
+    append_parser = commands.add_parser('append', help="add a new season's matches (parquet or csv)")
+    append_parser.add_argument('source')
+    append_parser.add_argument('--replace', action='store_true', help='rewrite the seasons in source instead of skipping stored matches')
+
+    commands.add_parser('info', help='rows per season')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        rows = convert(args.source, args.root)
+        print(f'Wrote {rows} rows to {args.root} ({len(partition_years(args.root))} seasons)')
+    elif args.command == 'append':
+        rows, years = append_season(args.source, args.root, args.replace)
+        print(f'Appended {rows} rows for {", ".join(map(str, years))}')
+    else:
+        counts = read_matches(args.root, columns=['year'])['year'].value_counts().sort_index()
+        for year, rows in counts.items():
+            print(f'{year}  {rows:>7}')
+        print(f'total {counts.sum():>7}')
+
+
+if __name__=='__main__':
+    main()
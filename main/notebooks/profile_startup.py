@@ -0,0 +1,86 @@
+#Startup profile of the dashboard:  python app.py --profile-startup  (or run this file)
+#
+#Runs one fresh interpreter with -X importtime that imports app.py, builds every
+#resource the tabs need (data load from the cache and snapshot, then the derived
+#tables and indexes) and loads the model the way /api/score does on its first request.
+#Prints where the import time goes, per top-level package, and how long each step took.
+#Imports pulled in by a step (pandas by the data, xgboost by the model) are listed
+#under that step.
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+
+NOTEBOOKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+#Printed to stderr between the steps, so the importtime lines can be split per step
+MARKER = '#atp-startup-step '
+
+PROFILE_SNIPPET = f'''
+import json, os, sys, time, warnings
+warnings.filterwarnings('ignore')
+sys.path.insert(0, os.getcwd())
+steps = {{}}
+
+def step(name, fn):
+    start = time.perf_counter()
+    fn()
+    steps[name] = time.perf_counter() - start
+    print({MARKER!r} + name, file=sys.stderr, flush=True)
+
+step('import app', lambda: __import__('app'))
+from resources import resources
+for name, r in resources.items():
+    step('resource ' + name, r.get)
+from scoring import scorer
+step('model load', scorer._load)
+print(json.dumps({{'steps': steps}}))
+'''
+
+
+def parse_importtime(lines):
+    '''[(step, {package: self seconds})] from -X importtime output split at the step markers.'''
+    steps, packages = [], defaultdict(float)
+    for line in lines:
+        if line.startswith(MARKER):
+            steps.append((line[len(MARKER):].strip(), dict(packages)))
+            packages.clear()
+        elif line.startswith('import time:') and '|' in line:
+            self_us, _, name = line[len('import time:'):].split('|')
+            if self_us.strip().isdigit():
+                packages[name.strip().split('.')[0]] += int(self_us) / 1e6
+    return steps
+
+
+def profile(top=8):
+    out = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROFILE_SNIPPET],
+        cwd=NOTEBOOKS_DIR, capture_output=True, text=True
+    )
+    if out.returncode != 0:
+        sys.exit(out.stderr)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    imports = dict(parse_importtime(out.stderr.splitlines()))
+
+    print(f"{'step':<34} {'seconds':>8}   imported on the way (self time, s)")
+    #Resources are built in registration order, so each step only builds its own
+    for name, seconds in result['steps'].items():
+        packages = sorted(imports.get(name, {}).items(), key=lambda item: -item[1])
+        spent = ', '.join(f'{package} {s:.2f}' for package, s in packages[:top] if s >= 0.005)
+        print(f'{name:<34} {seconds:>8.3f}   {spent}')
+    print(f"{'total':<34} {sum(result['steps'].values()):>8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--top', type=int, default=8, help='packages listed per step')
+    parser.add_argument('--profile-startup', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    profile(args.top)
+
+
+if __name__=='__main__':
+    main()
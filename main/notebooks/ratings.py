@@ -0,0 +1,261 @@
+#Elo ratings over the match stream
+#
+#Every match of the dataset (two rows, one per player) becomes one (date, winner,
+#loser, surface) event; events are rated in chronological order - tourney_date, then
+#match_num - in a single pass.  Each player has an overall rating and one per surface,
+#kept in flat NumPy arrays indexed by player code (players get codes in order of their
+#first match).  The K factor shrinks with the number of matches a player has rated,
+#K = 250 / (matches + 5) ** 0.4, so newcomers move fast and veterans slowly; a surface
+#rating counts only the matches on that surface.
+#
+#After every match both players' new ratings are appended to the history, which answers
+#"rating at date" and draws the ratings timeline.  Ratings can be saved and loaded, and
+#update() carries on from the saved state: rate_matches() only rates the matches appended
+#since the state was saved (e.g. a new season partition), it never replays history.
+import hashlib
+import json
+import os
+import uuid
+
+import numpy as np
+
+
+INITIAL_RATING = 1500.0
+
+K_SCALE, K_OFFSET, K_SHAPE = 250.0, 5.0, 0.4
+
+HISTORY_FIELDS = {
+    'date': np.int32,
+    'player': np.int32,
+    'surface': np.int16,
+    'rating': np.float32,
+    'surface_rating': np.float32,
+}
+
+
+def k_factor(matches):
+    return K_SCALE / (matches + K_OFFSET) ** K_SHAPE
+
+
+def match_stream(df):
+    '''(dates, winners, losers, surfaces) of every match in df in rating order, names as str arrays.'''
+    from indexes import match_pairs
+
+    row_x, row_y = match_pairs(df)
+    won = df['outcome'].to_numpy()[row_x] == 1
+    winner_rows, loser_rows = row_x[won], row_y[won]
+
+    dates = df['tourney_date'].to_numpy()[winner_rows]
+    order = np.lexsort((df['match_num'].to_numpy()[winner_rows], dates))
+    winner_rows, loser_rows = winner_rows[order], loser_rows[order]
+
+    names = df['player_name'].astype(str).to_numpy()
+    return (
+        dates[order].astype(np.int32),
+        names[winner_rows],
+        names[loser_rows],
+        df['surface'].astype(str).to_numpy()[winner_rows]
+    )
+
+
+def stream_fingerprint(stream, n_matches):
+    '''sha256 of the first n_matches events, to check a saved state rated the same matches.'''
+    digest = hashlib.sha256()
+    dates, winners, losers, surfaces = (values[:n_matches] for values in stream)
+    digest.update(np.ascontiguousarray(dates).tobytes())
+    for values in (winners, losers, surfaces):
+        digest.update('\x00'.join(values).encode())
+    return digest.hexdigest()
+
+
+def rating_at(dates, ratings, date, default=INITIAL_RATING):
+    '''Rating after the last match on or before date, from one player's date ordered history.'''
+    position = np.searchsorted(dates, date, side='right')
+    return float(ratings[position - 1]) if position else default
+
+
+class EloRatings:
+    '''Overall and per-surface Elo ratings, updated match by match.'''
+
+    def __init__(self):
+        self.players = []
+        self.codes = {}
+        self.surfaces = []
+        self.rating = np.zeros(0)
+        self.played = np.zeros(0, dtype=np.int32)
+        self.surface_rating = np.zeros((0, 0))
+        self.surface_played = np.zeros((0, 0), dtype=np.int32)
+        self.history = {field: np.zeros(0, dtype=dtype) for field, dtype in HISTORY_FIELDS.items()}
+        self.n_matches = 0
+        self.last_date = 0
+        self.fingerprint = stream_fingerprint((np.zeros(0, np.int32), [], [], []), 0)
+        self._player_index = None
+
+    def _code(self, names, codes):
+        '''Codes of names, adding the players (or surfaces) not seen yet to the codes dict.'''
+        for name in dict.fromkeys(names):
+            if name not in codes:
+                codes[name] = len(codes)
+        return np.array([codes[name] for name in names], dtype=np.int32)
+
+    def _grow(self):
+        '''Start every new player / surface at INITIAL_RATING with no matches.'''
+        surface_codes = {name: i for i, name in enumerate(self.surfaces)}
+        new_players = len(self.codes) - len(self.rating)
+        new_surfaces = len(surface_codes) - self.surface_rating.shape[0]
+        if new_players:
+            self.players = list(self.codes)
+            self.rating = np.concatenate([self.rating, np.full(new_players, INITIAL_RATING)])
+            self.played = np.concatenate([self.played, np.zeros(new_players, dtype=np.int32)])
+            self.surface_rating = np.pad(self.surface_rating, ((0, 0), (0, new_players)), constant_values=INITIAL_RATING)
+            self.surface_played = np.pad(self.surface_played, ((0, 0), (0, new_players)))
+        if new_surfaces:
+            self.surface_rating = np.pad(self.surface_rating, ((0, new_surfaces), (0, 0)), constant_values=INITIAL_RATING)
+            self.surface_played = np.pad(self.surface_played, ((0, new_surfaces), (0, 0)))
+
+    def update(self, dates, winners, losers, surfaces):
+        '''Rate matches given in chronological order, none of them before the last one rated.'''
+        dates = np.asarray(dates, dtype=np.int32)
+        if len(dates) == 0:
+            return self
+        if dates[0] < self.last_date or np.any(np.diff(dates) < 0):
+            raise ValueError(
+                f'Matches must be in date order and not before the last rated match ({self.last_date}); '
+                'rate the whole stream again instead'
+            )
+
+        winner_codes = self._code(winners, self.codes)
+        loser_codes = self._code(losers, self.codes)
+        surface_codes = {name: i for i, name in enumerate(self.surfaces)}
+        match_surfaces = self._code(surfaces, surface_codes)
+        self.surfaces = list(surface_codes)
+        self._grow()
+
+        #The pass itself is inherently sequential; plain lists are much faster than NumPy
+        #scalar indexing in a Python loop, the arrays take the results back at the end
+        rating, played = self.rating.tolist(), self.played.tolist()
+        surface_rating, surface_played = self.surface_rating.tolist(), self.surface_played.tolist()
+        history_rating, history_surface_rating = [], []
+
+        for w, l, s in zip(winner_codes.tolist(), loser_codes.tolist(), match_surfaces.tolist()):
+            expected = 1 / (1 + 10 ** ((rating[l] - rating[w]) / 400))
+            rating[w] += k_factor(played[w]) * (1 - expected)
+            rating[l] -= k_factor(played[l]) * (1 - expected)
+            played[w] += 1
+            played[l] += 1
+
+            on_surface, surface_matches = surface_rating[s], surface_played[s]
+            expected = 1 / (1 + 10 ** ((on_surface[l] - on_surface[w]) / 400))
+            on_surface[w] += k_factor(surface_matches[w]) * (1 - expected)
+            on_surface[l] -= k_factor(surface_matches[l]) * (1 - expected)
+            surface_matches[w] += 1
+            surface_matches[l] += 1
+
+            history_rating += (rating[w], rating[l])
+            history_surface_rating += (on_surface[w], on_surface[l])
+
+        self.rating, self.played = np.array(rating), np.array(played, dtype=np.int32)
+        self.surface_rating = np.array(surface_rating)
+        self.surface_played = np.array(surface_played, dtype=np.int32)
+
+        #Two history entries per match, winner then loser
+        added = {
+            'date': np.repeat(dates, 2),
+            'player': np.column_stack([winner_codes, loser_codes]).ravel(),
+            'surface': np.repeat(match_surfaces, 2),
+            'rating': history_rating,
+            'surface_rating': history_surface_rating,
+        }
+        self.history = {
+            field: np.concatenate([self.history[field], np.asarray(added[field], dtype=dtype)])
+            for field, dtype in HISTORY_FIELDS.items()
+        }
+        self.n_matches += len(dates)
+        self.last_date = int(dates[-1])
+        self._player_index = None
+        return self
+
+    #----- Lookups
+    def _player_history(self, player):
+        '''Positions of one player's history entries, in date order.'''
+        if self._player_index is None:
+            order = np.argsort(self.history['player'], kind='stable')
+            bounds = np.searchsorted(self.history['player'][order], np.arange(len(self.players) + 1))
+            self._player_index = order, bounds
+        order, bounds = self._player_index
+        code = self.codes.get(player)
+        if code is None:
+            return order[:0]
+        return order[bounds[code]:bounds[code + 1]]
+
+    def timeline(self, player, surface=None):
+        '''(dates, ratings) after each of the player's matches; with surface, that surface's rating
+        after each match on it.'''
+        positions = self._player_history(player)
+        field = 'rating'
+        if surface is not None:
+            code = self.surfaces.index(surface) if surface in self.surfaces else -1
+            positions = positions[self.history['surface'][positions] == code]
+            field = 'surface_rating'
+        return self.history['date'][positions], self.history[field][positions]
+
+    def rating_at(self, player, date, surface=None):
+        '''Rating of player after all the player's matches up to and including date (YYYYMMDD).'''
+        return rating_at(*self.timeline(player, surface), date)
+
+    def current(self, surface=None):
+        '''player --> latest rating, overall or on one surface.'''
+        ratings = self.rating if surface is None else self.surface_rating[self.surfaces.index(surface)]
+        return dict(zip(self.players, ratings.tolist()))
+
+    #----- Saved state
+    def save(self, path):
+        '''Write the state to path (.npz) atomically.'''
+        meta = {
+            'players': self.players, 'surfaces': self.surfaces, 'n_matches': self.n_matches,
+            'last_date': self.last_date, 'fingerprint': self.fingerprint,
+        }
+        tmp_path = f'{path}.tmp-{uuid.uuid4().hex}.npz'
+        np.savez(
+            tmp_path,
+            meta=np.array(json.dumps(meta)),
+            rating=self.rating, played=self.played,
+            surface_rating=self.surface_rating, surface_played=self.surface_played,
+            **{'history_' + field: values for field, values in self.history.items()}
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        ratings = cls()
+        with np.load(path) as state:
+            meta = json.loads(str(state['meta']))
+            ratings.players = meta['players']
+            ratings.codes = {name: i for i, name in enumerate(ratings.players)}
+            ratings.surfaces = meta['surfaces']
+            ratings.n_matches, ratings.last_date, ratings.fingerprint = meta['n_matches'], meta['last_date'], meta['fingerprint']
+            ratings.rating, ratings.played = state['rating'], state['played']
+            ratings.surface_rating, ratings.surface_played = state['surface_rating'], state['surface_played']
+            ratings.history = {field: state['history_' + field] for field in HISTORY_FIELDS}
+        return ratings
+
+
+def rate_matches(df, state_path=None):
+    '''EloRatings of every match in df.  With state_path, a saved state that rated the first
+    matches of the same stream is updated with the rest only, and the result saved back.'''
+    stream = match_stream(df)
+
+    ratings = None
+    if state_path is not None and os.path.exists(state_path):
+        try:
+            ratings = EloRatings.load(state_path)
+        except (OSError, ValueError, KeyError):
+            ratings = None
+    if ratings is None or ratings.n_matches > len(stream[0]) or stream_fingerprint(stream, ratings.n_matches) != ratings.fingerprint:
+        ratings = EloRatings()
+
+    ratings.update(*(values[ratings.n_matches:] for values in stream))
+    ratings.fingerprint = stream_fingerprint(stream, ratings.n_matches)
+    if state_path is not None:
+        ratings.save(state_path)
+    return ratings
@@ -0,0 +1,81 @@
+#Dashboard resources, built lazily once per process on first use
+#
+#Each tab of the dashboard needs its own derived data (tables mapped from the serving
+#snapshot, indexes, dropdown choices).  Rather than building all of it when app.py is
+#imported, app.py registers one builder per resource with @resource; the first callback
+#that calls .get() builds it while other threads asking for it wait on a lock, and every
+#later call returns the same object.  warm_up() builds everything in a daemon thread once
+#the server is up, so the first visitor to a tab usually finds its data ready, while the
+#Welcome tab never waits for any of it.
+#
+#build_seconds of each resource excludes the resources it requires; timings() has all
+#of them and /metrics exports them as atp_resource_build_seconds.
+import logging
+import threading
+import time
+
+
+log = logging.getLogger(__name__)
+
+#name --> Resource, in registration order
+resources = {}
+
+
+class Resource:
+    '''A value built by build(*values of the required resources) on the first get().'''
+
+    def __init__(self, name, build, requires=()):
+        self.name = name
+        self.build = build
+        self.requires = tuple(requires)
+        self.value = None
+        self.ready = False
+        self.build_seconds = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if not self.ready:
+            with self._lock:
+                if not self.ready:
+                    inputs = [resources[name].get() for name in self.requires]
+                    start = time.perf_counter()
+                    self.value = self.build(*inputs)
+                    self.build_seconds = time.perf_counter() - start
+                    self.ready = True
+                    log.info('Built %s in %.3fs', self.name, self.build_seconds)
+        return self.value
+
+
+def resource(name, requires=()):
+    '''Register the decorated function as the builder of resource name; returns the Resource.'''
+    def register(build):
+        resources[name] = Resource(name, build, requires)
+        return resources[name]
+    return register
+
+
+def warm_up(names=None, background=True):
+    '''Build every registered resource (or just names) in registration order. In the background
+    a failure is logged and left for the first real use to raise again; in the foreground it raises.'''
+    names = list(names or resources)
+
+    def run():
+        for name in names:
+            try:
+                resources[name].get()
+            except Exception:
+                if not background:
+                    raise
+                log.exception('Warm-up of %s failed', name)
+
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, name='resource-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def timings():
+    '''name --> build seconds of every resource built so far.'''
+    return {name: r.build_seconds for name, r in resources.items() if r.ready}
@@ -0,0 +1,119 @@
+#Games won / lost per set parsed from the raw `score` strings
+#
+#Replaces the notebook's per-set replace lists + invert_score apply with one vectorized
+#pass in pyarrow: split each score on single spaces (at most five sets), pull the two
+#game counts out of every token with a regex and scatter them into (rows, 5) int8
+#arrays.  The rules are the ones the replace lists encoded:
+#    7-6(5), 6-7(10)   tiebreak points are dropped                -> 7-6, 6-7
+#    [10-8], [6-7]     match tiebreaks count like a set            -> 10-8, 6-7
+#    6-4?              trailing junk is ignored                    -> 6-4
+#    1-08              data entry error for a 1-0 match tiebreak  -> 1-0
+#    RET, W/O, DEF, Def., UNK, ?-?, Apr-00, ...                    -> 0-0
+#Scores are written from the winner's side; loser rows get the two sides swapped.
+#
+#The set{n}_score strings are the notebook's too: 'won-lost' for a set that parsed, '0'
+#for a token that did not and 'nan' for a set the match never reached (or a walkover),
+#which is what its astype(str) made of the missing values.
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+SET_COUNT = 5
+
+#Optional '[' for match tiebreaks, then "won-lost" at the start of the token
+SET_PATTERN = r'^\[?(?P<won>\d+)-(?P<lost>\d+)'
+
+#Whole scores the notebook blanked before splitting, so every set of them is missing
+WALKOVERS = ['W/O', 'Walkover']
+
+#What a set token became: absent, not a score (0-0) or parsed
+ABSENT, UNPARSED, PARSED = -1, 0, 1
+
+
+def set_games(scores):
+    '''(games_won, games_lost) int8 arrays of shape (rows, SET_COUNT), from the winner's side.'''
+    won, lost, _ = _parse_sets(scores)
+    return won, lost
+
+
+def _parse_sets(scores):
+    '''set_games plus an int8 (rows, SET_COUNT) array of ABSENT / UNPARSED / PARSED per set.'''
+    scores = pa.array(scores, type=pa.string(), from_pandas=True)
+    won = np.zeros((len(scores), SET_COUNT), dtype=np.int8)
+    lost = np.zeros((len(scores), SET_COUNT), dtype=np.int8)
+    state = np.full((len(scores), SET_COUNT), ABSENT, dtype=np.int8)
+
+    #----- One token per set, like str.split(" ", n=5): doubled spaces leave empty sets
+    sets = pc.list_slice(pc.split_pattern(scores, ' ', max_splits=SET_COUNT), 0, SET_COUNT)
+    tokens = pc.list_flatten(sets)
+    if len(tokens) == 0:
+        return won, lost, state
+
+    sets_per_row = pc.list_value_length(sets).fill_null(0).to_numpy()
+    rows = np.repeat(np.arange(len(scores)), sets_per_row)
+    position = np.arange(len(tokens)) - np.repeat(np.cumsum(sets_per_row) - sets_per_row, sets_per_row)
+    state[rows, position] = UNPARSED
+
+    games = pc.extract_regex(tokens, SET_PATTERN)
+    matched = games.is_valid()
+    games = games.filter(matched)
+    matched = matched.to_numpy(zero_copy_only=False)
+    rows, position = rows[matched], position[matched]
+
+    won[rows, position] = pc.cast(games.field('won'), pa.int8()).to_numpy()
+    lost[rows, position] = np.where(
+        pc.equal(tokens.filter(matched), '1-08').to_numpy(zero_copy_only=False),
+        0, pc.cast(games.field('lost'), pa.int8()).to_numpy()
+    )
+    state[rows, position] = PARSED
+    state[pc.is_in(scores, pa.array(WALKOVERS)).fill_null(False).to_numpy(zero_copy_only=False)] = ABSENT
+    return won, lost, state
+
+
+def set_scores(won, lost, state):
+    '''The notebook's set score string of every (row, set), as an object array.'''
+    #Few distinct sets are ever played: code each one, format every code once and look them up
+    code = np.where(state == PARSED, 2 + won.astype(np.int32) * 256 + lost.astype(np.int32), state + 1)
+    labels = np.empty(code.max() + 1 if code.size else 0, dtype=object)
+    for value in np.flatnonzero(np.bincount(code.ravel())):
+        labels[value] = 'nan' if value == 0 else '0' if value == 1 else f'{(value - 2) // 256}-{(value - 2) % 256}'
+    return labels[code]
+
+
+def parse_games(scores, outcome):
+    '''Per-set and total games for each player row, with the columns the notebook built, in
+    its order.
+
+    scores are the match scores (winner first) and outcome 1 for the winner's row, 0 for
+    the loser's.'''
+    won, lost, state = _parse_sets(scores)
+
+    #----- Loser rows see the score the other way round
+    loser = np.asarray(outcome) == 0
+    won[loser], lost[loser] = lost[loser], won[loser]
+    text = set_scores(won, lost, state)
+
+    columns = {}
+    for i in range(SET_COUNT):
+        columns[f'set{i + 1}_score'] = text[:, i]
+    for i in range(SET_COUNT):
+        columns[f'set{i + 1}_games_won'] = won[:, i]
+    for i in range(SET_COUNT):
+        columns[f'set{i + 1}_games_lost'] = lost[:, i]
+
+    total_won = won.sum(axis=1, dtype=np.int16)
+    total_lost = lost.sum(axis=1, dtype=np.int16)
+    columns['total_games_won'] = total_won
+    columns['total_games_lost'] = total_lost
+    columns['total_games_played'] = total_won + total_lost
+
+    #Sets never played are 0-0, so their win percentage is NaN as in the notebook
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i in range(SET_COUNT):
+            columns[f'set{i + 1}_win_perc'] = won[:, i] / (won[:, i] + lost[:, i]).astype(np.float64)
+        columns['game_win_perc'] = total_won / (total_won + total_lost).astype(np.float64)
+
+    index = scores.index if isinstance(scores, pd.Series) else None
+    return pd.DataFrame(columns, index=index)
@@ -0,0 +1,200 @@
+#Bulk match scoring over HTTP with the trained model artifact
+#
+#POST /api/score with feature rows - num_aces, num_dfs, serve1_in_perc, player_age,
+#surface, num_brkpts_saved, num_brkpts_faced - either as json (a list of records or
+#a dict of column lists) or as an Arrow IPC stream (Content-Type
+#application/vnd.apache.arrow.stream).  The answer comes back in the same format with
+#the win probability and 0/1 prediction for every row, in request order.
+#
+#Rows are scaled and one-hot encoded exactly like train_model.py does (feature_matrix +
+#scale from model_artifact).  Concurrent requests are not predicted one by one: a
+#single worker thread drains the queue into micro-batches of up to
+#ATP_SCORE_BATCH_ROWS rows, waiting at most ATP_SCORE_BATCH_WAIT_MS for company,
+#and runs one vectorized predict per batch (per surface model in the batch).
+#
+#pandas, pyarrow and xgboost are imported on the first request, not with the dashboard.
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from model_artifact import NUMERIC_FEATURES, feature_matrix, scale, load_model, predict_scaled
+
+
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+FEATURES = NUMERIC_FEATURES + ['surface']
+
+MAX_BATCH_ROWS = int(os.environ.get('ATP_SCORE_BATCH_ROWS', 8192))
+MAX_WAIT_MS = float(os.environ.get('ATP_SCORE_BATCH_WAIT_MS', 2))
+
+
+class ScoringError(ValueError):
+    '''Bad request payload; the message is sent back to the client.'''
+
+
+class MicroBatcher:
+    '''Coalesce submitted feature matrices into batches for one predict_fn call each.'''
+
+    def __init__(self, predict_fn, max_rows=MAX_BATCH_ROWS, max_wait_ms=MAX_WAIT_MS):
+        self.predict_fn = predict_fn
+        self.max_rows = max_rows
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+
+    def submit(self, X):
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((X, future))
+        return future
+
+    def score(self, X):
+        return self.submit(X).result()
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name='score-batcher', daemon=True)
+                    self._worker.start()
+
+    def _collect(self):
+        #Block for the first request, then take whatever else arrives until the batch
+        #is full or the wait budget is spent
+        items = [self._queue.get()]
+        rows = len(items[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_rows:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            items.append(item)
+            rows += len(item[0])
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            try:
+                X = items[0][0] if len(items) == 1 else np.vstack([X for X, _ in items])
+                result = self.predict_fn(X)
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.rows += len(X)
+            offsets = np.cumsum([0] + [len(X) for X, _ in items])
+            for (_, future), start, stop in zip(items, offsets[:-1], offsets[1:]):
+                future.set_result(result[start:stop])
+
+
+class Scorer:
+    '''Loads the model artifact on first use and scores feature frames through a MicroBatcher.'''
+
+    def __init__(self, version=None, **batch_options):
+        self.version = version
+        self.batch_options = batch_options
+        self.meta = None
+        self.boosters = None
+        self.batcher = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self.batcher is None:
+            with self._lock:
+                if self.batcher is None:
+                    self.boosters, self.meta = load_model(self.version)
+                    self.batcher = MicroBatcher(self._predict, **self.batch_options)
+
+    def _predict(self, X):
+        #A batch mixes surfaces; each row goes to its surface's booster
+        return predict_scaled(self.boosters, self.meta, X)
+
+    def features(self, df):
+        '''Validated, scaled model inputs for a frame of raw feature rows.'''
+        missing = [column for column in FEATURES if column not in df.columns]
+        if missing:
+            raise ScoringError(f'missing columns: {", ".join(missing)}')
+
+        unknown = set(df['surface'].dropna().unique()) - set(self.meta['surface_columns'])
+        if unknown:
+            raise ScoringError(
+                f'unknown surface {sorted(unknown)[0]!r}, expected one of {self.meta["surface_columns"]}'
+            )
+
+        try:
+            X = scale(feature_matrix(df, self.meta['surface_columns']), self.meta)
+        except (TypeError, ValueError) as e:
+            raise ScoringError(f'non-numeric feature value ({e})')
+        return X
+
+    def score(self, df):
+        '''Win probabilities (float32) for the rows of df.'''
+        self._load()
+        if len(df) == 0:
+            return np.empty(0, dtype=np.float32)
+        return self.batcher.score(self.features(df))
+
+
+scorer = Scorer()
+
+
+def _read_request(request):
+    import pandas as pd
+    import pyarrow as pa
+
+    if request.mimetype == ARROW_STREAM:
+        try:
+            return pa.ipc.open_stream(request.get_data()).read_pandas()
+        except pa.ArrowInvalid as e:
+            raise ScoringError(f'invalid arrow stream ({e})')
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, (list, dict)):
+        raise ScoringError('expected a json list of records or a dict of columns')
+    try:
+        return pd.DataFrame(payload)
+    except ValueError as e:
+        raise ScoringError(str(e))
+
+
+def _response(request, proba, version):
+    import pyarrow as pa
+    from flask import Response, jsonify
+
+    pred_win = (proba > 0.5).astype(np.int8)
+    if request.mimetype == ARROW_STREAM:
+        table = pa.table({'proba': proba.astype(np.float32), 'pred_win': pred_win})
+        table = table.replace_schema_metadata({'model_version': version})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(sink.getvalue().to_pybytes(), mimetype=ARROW_STREAM)
+
+    return jsonify(model_version=version, proba=proba.tolist(), pred_win=pred_win.tolist())
+
+
+def register_scoring_route(server, url='/api/score', scorer=scorer):
+    '''Add the scoring endpoint to a Flask server (the dashboard's app.server).'''
+    from flask import request, jsonify
+
+    def score_matches():
+        try:
+            proba = scorer.score(_read_request(request))
+        except ScoringError as e:
+            return jsonify(error=str(e)), 400
+        except FileNotFoundError as e:
+            return jsonify(error=str(e)), 503
+        return _response(request, proba, scorer.meta['version'])
+
+    server.add_url_rule(url, 'score_matches', score_matches, methods=['POST'])
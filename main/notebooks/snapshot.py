@@ -0,0 +1,236 @@
+#Serving snapshot: the dashboard's derived tables as memory-mapped Arrow files
+#
+#app.py serves from tables derived from the dataset - the active players' rows sorted
+#by player with the model's pred_wins attached, the quarterly stats cube, the confusion
+#counts, the head-to-head pair / opponent arrays and the Elo rating history.  Built in-process those are private
+#heap memory in every gunicorn worker.  Here each part is built once, written
+#uncompressed as Arrow IPC files under <cache>/snapshot-<key>/ and memory-mapped by
+#every process: the column buffers are page cache pages shared by the master and all
+#workers, and as nothing writes to them they are never copied.  Strings stay dictionary
+#encoded (categoricals), so there are no object columns for refcount updates to dirty.
+#
+#Parts are built on first use, so a tab only waits for the tables it reads.  The key
+#covers the dataset hash, the model version, MIN_MATCHES and SNAPSHOT_FORMAT, so a new
+#dataset or model gets a fresh snapshot and old ones are removed.
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from collections import namedtuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from aggregates import build_quarterly_stats, build_model_metrics
+from data_loader import DATA_URL, CACHE_DIR, MIN_MATCHES, ensure_cache, load_dataset, filter_active_players
+from indexes import sort_by_player, match_pairs, build_pair_index, build_opponent_map, PairIndex, OpponentMap
+from model_artifact import MODEL_DIR, CONTRIBUTION_COLUMNS, load_meta, load_pred_wins, load_contributions
+
+
+#Bump when a table, an index layout or the way they are built changes
+SNAPSHOT_FORMAT = 4
+
+#Elo state kept next to the snapshots, so a dataset with matches appended only rates those
+RATINGS_STATE = 'elo-state.npz'
+
+INDEX_TYPES = {'PairIndex': PairIndex, 'OpponentMap': OpponentMap}
+
+Snapshot = namedtuple('Snapshot', ['directory', 'dataset_sha256', 'model_version', 'source', 'cache_dir', 'model_dir'])
+
+
+def snapshot_key(dataset_sha256, model_version, min_matches=MIN_MATCHES):
+    inputs = [SNAPSHOT_FORMAT, dataset_sha256, model_version, min_matches]
+    return hashlib.sha256(json.dumps(inputs).encode()).hexdigest()[:16]
+
+
+def open_snapshot(source=DATA_URL, cache_dir=CACHE_DIR, model_dir=MODEL_DIR):
+    '''The snapshot of the current dataset and model. Cheap: no part is built or mapped yet.'''
+    _, dataset_manifest = ensure_cache(source, cache_dir)
+    model_version = load_meta(model_dir=model_dir)['version']
+    directory = os.path.join(cache_dir, 'snapshot-' + snapshot_key(dataset_manifest['sha256'], model_version))
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+        _remove_stale(cache_dir, keep=directory)
+    return Snapshot(directory, dataset_manifest['sha256'], model_version, source, cache_dir, model_dir)
+
+
+def _remove_stale(cache_dir, keep):
+    '''Delete snapshots of older datasets / models. Processes still mapping them keep their pages.'''
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith('snapshot-') and path != keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+#----- Writing and mapping one part
+def _write_table(table, path):
+    '''Write to a private temp file and rename it into place, so nobody maps a half written file.'''
+    tmp_path = f'{path}.tmp-{uuid.uuid4().hex}'
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    size = os.path.getsize(tmp_path)
+    os.replace(tmp_path, path)
+    return size
+
+
+def _write_part(snapshot, part, values, info):
+    '''Write every frame / namedtuple index of a part, then its manifest. Returns the manifest.'''
+    files, kinds = {}, {}
+    for name, value in values.items():
+        if isinstance(value, pd.DataFrame):
+            kinds[name] = 'frame'
+            files[name] = _write_table(pa.Table.from_pandas(value, preserve_index=False), os.path.join(snapshot.directory, name + '.arrow'))
+            continue
+
+        #An index's arrays differ in length, so each field gets a single-column file
+        kinds[name] = type(value).__name__
+        for field, array in value._asdict().items():
+            array = array.to_numpy() if isinstance(array, pd.Index) else array
+            files[f'{name}.{field}'] = _write_table(pa.table({field: pa.array(array)}), os.path.join(snapshot.directory, f'{name}.{field}.arrow'))
+
+    manifest = dict(info, format=SNAPSHOT_FORMAT, kinds=kinds, files=files)
+    manifest_path = os.path.join(snapshot.directory, part + '.json')
+    tmp_manifest = f'{manifest_path}.tmp-{uuid.uuid4().hex}'
+    with open(tmp_manifest, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_manifest, manifest_path)
+    return manifest
+
+
+def _read_manifest(snapshot, part):
+    try:
+        with open(os.path.join(snapshot.directory, part + '.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        return None
+    for name, size in manifest['files'].items():
+        path = os.path.join(snapshot.directory, name + '.arrow')
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            return None
+    return manifest
+
+
+def _map_table(path):
+    with pa.memory_map(path, 'r') as source_file:
+        return pa.ipc.open_file(source_file).read_all()
+
+
+def _map_array(path):
+    '''The single column of an index file as a NumPy view on the mapped buffer (names as a pd.Index).'''
+    column = _map_table(path).column(0)
+    if pa.types.is_integer(column.type):
+        return column.chunk(0).to_numpy(zero_copy_only=True)
+    return pd.Index(column.to_pylist())
+
+
+def _map_part(snapshot, manifest):
+    values = {}
+    for name, kind in manifest['kinds'].items():
+        if kind == 'frame':
+            #split_blocks keeps numeric columns as views on the mapped file
+            values[name] = _map_table(os.path.join(snapshot.directory, name + '.arrow')).to_pandas(split_blocks=True)
+        else:
+            index_type = INDEX_TYPES[kind]
+            values[name] = index_type(**{
+                field: _map_array(os.path.join(snapshot.directory, f'{name}.{field}.arrow')) for field in index_type._fields
+            })
+    return values
+
+
+def load_part(snapshot, part, build):
+    '''(values, manifest) of one part, mapped from disk. build(snapshot) -> (values, info) runs
+    only if the part is missing; concurrent builders each write complete files, the last wins.'''
+    manifest = _read_manifest(snapshot, part)
+    if manifest is None:
+        start = time.perf_counter()
+        values, info = build(snapshot)
+        manifest = _write_part(snapshot, part, values, dict(info, build_seconds=time.perf_counter() - start))
+    return _map_part(snapshot, manifest), manifest
+
+
+#----- Parts
+def _build_matches(snapshot):
+    atp_df = load_dataset(snapshot.source, snapshot.cache_dir)
+    dataset_rows = len(atp_df)
+
+    #XGBoost predictions, scored offline for every row of the dataset by train_model.py
+    atp_df['pred_wins'] = load_pred_wins(snapshot.dataset_sha256, dataset_rows, snapshot.model_version, snapshot.model_dir)
+
+    #And their SHAP values, if train_model.py stored them (app.py computes them otherwise)
+    row_contributions = load_contributions(dataset_rows, snapshot.model_version, snapshot.model_dir)
+    if row_contributions is not None:
+        for i, column in enumerate(CONTRIBUTION_COLUMNS):
+            atp_df[column] = row_contributions[:, i]
+
+    atp_df = sort_by_player(filter_active_players(atp_df))
+    return {'atp_df': atp_df}, {'dataset_rows': dataset_rows}
+
+
+def load_matches(snapshot):
+    '''(atp_df, manifest): players with at least MIN_MATCHES matches, sorted by player, with pred_wins
+    (and CONTRIBUTION_COLUMNS if the model artifact has them).'''
+    values, manifest = load_part(snapshot, 'matches', _build_matches)
+    return values['atp_df'], manifest
+
+
+def _build_quarterly_stats(snapshot):
+    atp_df, _ = load_matches(snapshot)
+    return {'quarterly_stats': build_quarterly_stats(atp_df)}, {}
+
+
+def load_quarterly_stats(snapshot):
+    '''Individual Stats tab: (player, quarter, surface) statistics cube.'''
+    return load_part(snapshot, 'quarterly_stats', _build_quarterly_stats)[0]['quarterly_stats']
+
+
+def _build_model_metrics(snapshot):
+    atp_df, _ = load_matches(snapshot)
+    return {'model_metrics': build_model_metrics(atp_df)}, {}
+
+
+def load_model_metrics(snapshot):
+    '''Predict Winners tab: confusion counts per (player, surface).'''
+    return load_part(snapshot, 'model_metrics', _build_model_metrics)[0]['model_metrics']
+
+
+def _build_head_to_head(snapshot):
+    atp_df, _ = load_matches(snapshot)
+    pairs = match_pairs(atp_df)
+    return {'pair_index': build_pair_index(atp_df, pairs), 'opponent_map': build_opponent_map(atp_df, pairs)}, {}
+
+
+def load_head_to_head(snapshot):
+    '''Head-to-Head tab: (pair_index, opponent_map), built from the same match pairs.'''
+    values = load_part(snapshot, 'head_to_head', _build_head_to_head)[0]
+    return values['pair_index'], values['opponent_map']
+
+
+def _build_ratings(snapshot):
+    from ratings import rate_matches
+
+    #Every match of the dataset, not just the active players' (their opponents need ratings too)
+    ratings = rate_matches(
+        load_dataset(snapshot.source, snapshot.cache_dir),
+        os.path.join(snapshot.cache_dir, RATINGS_STATE)
+    )
+    history = ratings.history
+    rating_history = pd.DataFrame({
+        'player_name': pd.Categorical.from_codes(history['player'], categories=ratings.players),
+        'tourney_date': history['date'],
+        'surface': pd.Categorical.from_codes(history['surface'], categories=ratings.surfaces),
+        'rating': history['rating'],
+        'surface_rating': history['surface_rating'],
+    })
+    #Each player's history as one date ordered block, like the matches table
+    rating_history = rating_history.sort_values('player_name', kind='stable').reset_index(drop=True)
+    return {'rating_history': rating_history}, {'matches_rated': ratings.n_matches}
+
+
+def load_ratings(snapshot):
+    '''Ratings tab: overall and surface Elo ratings after every match, grouped by player.'''
+    return load_part(snapshot, 'ratings', _build_ratings)[0]['rating_history']
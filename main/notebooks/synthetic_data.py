@@ -0,0 +1,462 @@
+#Synthetic model_df_v2 for scale testing
+#
+#Simulates whole seasons of tennis and writes them in the exact layout of
+#model_df_v2.parquet.gzip (build_dataset.OUTPUT_SCHEMA): one winner row and one loser
+#row per match, sharing tourney_id and match_num.  A pool of players with a latent
+#skill, per-surface strengths and a serve rating ages through the seasons - players
+#debut around 20 and the good ones last well over a decade, so the busiest careers run
+#to the 1,000+ matches the real top players have.  Each tournament is a knock-out draw
+#decided by the skill gap; scores, games, minutes and the serve / break point stats
+#follow from the sets played and the surface (more aces on grass, fewer on clay).
+#
+#--scale multiplies the tournaments in a season: 1 is roughly the real ATP calendar
+#(~86k matches over 1991-2022), anything above adds Challenger ('C') and Futures ('F')
+#events for a player pool that grows with --players-scale (default: same as --scale).
+#Seasons are generated and written one at a time, so memory stays at one season.
+#
+#Usage:
+#    python synthetic_data.py --scale 10 --out ../data/synthetic_10x.parquet
+#    ATP_DATA_URL=../data/synthetic_10x.parquet ATP_CACHE_DIR=../data/cache_10x python train_model.py
+#    ATP_DATA_URL=../data/synthetic_10x.parquet ATP_CACHE_DIR=../data/cache_10x python app.py
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from build_dataset import GAME_COLUMNS, OUTPUT_SCHEMA
+from data_loader import MIN_MATCHES
+from scores import parse_games
+
+
+FIRST_YEAR = 1991
+LAST_YEAR = 2022
+SURFACES = ['Carpet', 'Clay', 'Grass', 'Hard']
+
+#----- One season of the main tour at scale 1: (level, draw size, best of, count, surfaces)
+TOUR_CALENDAR = [
+    ('G', 128, 5, 4, ['Hard', 'Clay', 'Grass', 'Hard']),
+    ('M', 64, 3, 9, ['Hard', 'Hard', 'Clay', 'Clay', 'Clay', 'Hard', 'Hard', 'Hard', 'Carpet']),
+    ('A', 32, 3, 52, None),
+]
+EXTRA_LEVELS = ['C', 'F']
+EXTRA_DRAW = 32
+
+#Surface mix of the smaller events; carpet was dropped from the tour after 2008
+SURFACE_MIX = {'Carpet': 0.12, 'Clay': 0.33, 'Grass': 0.07, 'Hard': 0.48}
+LAST_CARPET_YEAR = 2008
+
+#New players per season and players already mid-career in the first season, at scale 1.
+#Players added by --players-scale above 1 are a weaker tier who mostly fill the extra events
+ROOKIES = 80
+INITIAL_PLAYERS = 650
+LOWER_TIER_SKILL = -1.5
+
+#----- Match model
+SKILL_WEIGHT = 1.1
+SURFACE_SPREAD = 0.35
+PEAK_AGE = 26
+#Main-tour events draw from this many of the season's best players, at any scale
+TOUR_FIELD = 600
+#Entry weight stops growing here, so even the best players skip some weeks
+ENTRY_CAP = 1.8
+RETIRE_AGE = 38
+
+#Aces per service point by surface
+ACE_RATE = {'Carpet': 0.10, 'Clay': 0.045, 'Grass': 0.12, 'Hard': 0.08}
+FIRST_WON_RATE = {'Carpet': 0.74, 'Clay': 0.67, 'Grass': 0.76, 'Hard': 0.72}
+
+#Sets from the set winner's side and how often they come up
+SET_SCORES = np.array([[6, 0], [6, 1], [6, 2], [6, 3], [6, 4], [7, 5], [7, 6]])
+SET_WEIGHTS = np.array([0.03, 0.08, 0.15, 0.2, 0.24, 0.11, 0.19])
+RETIRED = 0.02
+
+ROW_GROUP_SIZE = 65536
+
+IOC = np.array(['ESP', 'FRA', 'USA', 'ARG', 'ITA', 'GER', 'AUS', 'RUS', 'SRB', 'GBR', 'SUI', 'CZE', 'CRO', 'SWE', 'NED', 'BEL', 'AUT', 'CHI', 'JPN', 'CAN'])
+
+
+def player_name(number):
+    return f'Player {number:06d}'
+
+
+class PlayerPool:
+    '''Every player ever generated, in flat arrays indexed by player number.'''
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.skill = np.empty(0)
+        self.surface = np.empty((0, len(SURFACES)))
+        self.serve = np.empty(0)
+        self.first_in = np.empty(0)
+        self.born = np.empty(0)
+        self.retires = np.empty(0)
+        self.height = np.empty(0)
+        self.left = np.empty(0, dtype=bool)
+        self.ioc = np.empty(0, dtype=object)
+        self.name = np.empty(0, dtype=object)
+
+    def __len__(self):
+        return len(self.skill)
+
+    def add(self, n, year, initial=False, skill_mean=0.0):
+        if n == 0:
+            return
+        rng = self.rng
+        skill = rng.normal(skill_mean, 1, n)
+        debut_age = np.clip(rng.normal(20, 1.5, n), 17, 25)
+        #Better players last longer
+        career = np.clip(2 + rng.poisson(3 + 11 / (1 + np.exp(-1.5 * skill))), 1, 22)
+        debut = np.full(n, float(year))
+        if initial:
+            #Already somewhere in their career when the data starts
+            debut = year - np.floor(rng.random(n) * career)
+
+        self.skill = np.concatenate([self.skill, skill])
+        self.surface = np.concatenate([self.surface, rng.normal(0, SURFACE_SPREAD, (n, len(SURFACES)))])
+        self.serve = np.concatenate([self.serve, rng.normal(0, 1, n)])
+        self.first_in = np.concatenate([self.first_in, np.clip(rng.normal(0.61, 0.04, n), 0.45, 0.75)])
+        born = debut - debut_age
+        self.born = np.concatenate([self.born, born])
+        self.retires = np.concatenate([self.retires, np.minimum(debut + career, np.floor(born + RETIRE_AGE))])
+        self.height = np.concatenate([self.height, np.round(rng.normal(186, 7, n))])
+        self.left = np.concatenate([self.left, rng.random(n) < 0.12])
+        self.ioc = np.concatenate([self.ioc, rng.choice(IOC, n)])
+        self.name = np.concatenate([self.name, [player_name(number) for number in range(len(self.name), len(self.name) + n)]])
+
+    def active(self, year):
+        return np.flatnonzero((self.born + 16 <= year) & (self.retires > year))
+
+    def strength(self, players, year):
+        '''Skill adjusted for age: players peak at PEAK_AGE.'''
+        age = year + 0.5 - self.born[players]
+        return self.skill[players] - 0.012 * (age - PEAK_AGE) ** 2
+
+
+#----- Season layout
+def season_events(year, scale, rng):
+    '''(level, draw, best_of, surface) for every tournament of the season, in calendar order.'''
+    mix = dict(SURFACE_MIX)
+    if year > LAST_CARPET_YEAR:
+        mix.pop('Carpet')
+    names, weights = list(mix), np.array(list(mix.values()))
+    weights = weights / weights.sum()
+
+    events = []
+    for level, draw, best_of, count, surfaces in TOUR_CALENDAR:
+        for i in range(count):
+            surface = surfaces[i] if surfaces else names[rng.choice(len(names), p=weights)]
+            if surface == 'Carpet' and year > LAST_CARPET_YEAR:
+                surface = 'Hard'
+            events.append((level, draw, best_of, surface))
+
+    total = int(round(len(events) * scale))
+    if total <= len(events):
+        keep = np.sort(rng.choice(len(events), max(total, 1), replace=False))
+        return [events[i] for i in keep]
+
+    extra = total - len(events)
+    surfaces = rng.choice(len(names), extra, p=weights)
+    events += [(EXTRA_LEVELS[i % 2], EXTRA_DRAW, 3, names[s]) for i, s in enumerate(surfaces)]
+    return events
+
+
+def sample_entries(pool_players, weights, events, draw, rng, batch_cells=2**22):
+    '''(events, draw) player numbers, no player twice in a draw. Weighted via Gumbel top-k.'''
+    n = len(pool_players)
+    if draw > n:
+        raise ValueError(f'{draw} player draw but only {n} active players - raise --players-scale')
+
+    if weights is None:
+        entries = rng.integers(0, n, (events, draw))
+        #Repeats are rare in a large pool - redraw those rows
+        while True:
+            ordered = np.sort(entries, axis=1)
+            repeated = (ordered[:, 1:] == ordered[:, :-1]).any(axis=1)
+            if not repeated.any():
+                break
+            entries[repeated] = rng.integers(0, n, (repeated.sum(), draw))
+        return pool_players[entries]
+
+    log_weights = np.log(weights)
+    entries = np.empty((events, draw), dtype=np.int64)
+    batch = max(1, batch_cells // n)
+    for start in range(0, events, batch):
+        stop = min(start + batch, events)
+        keys = log_weights + rng.gumbel(size=(stop - start, n))
+        entries[start:stop] = np.argpartition(-keys, draw - 1, axis=1)[:, :draw]
+    return pool_players[entries]
+
+
+def round_names(draw):
+    rounds = []
+    size = draw
+    while size > 1:
+        rounds.append({2: 'F', 4: 'SF', 8: 'QF'}.get(size, f'R{size}'))
+        size //= 2
+    return rounds
+
+
+def play_draws(entries, strength, surface_strength, event_surface, rng):
+    '''Knock-out for a block of same-size draws. Returns per-match arrays
+    (event row, winner, loser, round name, match_num), first round first.'''
+    events, draw = entries.shape
+    current = rng.permuted(entries, axis=1)
+    surface = event_surface[:, None]
+    rows, winners, losers, rounds, match_nums = [], [], [], [], []
+    played = 0
+    for name in round_names(draw):
+        a, b = current[:, 0::2], current[:, 1::2]
+        gap = (strength[a] + surface_strength[a, surface]) - (strength[b] + surface_strength[b, surface])
+        a_wins = rng.random(a.shape) < 1 / (1 + np.exp(-SKILL_WEIGHT * gap))
+        winner, loser = np.where(a_wins, a, b), np.where(a_wins, b, a)
+
+        matches = a.shape[1]
+        rows.append(np.repeat(np.arange(events), matches))
+        winners.append(winner.ravel())
+        losers.append(loser.ravel())
+        rounds.append(np.full(events * matches, name, dtype=object))
+        match_nums.append(np.tile(np.arange(played + 1, played + matches + 1), events))
+        played += matches
+        current = winner
+    return tuple(np.concatenate(parts) for parts in (rows, winners, losers, rounds, match_nums))
+
+
+#----- Scores and stats
+def match_scores(best_of, rng):
+    '''Score strings from the winner's side, with the tiebreak points on 7-6 sets.'''
+    n = len(best_of)
+    need = (best_of + 1) // 2
+    #Sets the loser takes: mostly straight sets, deciders about a third of the time
+    lost_sets = np.where(best_of == 5, rng.choice(3, n, p=[0.42, 0.34, 0.24]), rng.choice(2, n, p=[0.64, 0.36]))
+    sets_played = need + lost_sets
+
+    position = np.arange(5)[None, :]
+    #Loser's sets at random positions before the last one, which the winner always takes
+    loser_keys = np.where(position < (sets_played - 1)[:, None], rng.random((n, 5)), np.inf)
+    loser_rank = np.argsort(np.argsort(loser_keys, axis=1), axis=1)
+    loser_set = loser_rank < lost_sets[:, None]
+
+    kind = rng.choice(len(SET_SCORES), (n, 5), p=SET_WEIGHTS / SET_WEIGHTS.sum())
+    high, low = SET_SCORES[kind, 0], SET_SCORES[kind, 1]
+    first, second = np.where(loser_set, low, high), np.where(loser_set, high, low)
+
+    tiebreak = kind == len(SET_SCORES) - 1
+    points = rng.integers(0, 11, (n, 5))
+
+    #Retirements stop mid-set
+    retired = rng.random(n) < RETIRED
+    last = sets_played - 1
+    partial = pc.binary_join_element_wise(_strings(rng.integers(0, 6, n)), _strings(rng.integers(0, 6, n)), '-')
+    partial = pc.binary_join_element_wise(partial, 'RET', ' ')
+
+    #----- Tokens are built column by column in arrow, unplayed sets are null and skipped in the join
+    tokens = []
+    for i in range(5):
+        token = pc.binary_join_element_wise(_strings(first[:, i]), _strings(second[:, i]), '-')
+        with_points = pc.binary_join_element_wise(token, _strings(points[:, i]), '(')
+        token = pc.if_else(tiebreak[:, i], pc.binary_join_element_wise(with_points, ')', ''), token)
+        token = pc.if_else(retired & (last == i), partial, token)
+        tokens.append(pc.if_else(i < sets_played, token, pa.scalar(None, pa.string())))
+    scores = pc.binary_join_element_wise(*tokens, ' ', null_handling='skip')
+    return scores.to_numpy(zero_copy_only=False)
+
+
+def _strings(values):
+    return pc.cast(pa.array(values), pa.string())
+
+
+def serve_stats(pool, players, surfaces, games_served, faced_scale, rng):
+    '''Raw serve and break point counts for one side of each match.'''
+    ace_rate = np.array([ACE_RATE[s] for s in SURFACES])[surfaces] * np.exp(0.35 * pool.serve[players])
+    first_won_rate = np.clip(np.array([FIRST_WON_RATE[s] for s in SURFACES])[surfaces] + 0.03 * pool.serve[players], 0.5, 0.9)
+
+    svpt = np.maximum(np.round(games_served * rng.normal(6.3, 0.5, len(players))), games_served * 4)
+    dfs = rng.poisson(svpt * 0.035)
+    first_in = np.minimum(rng.binomial(svpt.astype(np.int64), pool.first_in[players]), svpt - dfs)
+    aces = np.minimum(rng.poisson(svpt * ace_rate), first_in)
+    first_won = np.maximum(rng.binomial(first_in.astype(np.int64), first_won_rate), aces)
+    second_won = rng.binomial((svpt - first_in - dfs).astype(np.int64), 0.5)
+    faced = rng.poisson(games_served * faced_scale)
+    saved = rng.binomial(faced, 0.6)
+    return {
+        'num_aces': aces, 'num_dfs': dfs, 'num_svpts': svpt,
+        #The processed data caps first serves in at 100 (build_dataset step 4)
+        'serve1_in_perc': np.minimum(first_in, 100), 'serve1_win_perc': first_won,
+        'serve2_win_perc': second_won, 'num_games_served': games_served,
+        'num_brkpts_saved': saved, 'num_brkpts_faced': faced,
+    }
+
+
+def season_table(pool, year, scale, rng):
+    '''Every match of one season as an OUTPUT_SCHEMA table: all winner rows, then all loser rows.'''
+    events = season_events(year, scale, rng)
+    level = np.array([e[0] for e in events], dtype=object)
+    draw = np.array([e[1] for e in events])
+    best_of = np.array([e[2] for e in events])
+    surface = np.array([SURFACES.index(e[3]) for e in events])
+
+    active = pool.active(year)
+    strength = np.zeros(len(pool))
+    strength[active] = pool.strength(active, year)
+
+    #Season ranking: best current strength first
+    rank = np.full(len(pool), np.nan)
+    by_rank = active[np.argsort(-strength[active])]
+    rank[by_rank] = np.arange(1, len(active) + 1)
+    tour = by_rank[:TOUR_FIELD]
+
+    #Seeds: an entrant's place by rank within the draw, for the draw's best 8 / 16 / 32
+    seed_keys, seed_values = [], []
+
+    #----- Play every draw, grouped by size so a whole block is one array
+    matches = []
+    for (size, extra) in sorted({(d, lv in EXTRA_LEVELS) for d, lv in zip(draw, level)}):
+        event_ids = np.flatnonzero((draw == size) & (np.isin(level, EXTRA_LEVELS) == extra))
+        #Main-tour fields come from the top of the rankings and lean towards the best
+        #players (capped, nobody plays every week); Challengers and Futures are open to all
+        if extra:
+            entries = sample_entries(active, None, len(event_ids), size, rng)
+        else:
+            entries = sample_entries(tour, np.exp(1.4 * np.minimum(strength[tour], ENTRY_CAP)), len(event_ids), size, rng)
+
+        place = np.argsort(np.argsort(rank[entries], axis=1), axis=1) + 1
+        seeded = place <= (32 if size >= 128 else 16 if size >= 64 else 8)
+        seed_keys.append(np.repeat(event_ids, size)[seeded.ravel()] * len(pool) + entries[seeded])
+        seed_values.append(place[seeded])
+
+        rows, winner, loser, rounds, match_num = play_draws(entries, strength, pool.surface, surface[event_ids], rng)
+        matches.append((event_ids[rows], winner, loser, rounds, match_num))
+    event, winner, loser, rounds, match_num = (np.concatenate(parts) for parts in zip(*matches))
+    n = len(event)
+
+    #----- Scores, games and stats for both rows of each match
+    scores = match_scores(best_of[event], rng)
+    players = np.concatenate([winner, loser])
+    outcome = np.repeat([1, 0], n)
+    both = lambda values: np.concatenate([values, values])
+    games = parse_games(pd.Series(both(scores)), outcome)
+    total_games = games['total_games_played'].to_numpy()[:n]
+
+    minutes = np.maximum(np.round(total_games * rng.normal(4.6, 0.6, n) + rng.normal(12, 6, n)), 30)
+    #Each side serves about half the games
+    stats = serve_stats(
+        pool, players, both(surface[event]),
+        np.concatenate([np.ceil(total_games / 2), np.floor(total_games / 2)]),
+        #Losers face more break points
+        np.repeat([0.45, 0.75], n), rng
+    )
+
+    found = pd.Index(np.concatenate(seed_keys)).get_indexer(both(event) * len(pool) + players)
+    seed = np.where(found >= 0, np.concatenate(seed_values).astype(np.float64)[found], np.nan)
+    entry = np.full(2 * n, None, dtype=object)
+    entry_draw = rng.random(2 * n)
+    entry[entry_draw < 0.08] = 'Q'
+    entry[(entry_draw >= 0.08) & (entry_draw < 0.11)] = 'WC'
+    entry[~np.isnan(seed)] = None
+
+    player_rank = np.where(rng.random(2 * n) < 0.02, np.nan, rank[players])
+    rank_points = np.round(12000 * np.exp(-player_rank / 45) + 2000 * np.exp(-player_rank / 400))
+
+    #Tournaments one a week from mid January; extra events share the weeks
+    day = 14 + 7 * (np.arange(len(events)) * 45 // len(events))
+    dates = (pd.Timestamp(year, 1, 1) + pd.to_timedelta(day - 1, unit='D')).strftime('%Y%m%d').astype(int).to_numpy()
+    age = year + both(day[event]) / 365.25 - pool.born[players]
+
+    tourney_ids = np.array([f'{year}-{i:04d}' for i in range(len(events))], dtype=object)
+    tourney_names = np.array([f'{e[3]} {e[0]} {i}' for i, e in enumerate(events)], dtype=object)
+    columns = {
+        'tourney_id': both(tourney_ids[event]),
+        'tourney_name': both(tourney_names[event]),
+        'surface': both(np.array(SURFACES, dtype=object)[surface[event]]),
+        'draw_size': both(draw[event]),
+        'tourney_level': both(level[event]),
+        'tourney_date': both(dates[event]),
+        'match_num': both(match_num),
+        'player_id': 100000 + players,
+        'player_seed': seed,
+        'player_entry': entry,
+        'player_name': pool.name[players],
+        'player_hand': np.where(pool.left[players], 'L', 'R').astype(object),
+        'player_ht': pool.height[players],
+        'player_ioc': pool.ioc[players],
+        'player_age': np.round(age, 1),
+        'best_of': both(best_of[event]),
+        'round': both(rounds),
+        'minutes': both(minutes),
+        **stats,
+        'rank': player_rank,
+        'rank_points': rank_points,
+        'outcome': outcome,
+        'year': np.full(2 * n, year),
+        **{column: games[column].to_numpy() for column in GAME_COLUMNS},
+    }
+    arrays = [
+        pa.array(columns[field.name], type=pa.string(), from_pandas=True) if field.type == pa.string()
+        else pa.array(np.asarray(columns[field.name], dtype=np.float64))
+        for field in OUTPUT_SCHEMA
+    ]
+    return pa.Table.from_arrays(arrays, schema=OUTPUT_SCHEMA)
+
+
+def generate(out, scale=1.0, players_scale=None, first_year=FIRST_YEAR, last_year=LAST_YEAR, seed=0, compression='gzip'):
+    '''Write the synthetic seasons to out, one season in memory at a time. Returns a summary dict.'''
+    players_scale = scale if players_scale is None else players_scale
+    rng = np.random.default_rng(seed)
+    pool = PlayerPool(rng)
+    tour_share, lower_share = min(players_scale, 1), max(players_scale - 1, 0)
+    pool.add(int(round(INITIAL_PLAYERS * tour_share)), first_year, initial=True)
+    pool.add(int(round(INITIAL_PLAYERS * lower_share)), first_year, initial=True, skill_mean=LOWER_TIER_SKILL)
+
+    matches_played = np.zeros(0, dtype=np.int64)
+    rows = 0
+    tmp_path = out + '.tmp'
+    with pq.ParquetWriter(tmp_path, OUTPUT_SCHEMA, compression=compression) as writer:
+        for year in range(first_year, last_year + 1):
+            if year > first_year:
+                pool.add(int(round(ROOKIES * tour_share)), year)
+                pool.add(int(round(ROOKIES * lower_share)), year, skill_mean=LOWER_TIER_SKILL)
+            table = season_table(pool, year, scale, rng)
+            writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+
+            rows += table.num_rows
+            ids = table['player_id'].to_numpy().astype(np.int64) - 100000
+            matches_played = np.bincount(ids, minlength=len(pool)) + np.pad(matches_played, (0, len(pool) - len(matches_played)))
+    os.replace(tmp_path, out)
+
+    return {
+        'rows': rows,
+        'matches': rows // 2,
+        'players': int((matches_played > 0).sum()),
+        'dashboard_players': int((matches_played >= MIN_MATCHES).sum()),
+        'most_matches': int(matches_played.max()),
+        'bytes': os.path.getsize(out),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic dataset in the model_df_v2 layout')
+    parser.add_argument('--scale', type=float, default=1.0, help='tournaments per season, x the real calendar')
+    parser.add_argument('--players-scale', type=float, help='size of the player pool, x the real one (default: --scale)')
+    parser.add_argument('--first-year', type=int, default=FIRST_YEAR)
+    parser.add_argument('--last-year', type=int, default=LAST_YEAR)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--compression', default='gzip', help='parquet codec (snappy / zstd write faster at large scales)')
+    parser.add_argument('--out', required=True)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = generate(args.out, args.scale, args.players_scale, args.first_year, args.last_year, args.seed, args.compression)
+    print(
+        f"Wrote {args.out}: {summary['rows']:,} rows ({summary['matches']:,} matches), "
+        f"{summary['players']:,} players, {summary['dashboard_players']:,} with {MIN_MATCHES}+ matches "
+        f"(most {summary['most_matches']:,}), {summary['bytes'] / 2**20:.1f} MB in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__=='__main__':
+    main()
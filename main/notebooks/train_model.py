@@ -0,0 +1,119 @@
+#Offline training for the Predict Winners tab
+#
+#Fits the XGBoost classifiers on the same rows the dashboard shows, scores every row of
+#the cached dataset and writes a versioned artifact (see model_artifact.py).  The
+#dashboard only reads the artifact, it never trains on boot.
+#
+#A model over all surfaces and one per surface are tuned over model_search.GRID by
+#cross-validation, the fits running in parallel in a process pool (see model_search.py).
+#A surface gets its own booster in the artifact only if its best model beats the
+#all-surface model on that surface's validation rows.
+#
+#Usage:  python train_model.py [--version NAME] [--workers N] [--threads N] [--folds N]
+import argparse
+import time
+
+from data_loader import CACHE_DIR, load_dataset, dataset_version, filter_active_players
+from model_artifact import MODEL_DIR, ARTIFACT_FORMAT, predict, predict_contributions, save_artifact
+from model_search import (
+    ALL_SURFACES, prepare, load_inputs, cross_validate, best_params, cv_accuracy, run_jobs, run_final_job
+)
+
+
+def train(df, dataset_sha256, workers=None, threads=1, folds=3, cache_dir=CACHE_DIR, log=print):
+    '''Tune and fit the models on df. Returns (boosters, meta) as model_artifact.load_model does.'''
+    from xgboost import Booster
+
+    directory = prepare(df, dataset_sha256, folds, cache_dir)
+    inputs = load_inputs(directory)
+    surface_columns = inputs['surface_columns']
+    models = [ALL_SURFACES] + surface_columns
+
+    start = time.perf_counter()
+    results = cross_validate(directory, models, workers=workers, threads=threads, log=log)
+    search_seconds = time.perf_counter() - start
+
+    #The all-surface model, then every surface's own model where it does better on that surface
+    chosen = {ALL_SURFACES: best_params(results, ALL_SURFACES)}
+    for surface in surface_columns:
+        params, accuracy = best_params(results, surface)
+        baseline = cv_accuracy(results, ALL_SURFACES, chosen[ALL_SURFACES][0], surface)
+        log(f'{surface:<8} own model {accuracy:.4f}  all-surface model {baseline:.4f}  {params}')
+        if baseline is None or accuracy > baseline:
+            chosen[surface] = (params, accuracy)
+
+    finals = run_jobs(
+        run_final_job,
+        [{'model': model, 'params': params, 'fold': None} for model, (params, _) in chosen.items()],
+        directory, workers, threads, log=None
+    )
+    finals = {final['model']: final for final in finals}
+
+    boosters = {}
+    for model, final in finals.items():
+        booster = Booster()
+        booster.load_model(bytearray(final['booster']))
+        boosters[None if model == ALL_SURFACES else model] = booster
+
+    #Test accuracy of the artifact as served: each surface's rows by the model used for them
+    correct = rows = 0
+    for surface in surface_columns:
+        c, n = finals.get(surface, finals[ALL_SURFACES])['correct'].get(surface, (0, 0))
+        correct, rows = correct + c, rows + n
+
+    meta = {
+        'format': ARTIFACT_FORMAT,
+        'surface_columns': surface_columns,
+        'scaler_mean': inputs['scaler_mean'],
+        'scaler_scale': inputs['scaler_scale'],
+        'best_iteration': finals[ALL_SURFACES]['best_iteration'],
+        'params': chosen[ALL_SURFACES][0],
+        'cv_accuracy': chosen[ALL_SURFACES][1],
+        'surface_models': {
+            surface: {
+                'booster': f'booster-{surface}.ubj',
+                'best_iteration': final['best_iteration'],
+                'params': chosen[surface][0],
+                'cv_accuracy': chosen[surface][1],
+            }
+            for surface, final in finals.items() if surface != ALL_SURFACES
+        },
+        'test_accuracy': correct / rows,
+        'train_rows': finals[ALL_SURFACES]['train_rows'],
+        'search_seconds': search_seconds,
+    }
+    return boosters, meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the match outcome models and write a dashboard artifact')
+    parser.add_argument('--version', help='artifact name (default: timestamp + dataset hash)')
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    parser.add_argument('--workers', type=int, help='training processes (default: cores / threads)')
+    parser.add_argument('--threads', type=int, default=1, help='xgboost / BLAS threads per process')
+    parser.add_argument('--folds', type=int, default=3, help='cross-validation folds')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    atp_df = load_dataset()
+    sha256 = dataset_version()
+
+    boosters, meta = train(filter_active_players(atp_df), sha256, args.workers, args.threads, args.folds)
+
+    #Score every row of the cache so the dashboard can attach pred_wins by position
+    meta['version'] = args.version or time.strftime('xgb-%Y%m%d-%H%M%S-') + sha256[:8]
+    meta['dataset_sha256'] = sha256
+    pred_wins = predict(boosters, meta, atp_df)
+    #SHAP values for the Predict Winners tab's feature attributions, in the same order
+    row_contributions = predict_contributions(boosters, meta, atp_df)
+
+    path = save_artifact(boosters, meta, pred_wins, args.model_dir, contributions=row_contributions)
+    surfaces = ', '.join(meta['surface_models']) or 'none'
+    print(
+        f'Wrote {path} (test accuracy {meta["test_accuracy"]:.4f}, surface models: {surfaces}, '
+        f'search {meta["search_seconds"]:.1f}s, {time.perf_counter() - start:.1f}s)'
+    )
+
+
+if __name__=='__main__':
+    main()